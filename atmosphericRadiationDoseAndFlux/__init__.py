@@ -17,14 +17,99 @@ The package has been optimized using Numba for high-performance computing.
 Author: Space Environment and Protection Group, University of Surrey
 """
 
-from .doseAndFluxCalculator import (
-    calculate_from_energy_spec,
-    calculate_from_rigidity_spec,
-    calculate_from_energy_spec_array,
-    calculate_from_rigidity_spec_array
-)
-
-from .particle import Particle
-from .units import Distance
+import importlib
+from typing import TYPE_CHECKING
 
 __version__ = "1.0.0"
+
+# Public names and the submodules defining them. Submodules are only imported
+# when one of their names is first accessed (PEP 562), so that importing the
+# package itself does not pull in numba, pandas or the response tables.
+_lazyAttributes = {
+    "calculate_from_energy_spec": "doseAndFluxCalculator",
+    "calculate_from_rigidity_spec": "doseAndFluxCalculator",
+    "calculate_from_energy_spec_array": "doseAndFluxCalculator",
+    "calculate_from_rigidity_spec_array": "doseAndFluxCalculator",
+    "calculate_from_energy_spec_batch": "batchCalculator",
+    "calculate_from_spectrum_family": "spectrumFamilies",
+    "SpectrumFamily": "spectrumFamilies",
+    "get_response_kernels": "responseKernels",
+    "calculate_dose_jacobians": "doseJacobians",
+    "DoseJacobians": "doseJacobians",
+    "fit_power_law_spectrum": "spectrumFitting",
+    "SpectrumFitResult": "spectrumFitting",
+    "AltitudeResponseCache": "altitudeResponseCache",
+    "DoseResultCache": "doseResultCache",
+    "calculate_route_dose": "routeDose",
+    "iterate_route_dose": "routeDose",
+    "RouteWaypoint": "routeDose",
+    "DoseTimeSeries": "doseTimeSeries",
+    "iterate_dose_time_series": "doseTimeSeries",
+    "calculate_dose_grid": "doseGrid",
+    "DoseGrid": "doseGrid",
+    "CutoffDoseTable": "cutoffDoseTable",
+    "DoseBatchExecutor": "doseBatchExecutor",
+    "AsyncDoseCalculator": "asyncCalculator",
+    "calculate_from_energy_spec_async": "asyncCalculator",
+    "calculate_from_rigidity_spec_async": "asyncCalculator",
+    "calculate_from_energy_spec_array_async": "asyncCalculator",
+    "calculate_from_rigidity_spec_array_async": "asyncCalculator",
+    "setNumberOfThreads": "parallelExecution",
+    "getNumberOfThreads": "parallelExecution",
+    "warmup": "jitWarmup",
+    "Particle": "particle",
+    "AlphaParticleWarning": "particle",
+    "Distance": "units",
+    "preloadResponseTables": "responseTableRegistry",
+    "clearResponseTables": "responseTableRegistry",
+    "getResponseTableStats": "responseTableRegistry",
+}
+
+__all__ = list(_lazyAttributes)
+
+def __getattr__(name):
+    if name not in _lazyAttributes:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(f".{_lazyAttributes[name]}", __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazyAttributes))
+
+if TYPE_CHECKING:
+    from .doseAndFluxCalculator import (
+        calculate_from_energy_spec,
+        calculate_from_rigidity_spec,
+        calculate_from_energy_spec_array,
+        calculate_from_rigidity_spec_array
+    )
+    from .batchCalculator import calculate_from_energy_spec_batch
+    from .spectrumFamilies import calculate_from_spectrum_family, SpectrumFamily
+    from .responseKernels import get_response_kernels
+    from .doseJacobians import calculate_dose_jacobians, DoseJacobians
+    from .spectrumFitting import fit_power_law_spectrum, SpectrumFitResult
+    from .altitudeResponseCache import AltitudeResponseCache
+    from .doseResultCache import DoseResultCache
+    from .routeDose import calculate_route_dose, iterate_route_dose, RouteWaypoint
+    from .doseTimeSeries import DoseTimeSeries, iterate_dose_time_series
+    from .doseGrid import calculate_dose_grid, DoseGrid
+    from .cutoffDoseTable import CutoffDoseTable
+    from .doseBatchExecutor import DoseBatchExecutor
+    from .asyncCalculator import (
+        AsyncDoseCalculator,
+        calculate_from_energy_spec_async,
+        calculate_from_rigidity_spec_async,
+        calculate_from_energy_spec_array_async,
+        calculate_from_rigidity_spec_array_async
+    )
+    from .parallelExecution import setNumberOfThreads, getNumberOfThreads
+    from .jitWarmup import warmup
+    from .particle import Particle, AlphaParticleWarning
+    from .units import Distance
+    from .responseTableRegistry import (
+        preloadResponseTables,
+        clearResponseTables,
+        getResponseTableStats
+    )
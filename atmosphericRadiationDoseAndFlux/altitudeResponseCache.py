@@ -0,0 +1,209 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from typing import Dict, List, Optional, Tuple, Union, Any
+
+from . import batchCalculator
+from . import settings
+
+class AltitudeResponseCache:
+    """
+    LRU cache of effective (altitude-interpolated) response matrices.
+
+    Doses are linear in the 50 energy-integrated fluxes, so for a fixed particle
+    and altitude the interpolated rows R[alt] * f1 - R[alt+1] * (f1 - 1) of every
+    response type can be computed once and stored as a (6 x 50) matrix. A dose
+    evaluation at a cached altitude is then a single matrix-vector product.
+
+    Attributes
+    ----------
+    maximumSize : int
+        Maximum number of (particle, altitude) matrices held before the least
+        recently used one is evicted
+    altitudeQuantizationInMeters : Optional[float]
+        If set, altitudes are rounded to a multiple of this many meters before
+        lookup, so that nearby altitudes share a cache entry
+    hits : int
+        Number of lookups served from the cache
+    misses : int
+        Number of lookups that required a matrix to be calculated
+    evictions : int
+        Number of matrices evicted from the cache
+
+    Methods
+    -------
+    getEffectiveResponses(particleName, altitudesInkm)
+        Get the effective response matrices for a set of altitudes
+    calculateDoses(inputEnergyBins, inputFluxesMatrix, altitudesInkm, particleName)
+        Calculate dose and flux rates using cached response matrices
+    clear()
+        Remove all cached matrices and reset statistics
+    getStats()
+        Get a dictionary of cache statistics
+    """
+
+    def __init__(self, maximumSize: int = 4096, altitudeQuantizationInMeters: Optional[float] = None):
+        """
+        Initialize an empty cache.
+
+        Parameters
+        ----------
+        maximumSize : int, default=4096
+            Maximum number of (particle, altitude) matrices to hold
+        altitudeQuantizationInMeters : float, optional
+            Altitude quantization step in meters, e.g. 1.0 to share matrices
+            between altitudes that round to the same meter. By default altitudes
+            are used exactly.
+        """
+        if maximumSize < 1:
+            raise ValueError("maximumSize must be at least 1!")
+        if altitudeQuantizationInMeters is not None and altitudeQuantizationInMeters <= 0:
+            raise ValueError("altitudeQuantizationInMeters must be positive!")
+
+        self.maximumSize = maximumSize
+        self.altitudeQuantizationInMeters = altitudeQuantizationInMeters
+
+        self._responses: "OrderedDict[Tuple[str, float], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def quantizeAltitudes(self, altitudesInkm: Union[np.ndarray, List[float]]) -> np.ndarray:
+        """
+        Round altitudes to the cache's altitude quantization.
+
+        Parameters
+        ----------
+        altitudesInkm : Union[np.ndarray, List[float]]
+            Altitudes in kilometers
+
+        Returns
+        -------
+        np.ndarray
+            Quantized altitudes in kilometers
+        """
+        altitudesInkmArray = np.atleast_1d(settings.convertListOrFloatToArray(altitudesInkm)).astype(np.float64)
+        if self.altitudeQuantizationInMeters is None:
+            return altitudesInkmArray
+
+        quantizationInkm = self.altitudeQuantizationInMeters / 1000.0
+        return np.round(altitudesInkmArray / quantizationInkm) * quantizationInkm
+
+    def getEffectiveResponses(self, particleName: str,
+                              altitudesInkm: Union[np.ndarray, List[float]]) -> np.ndarray:
+        """
+        Get the effective response matrices for a set of altitudes.
+
+        All altitudes missing from the cache are calculated together in a
+        single call to batchCalculator.calculateResponseKernels.
+
+        Parameters
+        ----------
+        particleName : str
+            Particle type ("proton" or "alpha")
+        altitudesInkm : Union[np.ndarray, List[float]]
+            Altitudes in kilometers
+
+        Returns
+        -------
+        np.ndarray
+            Array with shape (altitudes, response types, 50 energy bins)
+        """
+        quantizedAltitudesInkm = self.quantizeAltitudes(altitudesInkm)
+        keys = [(particleName, float(altitudeInkm)) for altitudeInkm in quantizedAltitudesInkm]
+
+        responses: Dict[Tuple[str, float], np.ndarray] = {}
+        with self._lock:
+            for key in keys:
+                response = self._responses.get(key)
+                if response is not None:
+                    self._responses.move_to_end(key)
+                    responses[key] = response
+                    self.hits += 1
+
+        missingKeys = list(dict.fromkeys(key for key in keys if key not in responses))
+        if len(missingKeys) > 0:
+            missingResponses = batchCalculator.calculateResponseKernels(
+                [altitudeInkm for _, altitudeInkm in missingKeys], particleName)
+
+            with self._lock:
+                for key, missingResponse in zip(missingKeys, missingResponses):
+                    response = missingResponse.copy()
+                    response.setflags(write=False)
+                    responses[key] = response
+                    self._responses[key] = response
+                    self._responses.move_to_end(key)
+                    self.misses += 1
+
+                while len(self._responses) > self.maximumSize:
+                    self._responses.popitem(last=False)
+                    self.evictions += 1
+
+        return np.stack([responses[key] for key in keys])
+
+    def calculateDoses(self, inputEnergyBins: np.ndarray,
+                       inputFluxesMatrix: Union[np.ndarray, List[List[float]]],
+                       altitudesInkm: Union[np.ndarray, List[float]],
+                       particleName: str = "proton",
+                       verticalCutOffRigidity: float = 0.0) -> np.ndarray:
+        """
+        Calculate dose and flux rates using cached response matrices.
+
+        Parameters
+        ----------
+        inputEnergyBins : np.ndarray
+            Energy bin edges in MeV/n, spectra on other grids are rebinned onto the MAIRE grid
+        inputFluxesMatrix : Union[np.ndarray, List[List[float]]]
+            Differential flux values at bin midpoints (particles/cm²/sr/(MeV/n)/s),
+            with shape (spectra, 50) or (50,)
+        altitudesInkm : Union[np.ndarray, List[float]]
+            Altitudes in kilometers
+        particleName : str, default="proton"
+            Particle type ("proton" or "alpha")
+        verticalCutOffRigidity : float, default=0.0
+            Vertical cutoff rigidity in GV
+
+        Returns
+        -------
+        np.ndarray
+            Array with shape (spectra, altitudes, response types), as returned by
+            batchCalculator.calculate_from_energy_spec_batch
+        """
+        return batchCalculator.calculate_from_energy_spec_batch(
+            inputEnergyBins,
+            inputFluxesMatrix,
+            altitudesInkm,
+            particleName=particleName,
+            verticalCutOffRigidity=verticalCutOffRigidity,
+            altitudeResponseCache=self)
+
+    def clear(self):
+        """
+        Remove all cached matrices and reset statistics.
+        """
+        with self._lock:
+            self._responses.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def getStats(self) -> Dict[str, Any]:
+        """
+        Get a dictionary of cache statistics.
+
+        Returns
+        -------
+        Dict[str, Any]
+            Dictionary containing the number of cached matrices, the maximum
+            size, hit/miss/eviction counts and memory held in bytes
+        """
+        with self._lock:
+            return {
+                "size": len(self._responses),
+                "maximumSize": self.maximumSize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "nbytes": sum(response.nbytes for response in self._responses.values()),
+            }
@@ -0,0 +1,348 @@
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from . import batchCalculator
+from . import doseAndFluxCalculator
+from . import settings
+from .requestHashing import calculateValueKey
+from .responseFileParameters import calculate_altitude_layer_params_array
+
+class _DoseRequest:
+    """
+    A pending calculation, which may be awaited by several identical requests.
+    """
+
+    def __init__(self, key: Hashable, buildSpeciesEnergySpectra: Callable[[], Dict[str, Tuple[np.ndarray, np.ndarray]]],
+                 altitudesInkm: Union[np.ndarray, List[float]], verticalCutOffRigidity: float, output: str,
+                 future: asyncio.Future):
+        self.key = key
+        self.buildSpeciesEnergySpectra = buildSpeciesEnergySpectra
+        self.altitudesInkm = altitudesInkm
+        self.verticalCutOffRigidity = verticalCutOffRigidity
+        self.output = output
+        self.future = future
+
+def calculateDoseRequestBatch(requests: List[_DoseRequest]) -> List[Union[pd.DataFrame, np.ndarray, Exception]]:
+    """
+    Calculate dose and flux rates for a batch of requests with one kernel call per species.
+
+    Each request's spectra and altitudes are prepared and validated separately,
+    after which the spectra of all requests are evaluated together at the union
+    of their altitudes, and each request takes its own altitudes from the
+    result. If the shared evaluation fails, each request is evaluated on its
+    own, so that an error only reaches the requests that cause it.
+
+    Parameters
+    ----------
+    requests : List[_DoseRequest]
+        Requests to calculate
+
+    Returns
+    -------
+    List[Union[pd.DataFrame, np.ndarray, Exception]]
+        Output of each request, or the exception raised while calculating it
+    """
+    results: List[Any] = [None] * len(requests)
+    preparedRequests = []
+    for requestIndex, request in enumerate(requests):
+        try:
+            if request.output not in doseAndFluxCalculator.doseRateOutputFormats:
+                raise ValueError(f"output must be one of {doseAndFluxCalculator.doseRateOutputFormats}!")
+            speciesIntegratedFluxes, altitudesInkmArray = doseAndFluxCalculator.calculateSpeciesIntegratedFluxes(
+                request.buildSpeciesEnergySpectra(), request.altitudesInkm, request.verticalCutOffRigidity)
+            altitudesInkmArray = np.asarray(altitudesInkmArray, dtype=np.float64)
+            # Raises for altitudes outside the response tables before they reach the shared evaluation
+            calculate_altitude_layer_params_array(altitudesInkmArray)
+            preparedRequests.append((requestIndex, speciesIntegratedFluxes, altitudesInkmArray))
+        except Exception as exception:
+            results[requestIndex] = exception
+
+    if len(preparedRequests) == 0:
+        return results
+
+    try:
+        _calculatePreparedRequests(requests, preparedRequests, results)
+    except Exception:
+        for preparedRequest in preparedRequests:
+            try:
+                _calculatePreparedRequests(requests, [preparedRequest], results)
+            except Exception as exception:
+                results[preparedRequest[0]] = exception
+
+    return results
+
+def _calculatePreparedRequests(requests: List[_DoseRequest],
+                               preparedRequests: List[Tuple[int, Dict[str, np.ndarray], np.ndarray]],
+                               results: List[Any]):
+    allAltitudesInkm = np.unique(np.concatenate([altitudesInkmArray for _, _, altitudesInkmArray in preparedRequests]))
+
+    # Rows of every species' flux matrix, as (request index, row) pairs
+    speciesRows: Dict[str, List[Tuple[int, np.ndarray]]] = {}
+    for requestIndex, speciesIntegratedFluxes, _ in preparedRequests:
+        for speciesName, inputFluxesIntegrated in speciesIntegratedFluxes.items():
+            speciesRows.setdefault(speciesName, []).append((requestIndex, inputFluxesIntegrated[0]))
+
+    speciesDoses = {}
+    for speciesName, rows in speciesRows.items():
+        doses = batchCalculator.calculateDosesFromSpeciesFluxes({speciesName: np.array([row for _, row in rows])},
+                                                                allAltitudesInkm)
+        speciesDoses[speciesName] = {requestIndex: requestDoses for (requestIndex, _), requestDoses in zip(rows, doses)}
+
+    for requestIndex, speciesIntegratedFluxes, altitudesInkmArray in preparedRequests:
+        altitudeColumns = np.searchsorted(allAltitudesInkm, altitudesInkmArray)
+        doses = sum(speciesDoses[speciesName][requestIndex][altitudeColumns] for speciesName in speciesIntegratedFluxes)
+        results[requestIndex] = doseAndFluxCalculator.formatDoseRateOutput(
+            doseAndFluxCalculator.createDoseRateArray(altitudesInkmArray, doses), requests[requestIndex].output)
+
+class AsyncDoseCalculator:
+    """
+    asyncio interface to the dose calculators.
+
+    Calculations run in a bounded executor, so the event loop is never blocked.
+    Requests that arrive within batchWindowInSeconds of each other are
+    micro-batched: their spectra are evaluated together in a single batched
+    kernel call per species. Concurrent requests for the same spectrum,
+    altitudes, particle, cutoff and output format are coalesced into a single
+    calculation, and each caller receives its own copy of the result.
+
+    An AsyncDoseCalculator must only be used from one event loop at a time.
+
+    Attributes
+    ----------
+    batchWindowInSeconds : float
+        Time to wait for further requests before a batch is calculated
+    maxBatchSize : int
+        Number of requests after which a batch is calculated without waiting
+    coalescedRequests : int
+        Number of requests served by an identical calculation already in flight
+    batchesCalculated : int
+        Number of batches calculated
+
+    Methods
+    -------
+    calculate_from_energy_spec(...)
+    calculate_from_rigidity_spec(...)
+    calculate_from_energy_spec_array(...)
+    calculate_from_rigidity_spec_array(...)
+        Coroutine versions of the functions in doseAndFluxCalculator
+    shutdown()
+        Shut down the executor, if it was created by this calculator
+    """
+
+    def __init__(self, maxWorkers: int = 4, batchWindowInSeconds: float = 0.002, maxBatchSize: int = 256,
+                 executor: Optional[Executor] = None):
+        """
+        Initialize the calculator.
+
+        Parameters
+        ----------
+        maxWorkers : int, default=4
+            Number of threads in the executor, which bounds the number of
+            batches calculated at the same time
+        batchWindowInSeconds : float, default=0.002
+            Time to wait for further requests before a batch is calculated,
+            0 to calculate requests as soon as the event loop is idle
+        maxBatchSize : int, default=256
+            Number of requests after which a batch is calculated without waiting
+        executor : concurrent.futures.Executor, optional
+            Executor to run calculations in instead of a new thread pool
+        """
+        if maxBatchSize < 1:
+            raise ValueError("maxBatchSize must be at least 1!")
+        if batchWindowInSeconds < 0:
+            raise ValueError("batchWindowInSeconds must not be negative!")
+
+        self.batchWindowInSeconds = batchWindowInSeconds
+        self.maxBatchSize = maxBatchSize
+        self.coalescedRequests = 0
+        self.batchesCalculated = 0
+
+        self._ownsExecutor = executor is None
+        self._executor = executor if executor is not None else ThreadPoolExecutor(max_workers=maxWorkers)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._inFlightRequests: Dict[Hashable, _DoseRequest] = {}
+        self._pendingRequests: List[_DoseRequest] = []
+        self._flushHandle: Optional[asyncio.Handle] = None
+
+    def _bindToRunningLoop(self) -> asyncio.AbstractEventLoop:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # State from a previous (closed) event loop cannot be awaited from this one
+            self._loop = loop
+            self._inFlightRequests = {}
+            self._pendingRequests = []
+            self._flushHandle = None
+        return loop
+
+    async def _calculate(self, key: Hashable,
+                         buildSpeciesEnergySpectra: Callable[[], Dict[str, Tuple[np.ndarray, np.ndarray]]],
+                         altitudesInkm: Union[np.ndarray, List[float]],
+                         verticalCutOffRigidity: float,
+                         output: str) -> Union[pd.DataFrame, np.ndarray]:
+        loop = self._bindToRunningLoop()
+
+        request = self._inFlightRequests.get(key)
+        if request is not None:
+            self.coalescedRequests += 1
+        else:
+            request = _DoseRequest(key, buildSpeciesEnergySpectra, altitudesInkm, verticalCutOffRigidity, output,
+                                   loop.create_future())
+            self._inFlightRequests[key] = request
+            self._pendingRequests.append(request)
+
+            if len(self._pendingRequests) >= self.maxBatchSize:
+                self._flush()
+            elif self._flushHandle is None:
+                self._flushHandle = loop.call_later(self.batchWindowInSeconds, self._flush)
+
+        # Shielded so that one caller cancelling does not cancel the calculation for the others
+        result = await asyncio.shield(request.future)
+        return result.copy()
+
+    def _flush(self):
+        if self._flushHandle is not None:
+            self._flushHandle.cancel()
+            self._flushHandle = None
+
+        requests, self._pendingRequests = self._pendingRequests, []
+        if len(requests) > 0:
+            self._loop.create_task(self._runBatch(requests))
+
+    async def _runBatch(self, requests: List[_DoseRequest]):
+        try:
+            results = await self._loop.run_in_executor(self._executor, calculateDoseRequestBatch, requests)
+            self.batchesCalculated += 1
+        except Exception as exception:
+            results = [exception] * len(requests)
+
+        for request, result in zip(requests, results):
+            self._inFlightRequests.pop(request.key, None)
+            if request.future.done():
+                continue
+            if isinstance(result, Exception):
+                request.future.set_exception(result)
+            else:
+                request.future.set_result(result)
+
+    async def calculate_from_energy_spec(self,
+                                         inputEnergyDistributionFunctionMeV: Callable,
+                                         altitudesInkm: List[float],
+                                         particleName: str = "proton",
+                                         inputEnergyBins: np.ndarray = settings.defaultEnergyBins,
+                                         verticalCutOffRigidity: float = 0.0,
+                                         output: str = "dataframe") -> Union[pd.DataFrame, np.ndarray]:
+        """
+        Coroutine version of doseAndFluxCalculator.calculate_from_energy_spec.
+        """
+        doseAndFluxCalculator.checkEnergySpectrumFunctionCutOff(verticalCutOffRigidity)
+        key = ("energy_spec", calculateValueKey(inputEnergyDistributionFunctionMeV), calculateValueKey(inputEnergyBins),
+               calculateValueKey(altitudesInkm), particleName, float(verticalCutOffRigidity), output)
+        return await self._calculate(key,
+                                     lambda: doseAndFluxCalculator.calculateSpeciesEnergySpectraFromEnergyFunction(
+                                         inputEnergyDistributionFunctionMeV, particleName, inputEnergyBins),
+                                     altitudesInkm, verticalCutOffRigidity, output)
+
+    async def calculate_from_rigidity_spec(self,
+                                           inputRigidityDistributionFunctionGV: Callable,
+                                           altitudesInkm: List[float],
+                                           particleName: str = "proton",
+                                           inputRigidityBins: np.ndarray = None,
+                                           verticalCutOffRigidity: float = 0.0,
+                                           output: str = "dataframe") -> Union[pd.DataFrame, np.ndarray]:
+        """
+        Coroutine version of doseAndFluxCalculator.calculate_from_rigidity_spec.
+        """
+        key = ("rigidity_spec", calculateValueKey(inputRigidityDistributionFunctionGV),
+               calculateValueKey(inputRigidityBins), calculateValueKey(altitudesInkm), particleName,
+               float(verticalCutOffRigidity), output)
+        return await self._calculate(key,
+                                     lambda: doseAndFluxCalculator.calculateSpeciesEnergySpectraFromRigidityFunction(
+                                         inputRigidityDistributionFunctionGV, particleName,
+                                         inputRigidityBins=inputRigidityBins),
+                                     altitudesInkm, verticalCutOffRigidity, output)
+
+    async def calculate_from_energy_spec_array(self,
+                                               inputEnergyBins: np.ndarray,
+                                               inputFluxesMeV: Union[np.ndarray, List[float]],
+                                               altitudesInkm: Union[np.ndarray, List[float]],
+                                               particleName: str = "proton",
+                                               verticalCutOffRigidity: float = 0.0,
+                                               output: str = "dataframe") -> Union[pd.DataFrame, np.ndarray]:
+        """
+        Coroutine version of doseAndFluxCalculator.calculate_from_energy_spec_array.
+        """
+        key = ("energy_spec_array", calculateValueKey(inputEnergyBins), calculateValueKey(inputFluxesMeV),
+               calculateValueKey(altitudesInkm), particleName, float(verticalCutOffRigidity), output)
+        return await self._calculate(key,
+                                     lambda: doseAndFluxCalculator.calculateSpeciesEnergySpectraFromEnergyArray(
+                                         inputEnergyBins, inputFluxesMeV, particleName),
+                                     altitudesInkm, verticalCutOffRigidity, output)
+
+    async def calculate_from_rigidity_spec_array(self,
+                                                 inputRigidityBins: np.ndarray,
+                                                 inputFluxesGV: Union[np.ndarray, List[float], Callable],
+                                                 altitudesInkm: Union[np.ndarray, List[float]],
+                                                 particleName: str = "proton",
+                                                 verticalCutOffRigidity: float = 0.0,
+                                                 output: str = "dataframe") -> Union[pd.DataFrame, np.ndarray]:
+        """
+        Coroutine version of doseAndFluxCalculator.calculate_from_rigidity_spec_array.
+        """
+        key = ("rigidity_spec_array", calculateValueKey(inputRigidityBins), calculateValueKey(inputFluxesGV),
+               calculateValueKey(altitudesInkm), particleName, float(verticalCutOffRigidity), output)
+        return await self._calculate(key,
+                                     lambda: doseAndFluxCalculator.calculateSpeciesEnergySpectraFromRigidityArray(
+                                         inputRigidityBins, inputFluxesGV, particleName),
+                                     altitudesInkm, verticalCutOffRigidity, output)
+
+    def shutdown(self):
+        """
+        Shut down the executor, if it was created by this calculator.
+        """
+        if self._ownsExecutor:
+            self._executor.shutdown(wait=True)
+
+_defaultAsyncDoseCalculator: Optional[AsyncDoseCalculator] = None
+
+def getDefaultAsyncDoseCalculator() -> AsyncDoseCalculator:
+    """
+    Get the AsyncDoseCalculator used by the module-level coroutines, creating it on first use.
+
+    Returns
+    -------
+    AsyncDoseCalculator
+        The shared calculator
+    """
+    global _defaultAsyncDoseCalculator
+    if _defaultAsyncDoseCalculator is None:
+        _defaultAsyncDoseCalculator = AsyncDoseCalculator()
+    return _defaultAsyncDoseCalculator
+
+async def calculate_from_energy_spec_async(*args, **kwargs) -> Union[pd.DataFrame, np.ndarray]:
+    """
+    Coroutine version of calculate_from_energy_spec, see AsyncDoseCalculator.
+    """
+    return await getDefaultAsyncDoseCalculator().calculate_from_energy_spec(*args, **kwargs)
+
+async def calculate_from_rigidity_spec_async(*args, **kwargs) -> Union[pd.DataFrame, np.ndarray]:
+    """
+    Coroutine version of calculate_from_rigidity_spec, see AsyncDoseCalculator.
+    """
+    return await getDefaultAsyncDoseCalculator().calculate_from_rigidity_spec(*args, **kwargs)
+
+async def calculate_from_energy_spec_array_async(*args, **kwargs) -> Union[pd.DataFrame, np.ndarray]:
+    """
+    Coroutine version of calculate_from_energy_spec_array, see AsyncDoseCalculator.
+    """
+    return await getDefaultAsyncDoseCalculator().calculate_from_energy_spec_array(*args, **kwargs)
+
+async def calculate_from_rigidity_spec_array_async(*args, **kwargs) -> Union[pd.DataFrame, np.ndarray]:
+    """
+    Coroutine version of calculate_from_rigidity_spec_array, see AsyncDoseCalculator.
+    """
+    return await getDefaultAsyncDoseCalculator().calculate_from_rigidity_spec_array(*args, **kwargs)
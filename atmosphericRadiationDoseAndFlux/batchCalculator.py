@@ -0,0 +1,428 @@
+import numpy as np
+from typing import Dict, List, Tuple, Union
+
+from . import particle
+from . import particleResponse
+from . import settings
+from . import parallelExecution
+from .energyRebinning import rebinEnergySpectraToMaireGrid
+from .responseFileParameters import calculate_altitude_layer_params_array, calculate_altitude_layer_slopes_array
+
+import ParticleRigidityCalculationTools as PRCT
+
+# Number of altitude layers in the response files
+numberOfAltitudeLayers = 137
+
+# Number of MAIRE energy bins the response files are tabulated for
+numberOfEnergyBins = 50
+
+def buildAltitudeInterpolationMatrix(altitudesInkm: Union[np.ndarray, List[float]]) -> np.ndarray:
+    """
+    Build the matrix interpolating response tables to a set of altitudes.
+
+    Row m of the matrix holds the weight f1 at the altitude layer of altitudesInkm[m]
+    and (1 - f1) at the layer above, so that multiplying a (layers x ...) response
+    table by this matrix reproduces the interpolation used in calculate_dose_response.
+
+    Parameters
+    ----------
+    altitudesInkm : Union[np.ndarray, List[float]]
+        Altitudes in kilometers
+
+    Returns
+    -------
+    np.ndarray
+        Interpolation matrix with shape (altitudes, altitude layers)
+
+    Raises
+    ------
+    Exception
+        If any altitude is greater than 100 km
+    """
+    altitudeLayerIndices, altIndicesAbove, f1Values = calculate_altitude_layer_params_array(
+        settings.convertListOrFloatToArray(altitudesInkm))
+
+    altitudeRows = np.arange(len(f1Values))
+    interpolationMatrix = np.zeros((len(f1Values), numberOfAltitudeLayers))
+    np.add.at(interpolationMatrix, (altitudeRows, altitudeLayerIndices), f1Values)
+    np.add.at(interpolationMatrix, (altitudeRows, altIndicesAbove), 1.0 - f1Values)
+
+    return interpolationMatrix
+
+def buildAltitudeDerivativeMatrix(altitudesInkm: Union[np.ndarray, List[float]]) -> np.ndarray:
+    """
+    Build the matrix giving the altitude derivative of the interpolated response tables.
+
+    This is the derivative of buildAltitudeInterpolationMatrix with respect to
+    altitude: row m holds df1/dh at the altitude layer of altitudesInkm[m] and
+    -df1/dh at the layer above (see calculate_altitude_layer_slopes_array).
+
+    Parameters
+    ----------
+    altitudesInkm : Union[np.ndarray, List[float]]
+        Altitudes in kilometers
+
+    Returns
+    -------
+    np.ndarray
+        Derivative matrix in 1/km with shape (altitudes, altitude layers)
+    """
+    altitudesInkmArray = settings.convertListOrFloatToArray(altitudesInkm)
+    altitudeLayerIndices, altIndicesAbove, _ = calculate_altitude_layer_params_array(altitudesInkmArray)
+    f1Slopes = calculate_altitude_layer_slopes_array(altitudesInkmArray)
+
+    altitudeRows = np.arange(len(f1Slopes))
+    derivativeMatrix = np.zeros((len(f1Slopes), numberOfAltitudeLayers))
+    np.add.at(derivativeMatrix, (altitudeRows, altitudeLayerIndices), f1Slopes)
+    np.add.at(derivativeMatrix, (altitudeRows, altIndicesAbove), -f1Slopes)
+
+    return derivativeMatrix
+
+def calculateResponseKernelAltitudeDerivatives(altitudesInkm: Union[np.ndarray, List[float]],
+                                               particleName: str) -> np.ndarray:
+    """
+    Calculate the derivative of calculateResponseKernels with respect to altitude.
+
+    Parameters
+    ----------
+    altitudesInkm : Union[np.ndarray, List[float]]
+        Altitudes in kilometers
+    particleName : str
+        Particle type ("proton" or "alpha")
+
+    Returns
+    -------
+    np.ndarray
+        Array with shape (altitudes, response types, 50 energy bins), per km
+    """
+    responseTensor = particleResponse.getStackedResponseTensor(particleName)
+    derivativeMatrix = buildAltitudeDerivativeMatrix(altitudesInkm)
+
+    layerMajorResponses = responseTensor.transpose(1, 0, 2).reshape(numberOfAltitudeLayers, -1)
+    kernelDerivatives = derivativeMatrix @ layerMajorResponses
+
+    return kernelDerivatives.reshape(len(derivativeMatrix), responseTensor.shape[0], numberOfEnergyBins)
+
+def calculateResponseKernels(altitudesInkm: Union[np.ndarray, List[float]], particleName: str,
+                             parallel: bool = False, deterministic: bool = False) -> np.ndarray:
+    """
+    Calculate the altitude-interpolated response of every response type.
+
+    Parameters
+    ----------
+    altitudesInkm : Union[np.ndarray, List[float]]
+        Altitudes in kilometers
+    particleName : str
+        Particle type ("proton" or "alpha")
+    parallel : bool, default=False
+        If True, interpolate with the multi-threaded Numba kernel instead of a
+        matrix product (see parallelExecution)
+    deterministic : bool, default=False
+        If True and parallel is False, interpolate with the single-threaded twin
+        of the Numba kernel, whose results are bitwise identical to parallel=True
+
+    Returns
+    -------
+    np.ndarray
+        Array with shape (altitudes, response types, 50 energy bins), which gives
+        the dose or flux at each altitude when contracted with energy-integrated fluxes
+    """
+    responseTensor = particleResponse.getStackedResponseTensor(particleName)
+
+    if parallel or deterministic:
+        altitudeLayerIndices, altIndicesAbove, f1Values = calculate_altitude_layer_params_array(
+            settings.convertListOrFloatToArray(altitudesInkm))
+        kernelArguments = (responseTensor,
+                           altitudeLayerIndices.astype(np.int64),
+                           altIndicesAbove.astype(np.int64),
+                           f1Values.astype(np.float64))
+        if parallel:
+            return parallelExecution.runParallelKernel(parallelExecution.calculate_response_kernels_parallel,
+                                                       *kernelArguments)
+        return parallelExecution.calculate_response_kernels_serial(*kernelArguments)
+
+    interpolationMatrix = buildAltitudeInterpolationMatrix(altitudesInkm)
+
+    numberOfResponseTypes = responseTensor.shape[0]
+
+    # (altitudes x layers) @ (layers x responses*bins), as a single BLAS matrix product
+    layerMajorResponses = responseTensor.transpose(1, 0, 2).reshape(numberOfAltitudeLayers, -1)
+    kernels = interpolationMatrix @ layerMajorResponses
+
+    return kernels.reshape(len(interpolationMatrix), numberOfResponseTypes, numberOfEnergyBins)
+
+def calculateCutoffEnergies(verticalCutOffRigidities: Union[float, np.ndarray, List[float]],
+                            particleName: str) -> np.ndarray:
+    """
+    Convert vertical cutoff rigidities to kinetic energies per nucleon.
+
+    Each distinct cutoff is only converted once, and all distinct cutoffs are
+    converted in a single call to ParticleRigidityCalculationTools.
+
+    Parameters
+    ----------
+    verticalCutOffRigidities : Union[float, np.ndarray, List[float]]
+        Vertical cutoff rigidities in GV
+    particleName : str
+        Particle type ("proton" or "alpha")
+
+    Returns
+    -------
+    np.ndarray
+        Cutoff energies in MeV/n with the shape of verticalCutOffRigidities,
+        zero wherever the cutoff rigidity is not positive
+    """
+    verticalCutOffRigiditiesArray = np.asarray(verticalCutOffRigidities, dtype=np.float64)
+    uniqueCutOffRigidities, inverseIndices = np.unique(verticalCutOffRigiditiesArray, return_inverse=True)
+
+    uniqueCutoffEnergies = np.zeros(len(uniqueCutOffRigidities))
+    positiveCutOffs = uniqueCutOffRigidities > 0
+    if np.any(positiveCutOffs):
+        particleForCalculations = particle.Particle(particleName)
+        uniqueCutoffEnergies[positiveCutOffs] = np.asarray(PRCT.convertTotalRigidityToPerNucleonEnergy(
+            uniqueCutOffRigidities[positiveCutOffs],
+            particleMassAU=particleForCalculations.atomicMass,
+            particleChargeAU=particleForCalculations.atomicCharge), dtype=np.float64)
+
+    return uniqueCutoffEnergies[inverseIndices].reshape(verticalCutOffRigiditiesArray.shape)
+
+def formatFluxMatrix(inputEnergyBins: Union[np.ndarray, List[float]],
+                     inputFluxesMatrix: Union[np.ndarray, List[List[float]]],
+                     particleName: str,
+                     verticalCutOffRigidity: Union[float, np.ndarray, List[float]]) -> np.ndarray:
+    """
+    Validate a matrix of spectra and convert it to energy-integrated fluxes.
+
+    Parameters
+    ----------
+    inputEnergyBins : Union[np.ndarray, List[float]]
+        Energy bin edges in MeV/n. Spectra on other grids than the 51-edge MAIRE
+        grid are rebinned onto it, see energyRebinning.rebinEnergySpectraToMaireGrid.
+    inputFluxesMatrix : Union[np.ndarray, List[List[float]]]
+        Differential fluxes (particles/cm²/sr/(MeV/n)/s) with one spectrum per row
+    particleName : str
+        Particle type ("proton" or "alpha")
+    verticalCutOffRigidity : Union[float, np.ndarray, List[float]]
+        Vertical cutoff rigidity in GV, either one for all spectra or one per spectrum
+
+    Returns
+    -------
+    np.ndarray
+        Energy-integrated fluxes (particles/cm²/s) with shape (spectra, 50)
+
+    Raises
+    ------
+    Exception
+        If the energy bins, flux matrix or cutoff rigidities have the wrong shape
+    """
+    inputEnergyBinsArray, inputFluxesArray = rebinEnergySpectraToMaireGrid(
+        np.asarray(inputEnergyBins, dtype=np.float64),
+        np.atleast_2d(np.asarray(inputFluxesMatrix, dtype=np.float64)))
+    verticalCutOffRigidityArray = np.asarray(verticalCutOffRigidity, dtype=np.float64)
+
+    if inputEnergyBinsArray.shape != (numberOfEnergyBins + 1,):
+        raise Exception(f"Batched calculations require {numberOfEnergyBins + 1} energy bin edges!")
+    if inputFluxesArray.ndim != 2 or inputFluxesArray.shape[1] != numberOfEnergyBins:
+        raise Exception("Number of bins does not match number of flux values!")
+    if verticalCutOffRigidityArray.ndim > 1 or \
+            (verticalCutOffRigidityArray.ndim == 1 and len(verticalCutOffRigidityArray) != len(inputFluxesArray)):
+        raise Exception("One vertical cutoff rigidity must be given for all spectra or for each spectrum!")
+
+    # Zero fluxes below the vertical cutoff, as in settings.formatInputVariables
+    if np.any(verticalCutOffRigidityArray > 0):
+        cutoffEnergies = calculateCutoffEnergies(verticalCutOffRigidityArray, particleName)
+        middleOfEnergyBinsArray = (inputEnergyBinsArray[1:] + inputEnergyBinsArray[:-1])/2
+        aboveCutoff = middleOfEnergyBinsArray >= np.reshape(cutoffEnergies, (-1, 1))
+        inputFluxesArray = np.where(aboveCutoff, inputFluxesArray, 0.0)
+
+    inputEnergyDifferences = inputEnergyBinsArray[1:] - inputEnergyBinsArray[:-1]
+
+    return inputFluxesArray * inputEnergyDifferences * np.pi  # units of particles / cm2 / s
+
+def calculateDosesFromSpeciesFluxes(speciesIntegratedFluxes: Dict[str, np.ndarray],
+                                    altitudesInkm: Union[np.ndarray, List[float]],
+                                    returnSpeciesBreakdown: bool = False,
+                                    altitudeResponseCache=None,
+                                    parallel: bool = False,
+                                    deterministic: bool = False) -> Union[np.ndarray, Tuple[np.ndarray, Dict[str, np.ndarray]]]:
+    """
+    Calculate total dose and flux rates from the integrated fluxes of one or more particle species.
+
+    The response kernels of all species are concatenated along the energy axis, so
+    that the total over species is evaluated in a single matrix product rather than
+    by running the calculation once per species and summing the results.
+
+    Parameters
+    ----------
+    speciesIntegratedFluxes : Dict[str, np.ndarray]
+        Energy-integrated fluxes (particles/cm²/s) for each particle name, each with
+        shape (spectra, 50)
+    altitudesInkm : Union[np.ndarray, List[float]]
+        Altitudes in kilometers
+    returnSpeciesBreakdown : bool, default=False
+        If True, also return the dose and flux rates of each species
+    altitudeResponseCache : AltitudeResponseCache, optional
+        Cache to take the altitude-interpolated response matrices from
+    parallel : bool, default=False
+        If True, evaluate with the multi-threaded Numba kernels instead of BLAS
+        matrix products. Their results do not depend on the number of threads
+        (see parallelExecution).
+    deterministic : bool, default=False
+        If True and parallel is False, evaluate with the single-threaded twins of
+        the Numba kernels, whose results are bitwise identical to parallel=True.
+        The default BLAS products agree with both only to rounding.
+
+    Returns
+    -------
+    Union[np.ndarray, Tuple[np.ndarray, Dict[str, np.ndarray]]]
+        Array with shape (spectra, altitudes, response types) summed over species,
+        and if returnSpeciesBreakdown is True, a dictionary of the same array for
+        each species
+    """
+    speciesKernels = {}
+    for particleName in speciesIntegratedFluxes:
+        if altitudeResponseCache is None:
+            speciesKernels[particleName] = calculateResponseKernels(altitudesInkm, particleName, parallel=parallel,
+                                                                    deterministic=deterministic)
+        else:
+            speciesKernels[particleName] = altitudeResponseCache.getEffectiveResponses(particleName, altitudesInkm)
+
+    if parallel or deterministic:
+        return _calculateDosesFromSpeciesFluxesWithNumba(speciesIntegratedFluxes, speciesKernels,
+                                                         returnSpeciesBreakdown, parallel)
+
+    numberOfSpectra = len(next(iter(speciesIntegratedFluxes.values())))
+    numberOfAltitudes, numberOfResponseTypes, _ = next(iter(speciesKernels.values())).shape
+    outputShape = (numberOfSpectra, numberOfAltitudes, numberOfResponseTypes)
+
+    if returnSpeciesBreakdown:
+        speciesDoses = {}
+        for particleName, inputFluxesIntegrated in speciesIntegratedFluxes.items():
+            kernels = speciesKernels[particleName].reshape(-1, numberOfEnergyBins)
+            speciesDoses[particleName] = (inputFluxesIntegrated @ kernels.T).reshape(outputShape)
+        return sum(speciesDoses.values()), speciesDoses
+
+    # (spectra x species*bins) @ (species*bins x altitudes*responses)
+    allInputFluxesIntegrated = np.concatenate(list(speciesIntegratedFluxes.values()), axis=1)
+    allKernels = np.concatenate([speciesKernels[particleName] for particleName in speciesIntegratedFluxes], axis=2)
+    doses = allInputFluxesIntegrated @ allKernels.reshape(numberOfAltitudes * numberOfResponseTypes, -1).T
+
+    return doses.reshape(outputShape)
+
+def _calculateDosesFromSpeciesFluxesWithNumba(speciesIntegratedFluxes: Dict[str, np.ndarray],
+                                              speciesKernels: Dict[str, np.ndarray],
+                                              returnSpeciesBreakdown: bool,
+                                              parallel: bool) -> Union[np.ndarray, Tuple[np.ndarray, Dict[str, np.ndarray]]]:
+    def calculateDoses(inputFluxesIntegrated, kernels):
+        kernelArguments = (np.ascontiguousarray(inputFluxesIntegrated, dtype=np.float64),
+                           np.ascontiguousarray(kernels, dtype=np.float64))
+        if parallel:
+            return parallelExecution.runParallelKernel(parallelExecution.calculate_doses_from_kernels_parallel,
+                                                       *kernelArguments)
+        return parallelExecution.calculate_doses_from_kernels_serial(*kernelArguments)
+
+    if returnSpeciesBreakdown:
+        speciesDoses = {particleName: calculateDoses(inputFluxesIntegrated, speciesKernels[particleName])
+                        for particleName, inputFluxesIntegrated in speciesIntegratedFluxes.items()}
+        return sum(speciesDoses.values()), speciesDoses
+
+    allInputFluxesIntegrated = np.concatenate(list(speciesIntegratedFluxes.values()), axis=1)
+    allKernels = np.concatenate([speciesKernels[particleName] for particleName in speciesIntegratedFluxes], axis=2)
+    return calculateDoses(allInputFluxesIntegrated, allKernels)
+
+def calculateDosesForSpectrumAltitudePairs(speciesIntegratedFluxes: Dict[str, np.ndarray],
+                                           altitudesInkm: Union[np.ndarray, List[float]]) -> np.ndarray:
+    """
+    Calculate total dose and flux rates for spectra paired one-to-one with altitudes.
+
+    Unlike calculateDosesFromSpeciesFluxes, which evaluates every spectrum at
+    every altitude, spectrum n is only evaluated at altitudesInkm[n], as needed
+    for points along a trajectory.
+
+    Parameters
+    ----------
+    speciesIntegratedFluxes : Dict[str, np.ndarray]
+        Energy-integrated fluxes (particles/cm²/s) for each particle name, each with
+        shape (spectra, 50)
+    altitudesInkm : Union[np.ndarray, List[float]]
+        Altitudes in kilometers, one per spectrum
+
+    Returns
+    -------
+    np.ndarray
+        Array with shape (spectra, response types) summed over species
+    """
+    doses = 0.0
+    for particleName, inputFluxesIntegrated in speciesIntegratedFluxes.items():
+        kernels = calculateResponseKernels(altitudesInkm, particleName)
+        doses = doses + np.einsum("nrb,nb->nr", kernels, inputFluxesIntegrated)
+
+    return doses
+
+def calculate_from_energy_spec_batch(
+                            inputEnergyBins: np.ndarray,
+                            inputFluxesMatrix: Union[np.ndarray, List[List[float]]],
+                            altitudesInkm: Union[np.ndarray, List[float]],
+                            particleName: str = "proton",
+                            verticalCutOffRigidity: float = 0.0,
+                            altitudeResponseCache=None,
+                            returnSpeciesBreakdown: bool = False,
+                            parallel: bool = False,
+                            deterministic: bool = False) -> Union[np.ndarray, Tuple[np.ndarray, Dict[str, np.ndarray]]]:
+    """
+    Calculate dose and flux rates for many spectra and altitudes at once.
+
+    All response tables are stacked into one (responses x layers x 50) tensor and
+    interpolated to every altitude with a single matrix product, after which all
+    spectra are evaluated with a second matrix product.
+
+    Parameters:
+    -----------
+    inputEnergyBins : np.ndarray
+        Energy bin edges in MeV/n, spectra on other grids than the 51-edge MAIRE
+        grid are rebinned onto it
+    inputFluxesMatrix : Union[np.ndarray, List[List[float]]]
+        Differential flux values at bin midpoints (particles/cm²/sr/(MeV/n)/s),
+        with shape (spectra, bins). A single spectrum of shape (bins,) is also accepted.
+    altitudesInkm : Union[np.ndarray, List[float]]
+        Altitudes in kilometers
+    particleName : str, default="proton"
+        Particle type ("proton", "alpha", or "both"). For "both", the same
+        per-nucleon spectra are applied to both species, and both are evaluated
+        in a single matrix product.
+    verticalCutOffRigidity : float, default=0.0
+        Vertical cutoff rigidity in GV
+    altitudeResponseCache : AltitudeResponseCache, optional
+        Cache to take the altitude-interpolated response matrices from, instead
+        of recalculating them for every call
+    returnSpeciesBreakdown : bool, default=False
+        If True, also return a dictionary of the results for each species
+    parallel : bool, default=False
+        If True, evaluate all (spectrum, altitude) pairs in parallel with Numba,
+        using the number of threads set by parallelExecution.setNumberOfThreads
+        or the ATMOSPHERIC_RADIATION_NUM_THREADS environment variable (at most
+        NUMBA_NUM_THREADS). Results are bitwise identical for any number of threads.
+    deterministic : bool, default=False
+        If True and parallel is False, run the same Numba kernels on a single
+        thread, giving results bitwise identical to parallel=True. The default
+        BLAS matrix products agree with both only to rounding.
+
+    Returns:
+    --------
+    Union[np.ndarray, Tuple[np.ndarray, Dict[str, np.ndarray]]]
+        Array with shape (spectra, altitudes, response types), with response types
+        ordered as in particleResponse.fullListOfDoseResponseTypes
+        (edose, adose, dosee, tn1, tn2, tn3), and if returnSpeciesBreakdown is
+        True, a dictionary of the same array for each species
+    """
+    speciesIntegratedFluxes = {
+        speciesName: formatFluxMatrix(inputEnergyBins, inputFluxesMatrix, speciesName, verticalCutOffRigidity)
+        for speciesName in settings.getParticleNamesForCalculation(particleName)
+    }
+
+    return calculateDosesFromSpeciesFluxes(speciesIntegratedFluxes,
+                                           altitudesInkm,
+                                           returnSpeciesBreakdown=returnSpeciesBreakdown,
+                                           altitudeResponseCache=altitudeResponseCache,
+                                           parallel=parallel,
+                                           deterministic=deterministic)
@@ -0,0 +1,413 @@
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+from typing import Callable, Dict, Iterable, List, Optional, Any
+
+# Version of the binary table layout, bump when the header or array layout changes
+binaryFormatVersion = 1
+
+# Name of the binary table holding the response tables of a particle stacked into one tensor
+stackedResponseTensorName = "stackedResponseTensor"
+
+# Environment variables controlling the binary table cache
+cacheDirectoryEnvironmentVariable = "ATMOSPHERIC_RADIATION_CACHE_DIR"
+disableBinaryTablesEnvironmentVariable = "ATMOSPHERIC_RADIATION_DISABLE_BINARY_TABLES"
+
+def binaryTablesEnabled() -> bool:
+    """
+    Check whether binary response tables should be used.
+
+    Returns
+    -------
+    bool
+        False if the ATMOSPHERIC_RADIATION_DISABLE_BINARY_TABLES environment
+        variable is set to a true value, True otherwise
+    """
+    return os.environ.get(disableBinaryTablesEnvironmentVariable, "").lower() not in ("1", "true", "yes")
+
+def getBinaryTableDirectory() -> str:
+    """
+    Get the directory binary response tables are stored in.
+
+    Returns
+    -------
+    str
+        The ATMOSPHERIC_RADIATION_CACHE_DIR environment variable if set, otherwise
+        atmosphericRadiationDoseAndFlux/responseTables under the user cache directory
+    """
+    cacheDirectory = os.environ.get(cacheDirectoryEnvironmentVariable)
+    if cacheDirectory:
+        return cacheDirectory
+
+    userCacheDirectory = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(userCacheDirectory, "atmosphericRadiationDoseAndFlux", "responseTables")
+
+def calculateFileChecksum(pathToFile: str) -> str:
+    """
+    Calculate the SHA-256 checksum of a file.
+
+    Parameters
+    ----------
+    pathToFile : str
+        Path to the file
+
+    Returns
+    -------
+    str
+        Hexadecimal SHA-256 digest of the file contents
+    """
+    with open(pathToFile, "rb") as fileToHash:
+        return hashlib.sha256(fileToHash.read()).hexdigest()
+
+def getBinaryTablePaths(particleName: str, responseFileName: str,
+                        binaryTableDirectory: Optional[str] = None) -> Dict[str, str]:
+    """
+    Get the array and header paths of a binary response table.
+
+    Parameters
+    ----------
+    particleName : str
+        Name of the particle ('proton' or 'alpha')
+    responseFileName : str
+        Name of the ASCII response file (e.g. 'edose.rpf')
+    binaryTableDirectory : str, optional
+        Directory containing binary tables, defaults to getBinaryTableDirectory()
+
+    Returns
+    -------
+    Dict[str, str]
+        Dictionary with 'array' (.npy) and 'header' (.json) paths
+    """
+    if binaryTableDirectory is None:
+        binaryTableDirectory = getBinaryTableDirectory()
+
+    responseType = os.path.splitext(responseFileName)[0]
+    baseName = os.path.join(binaryTableDirectory, f"{particleName}_{responseType}")
+    return {"array": baseName + ".npy", "header": baseName + ".json"}
+
+def _readHeader(pathToHeader: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(pathToHeader) as headerFile:
+            return json.load(headerFile)
+    except (OSError, ValueError):
+        return None
+
+def _writeAtomically(pathToFile: str, writeFunction):
+    directory = os.path.dirname(pathToFile)
+    fileDescriptor, temporaryPath = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fileDescriptor, "wb") as temporaryFile:
+            writeFunction(temporaryFile)
+        os.replace(temporaryPath, pathToFile)
+    except BaseException:
+        if os.path.exists(temporaryPath):
+            os.remove(temporaryPath)
+        raise
+
+def writeBinaryTable(particleName: str, responseFileName: str, pathToSourceFile: str,
+                     responseArray: np.ndarray, binaryTableDirectory: Optional[str] = None) -> Dict[str, str]:
+    """
+    Write a response table to the binary format.
+
+    The table is stored as a float64 .npy file, next to a .json header
+    describing the particle, response type, shape and the checksum of the
+    ASCII source file it was converted from.
+
+    Parameters
+    ----------
+    particleName : str
+        Name of the particle ('proton' or 'alpha')
+    responseFileName : str
+        Name of the ASCII response file (e.g. 'edose.rpf')
+    pathToSourceFile : str
+        Path to the ASCII response file the table was parsed from
+    responseArray : np.ndarray
+        Parsed response table
+    binaryTableDirectory : str, optional
+        Directory to write to, defaults to getBinaryTableDirectory()
+
+    Returns
+    -------
+    Dict[str, str]
+        Dictionary with the written 'array' and 'header' paths
+    """
+    paths = getBinaryTablePaths(particleName, responseFileName, binaryTableDirectory)
+    os.makedirs(os.path.dirname(paths["array"]), exist_ok=True)
+
+    responseArray = np.ascontiguousarray(responseArray, dtype=np.float64)
+    header = {
+        "formatVersion": binaryFormatVersion,
+        "particle": particleName,
+        "responseType": os.path.splitext(responseFileName)[0],
+        "altitudeLayers": int(responseArray.shape[0]),
+        "columns": int(responseArray.shape[1]),
+        "dtype": "float64",
+        "sourceSha256": calculateFileChecksum(pathToSourceFile),
+    }
+
+    # The array is written first so that a valid header always refers to a complete array
+    _writeAtomically(paths["array"], lambda arrayFile: np.save(arrayFile, responseArray))
+    _writeAtomically(paths["header"], lambda headerFile: headerFile.write(json.dumps(header, indent=1).encode()))
+
+    return paths
+
+def loadBinaryTable(particleName: str, responseFileName: str, pathToSourceFile: str,
+                    binaryTableDirectory: Optional[str] = None) -> Optional[np.ndarray]:
+    """
+    Memory-map a binary response table if it is up to date.
+
+    Parameters
+    ----------
+    particleName : str
+        Name of the particle ('proton' or 'alpha')
+    responseFileName : str
+        Name of the ASCII response file (e.g. 'edose.rpf')
+    pathToSourceFile : str
+        Path to the ASCII response file, used to check the table is not stale
+    binaryTableDirectory : str, optional
+        Directory containing binary tables, defaults to getBinaryTableDirectory()
+
+    Returns
+    -------
+    Optional[np.ndarray]
+        Read-only memory-mapped table, or None if the table is missing, stale
+        or unreadable
+    """
+    paths = getBinaryTablePaths(particleName, responseFileName, binaryTableDirectory)
+
+    header = _readHeader(paths["header"])
+    if header is None or header.get("formatVersion") != binaryFormatVersion:
+        return None
+    if header.get("sourceSha256") != calculateFileChecksum(pathToSourceFile):
+        return None
+
+    try:
+        responseArray = np.load(paths["array"], mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+
+    if responseArray.dtype != np.float64 or responseArray.shape != (header["altitudeLayers"], header["columns"]):
+        return None
+
+    return responseArray
+
+def loadOrConvertResponseTable(particleName: str, responseFileName: str, pathToSourceFile: str,
+                               binaryTableDirectory: Optional[str] = None) -> np.ndarray:
+    """
+    Load a response table from the binary cache, converting the ASCII file on first use.
+
+    The ASCII response files remain the source of truth: a binary table is only
+    used if the checksum stored in its header matches the ASCII file, otherwise
+    it is regenerated. If the cache directory cannot be written to, the parsed
+    ASCII table is returned directly.
+
+    Parameters
+    ----------
+    particleName : str
+        Name of the particle ('proton' or 'alpha')
+    responseFileName : str
+        Name of the ASCII response file (e.g. 'edose.rpf')
+    pathToSourceFile : str
+        Path to the ASCII response file
+    binaryTableDirectory : str, optional
+        Directory containing binary tables, defaults to getBinaryTableDirectory()
+
+    Returns
+    -------
+    np.ndarray
+        Read-only response table
+    """
+    responseArray = loadBinaryTable(particleName, responseFileName, pathToSourceFile, binaryTableDirectory)
+    if responseArray is not None:
+        return responseArray
+
+    parsedArray = np.genfromtxt(pathToSourceFile)
+    try:
+        writeBinaryTable(particleName, responseFileName, pathToSourceFile, parsedArray, binaryTableDirectory)
+    except OSError:
+        return parsedArray
+
+    responseArray = loadBinaryTable(particleName, responseFileName, pathToSourceFile, binaryTableDirectory)
+    return parsedArray if responseArray is None else responseArray
+
+def calculateSourceChecksum(pathsToSourceFiles: Iterable[str]) -> str:
+    """
+    Calculate a combined SHA-256 checksum of several files.
+
+    Parameters
+    ----------
+    pathsToSourceFiles : Iterable[str]
+        Paths to the files, in a fixed order
+
+    Returns
+    -------
+    str
+        Hexadecimal SHA-256 digest of the checksums of all files
+    """
+    combinedHash = hashlib.sha256()
+    for pathToSourceFile in pathsToSourceFiles:
+        combinedHash.update(calculateFileChecksum(pathToSourceFile).encode())
+    return combinedHash.hexdigest()
+
+def writeStackedResponseTensor(particleName: str, pathsToSourceFiles: List[str], responseTensor: np.ndarray,
+                               binaryTableDirectory: Optional[str] = None) -> Dict[str, str]:
+    """
+    Write the stacked response tensor of a particle to the binary format.
+
+    The tensor is stored like a response table, with a header holding its
+    shape and the combined checksum of the ASCII files it was built from.
+
+    Parameters
+    ----------
+    particleName : str
+        Name of the particle ('proton' or 'alpha')
+    pathsToSourceFiles : List[str]
+        Paths to the ASCII response files the tensor was built from
+    responseTensor : np.ndarray
+        Stacked response tensor
+    binaryTableDirectory : str, optional
+        Directory to write to, defaults to getBinaryTableDirectory()
+
+    Returns
+    -------
+    Dict[str, str]
+        Dictionary with the written 'array' and 'header' paths
+    """
+    paths = getBinaryTablePaths(particleName, stackedResponseTensorName, binaryTableDirectory)
+    os.makedirs(os.path.dirname(paths["array"]), exist_ok=True)
+
+    responseTensor = np.ascontiguousarray(responseTensor, dtype=np.float64)
+    header = {
+        "formatVersion": binaryFormatVersion,
+        "particle": particleName,
+        "responseType": stackedResponseTensorName,
+        "shape": list(responseTensor.shape),
+        "dtype": "float64",
+        "sourceSha256": calculateSourceChecksum(pathsToSourceFiles),
+    }
+
+    _writeAtomically(paths["array"], lambda arrayFile: np.save(arrayFile, responseTensor))
+    _writeAtomically(paths["header"], lambda headerFile: headerFile.write(json.dumps(header, indent=1).encode()))
+
+    return paths
+
+def loadStackedResponseTensor(particleName: str, pathsToSourceFiles: List[str],
+                              binaryTableDirectory: Optional[str] = None) -> Optional[np.ndarray]:
+    """
+    Memory-map the stacked response tensor of a particle if it is up to date.
+
+    Parameters
+    ----------
+    particleName : str
+        Name of the particle ('proton' or 'alpha')
+    pathsToSourceFiles : List[str]
+        Paths to the ASCII response files, used to check the tensor is not stale
+    binaryTableDirectory : str, optional
+        Directory containing binary tables, defaults to getBinaryTableDirectory()
+
+    Returns
+    -------
+    Optional[np.ndarray]
+        Read-only memory-mapped tensor, or None if the tensor is missing, stale
+        or unreadable
+    """
+    paths = getBinaryTablePaths(particleName, stackedResponseTensorName, binaryTableDirectory)
+
+    header = _readHeader(paths["header"])
+    if header is None or header.get("formatVersion") != binaryFormatVersion:
+        return None
+    if header.get("sourceSha256") != calculateSourceChecksum(pathsToSourceFiles):
+        return None
+
+    try:
+        responseTensor = np.load(paths["array"], mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+
+    if responseTensor.dtype != np.float64 or list(responseTensor.shape) != header.get("shape"):
+        return None
+
+    return responseTensor
+
+def loadOrBuildStackedResponseTensor(particleName: str, pathsToSourceFiles: List[str],
+                                     buildTensor: Callable[[], np.ndarray],
+                                     binaryTableDirectory: Optional[str] = None) -> np.ndarray:
+    """
+    Load the stacked response tensor of a particle from the binary cache, building it on first use.
+
+    Memory-mapping the stored tensor avoids stacking the individual response
+    tables into a new array in every process. If the cache directory cannot be
+    written to, the built tensor is returned directly.
+
+    Parameters
+    ----------
+    particleName : str
+        Name of the particle ('proton' or 'alpha')
+    pathsToSourceFiles : List[str]
+        Paths to the ASCII response files the tensor is built from
+    buildTensor : Callable[[], np.ndarray]
+        Function building the tensor if it is missing or stale
+    binaryTableDirectory : str, optional
+        Directory containing binary tables, defaults to getBinaryTableDirectory()
+
+    Returns
+    -------
+    np.ndarray
+        Read-only stacked response tensor
+    """
+    responseTensor = loadStackedResponseTensor(particleName, pathsToSourceFiles, binaryTableDirectory)
+    if responseTensor is not None:
+        return responseTensor
+
+    builtTensor = buildTensor()
+    try:
+        writeStackedResponseTensor(particleName, pathsToSourceFiles, builtTensor, binaryTableDirectory)
+    except OSError:
+        return builtTensor
+
+    responseTensor = loadStackedResponseTensor(particleName, pathsToSourceFiles, binaryTableDirectory)
+    return builtTensor if responseTensor is None else responseTensor
+
+def buildBinaryResponseTables(binaryTableDirectory: Optional[str] = None,
+                              particleNames: Optional[Iterable[str]] = None) -> List[str]:
+    """
+    Convert all ASCII response files to binary tables ahead of time.
+
+    Parameters
+    ----------
+    binaryTableDirectory : str, optional
+        Directory to write to, defaults to getBinaryTableDirectory()
+    particleNames : Iterable[str], optional
+        Particles to convert tables for, defaults to all supported particles
+
+    Returns
+    -------
+    List[str]
+        Paths of the written binary arrays, including the stacked response tensors
+    """
+    from .particleResponse import buildStackedResponseTensor
+    from .responseTableRegistry import getPathToResponseFile, responseFileNames, supportedParticleNames
+
+    if particleNames is None:
+        particleNames = supportedParticleNames
+
+    writtenPaths = []
+    for particleName in particleNames:
+        pathsToSourceFiles = []
+        for responseFileName in responseFileNames:
+            pathToSourceFile = getPathToResponseFile(particleName, responseFileName)
+            paths = writeBinaryTable(particleName, responseFileName, pathToSourceFile,
+                                     np.genfromtxt(pathToSourceFile), binaryTableDirectory)
+            pathsToSourceFiles.append(pathToSourceFile)
+            writtenPaths.append(paths["array"])
+        paths = writeStackedResponseTensor(particleName, pathsToSourceFiles, buildStackedResponseTensor(particleName),
+                                           binaryTableDirectory)
+        writtenPaths.append(paths["array"])
+
+    return writtenPaths
+
+if __name__ == "__main__":
+    for writtenPath in buildBinaryResponseTables():
+        print(writtenPath)
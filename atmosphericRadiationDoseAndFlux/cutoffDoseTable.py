@@ -0,0 +1,128 @@
+import numpy as np
+from typing import Callable, Dict, List, Union
+
+import ParticleRigidityCalculationTools as PRCT
+
+from . import batchCalculator
+from . import particle
+from . import particleResponse
+from . import settings
+from .doseGrid import calculateSpeciesEnergySpectra
+from .energyRebinning import rebinEnergySpectraToMaireGrid
+from .responseFileParameters import calculate_altitude_layer_params_array
+
+class CutoffDoseTable:
+    """
+    Lookup table of dose and flux rates as a function of cutoff rigidity and altitude for one spectrum.
+
+    Applying a vertical cutoff rigidity zeroes the fluxes of every energy bin
+    whose midpoint lies below the cutoff energy, so for a fixed spectrum the
+    dose at an altitude layer only depends on the first energy bin kept. For
+    each species, altitude layer and response type the table stores the sums
+    of response x integrated flux over all bins from each bin upwards. A dose
+    at any (cutoff, altitude) pair is then the interpolation between two
+    altitude layers of one stored sum, which reproduces
+    calculate_from_energy_spec_array up to floating-point rounding.
+
+    Attributes
+    ----------
+    particleName : str
+        Particle type ("proton", "alpha", or "both")
+    cutoffRigidityThresholds : Dict[str, np.ndarray]
+        For each species, the rigidity in GV of each energy bin midpoint; bins
+        with a threshold below the cutoff rigidity are removed
+    partialSums : Dict[str, np.ndarray]
+        For each species, an array with shape (altitude layers, response types, 51),
+        where [..., k] is the dose or flux contributed by energy bins k and above
+
+    Methods
+    -------
+    calculateDoses(verticalCutOffRigidities, altitudesInkm)
+        Look up dose and flux rates for (cutoff, altitude) pairs
+    """
+
+    def __init__(self, spectrum: Union[np.ndarray, List[float], Callable],
+                 particleName: str = "proton",
+                 inputEnergyBins: np.ndarray = settings.defaultEnergyBins,
+                 spectrumType: str = "energy"):
+        """
+        Precompute the partial sums for a spectrum.
+
+        Parameters
+        ----------
+        spectrum : Union[np.ndarray, List[float], Callable]
+            Spectrum of the incoming particles, either differential fluxes at the
+            midpoints of inputEnergyBins (particles/cm²/sr/(MeV/n)/s) or a function
+            returning them for spectrumType "energy", or a function of rigidity (GV)
+            returning particles/cm²/sr/GV/s for spectrumType "rigidity"
+        particleName : str, default="proton"
+            Particle type ("proton", "alpha", or "both")
+        inputEnergyBins : np.ndarray, default=MAIRE energy bins
+            Energy bin edges in MeV/n for energy spectra, spectra on other grids are rebinned onto the MAIRE grid
+        spectrumType : str, default="energy"
+            "energy" or "rigidity", see calculate_dose_grid
+        """
+        self.particleName = particleName
+        self.cutoffRigidityThresholds: Dict[str, np.ndarray] = {}
+        self.partialSums: Dict[str, np.ndarray] = {}
+
+        speciesEnergySpectra = calculateSpeciesEnergySpectra(spectrum, particleName, inputEnergyBins, spectrumType)
+        for speciesName, (speciesEnergyBins, speciesFluxes) in speciesEnergySpectra.items():
+            particleForCalculations = particle.Particle(speciesName)
+            speciesEnergyBins, speciesFluxes = rebinEnergySpectraToMaireGrid(speciesEnergyBins, speciesFluxes)
+            speciesEnergyBinsArray = np.asarray(speciesEnergyBins, dtype=np.float64)
+
+            # Energy bin midpoints as rigidities, so that cutoffs never have to be converted to energies
+            middleOfEnergyBinsArray = (speciesEnergyBinsArray[1:] + speciesEnergyBinsArray[:-1])/2
+            self.cutoffRigidityThresholds[speciesName] = np.asarray(PRCT.convertPerNucleonEnergyToTotalRigidity(
+                middleOfEnergyBinsArray,
+                particleMassAU=particleForCalculations.atomicMass,
+                particleChargeAU=particleForCalculations.atomicCharge), dtype=np.float64)
+
+            inputFluxesIntegrated = batchCalculator.formatFluxMatrix(speciesEnergyBinsArray, speciesFluxes,
+                                                                     speciesName, 0.0)[0]
+
+            # (layers, response types, bins), summed from the highest energy bin downwards
+            responseTensor = particleResponse.getStackedResponseTensor(speciesName).transpose(1, 0, 2)
+            contributions = responseTensor * inputFluxesIntegrated
+            partialSums = np.zeros(contributions.shape[:2] + (batchCalculator.numberOfEnergyBins + 1,))
+            partialSums[..., :-1] = np.cumsum(contributions[..., ::-1], axis=-1)[..., ::-1]
+            partialSums.setflags(write=False)
+            self.partialSums[speciesName] = partialSums
+
+    def calculateDoses(self, verticalCutOffRigidities: Union[float, np.ndarray, List[float]],
+                       altitudesInkm: Union[float, np.ndarray, List[float]]) -> np.ndarray:
+        """
+        Look up dose and flux rates for (cutoff, altitude) pairs.
+
+        Parameters
+        ----------
+        verticalCutOffRigidities : Union[float, np.ndarray, List[float]]
+            Vertical cutoff rigidities in GV
+        altitudesInkm : Union[float, np.ndarray, List[float]]
+            Altitudes in kilometers, broadcast against verticalCutOffRigidities
+
+        Returns
+        -------
+        np.ndarray
+            Array with the broadcast shape of the inputs followed by a response
+            type axis, ordered as in particleResponse.fullListOfDoseResponseTypes
+        """
+        verticalCutOffRigiditiesArray, altitudesInkmArray = np.broadcast_arrays(
+            np.asarray(verticalCutOffRigidities, dtype=np.float64),
+            np.asarray(altitudesInkm, dtype=np.float64))
+        outputShape = verticalCutOffRigiditiesArray.shape
+
+        altitudeLayerIndices, altIndicesAbove, f1Values = calculate_altitude_layer_params_array(
+            altitudesInkmArray.reshape(-1))
+        f1Values = f1Values[:, np.newaxis]
+
+        doses = 0.0
+        for speciesName, partialSums in self.partialSums.items():
+            # Index of the first energy bin kept at each cutoff
+            firstBinIndices = np.searchsorted(self.cutoffRigidityThresholds[speciesName],
+                                              verticalCutOffRigiditiesArray.reshape(-1), side="left")
+            doses = doses + (f1Values * partialSums[altitudeLayerIndices, :, firstBinIndices]
+                             + (1.0 - f1Values) * partialSums[altIndicesAbove, :, firstBinIndices])
+
+        return np.reshape(doses, outputShape + (len(particleResponse.fullListOfDoseResponseTypes),))
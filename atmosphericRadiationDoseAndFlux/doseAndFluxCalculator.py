@@ -1,24 +1,24 @@
 import numpy as np
 import pandas as pd
-from numba import njit, jit, prange
+from numba import njit, jit
 import warnings
 
 from . import particle
 from . import particleResponse
 from . import settings
-from . import units
+from . import batchCalculator
+from .energyRebinning import rebinEnergySpectraToMaireGrid
+from .rigidityConversionPlan import getRigidityConversionPlan
+from .numbaSignatures import floatArray1D, readonlyFloatArray1D
+from .responseFileParameters import calculateWeightedFluxesForParticle
 
-import ParticleRigidityCalculationTools as PRCT
+from typing import TYPE_CHECKING, Callable, List, Optional, Union, Dict, Any, Tuple
 
-import inspect
-
-from typing import Callable, List, Union, Dict, Any, Tuple
-
-# Display warning about alpha particle behavior
-print("Warning from atmosphericRadiationDoseAndFlux module: currently using an alpha particle as input actually calculates the contribution from alpha + all simulated heavier ions, rather than just alpha particles!")
+if TYPE_CHECKING:
+    from .doseResultCache import DoseResultCache
 
 # Numba-optimized function for energy integration calculation
-@njit
+@njit(floatArray1D(readonlyFloatArray1D, readonlyFloatArray1D), cache=True)
 def calculate_energy_integrated_flux(fluxes: np.ndarray, energy_differences: np.ndarray) -> np.ndarray:
     """
     Calculate energy-integrated flux values from differential flux values.
@@ -37,13 +37,203 @@ def calculate_energy_integrated_flux(fluxes: np.ndarray, energy_differences: np.
     """
     return fluxes * energy_differences * np.pi  # units of particles / cm2 / s
 
-@settings.allowCalculationForTotalOfParticles
+# Columns of the dose and flux rate output, in output order
+doseRateOutputColumns = ["altitude (km)"] + particleResponse.fullListOfDoseResponseTypes + ["SEU", "SEL"]
+doseRateOutputDtype = np.dtype([(column, np.float64) for column in doseRateOutputColumns])
+doseRateOutputFormats = ["dataframe", "array"]
+
+# SEU and SEL rates per unit of >10 MeV neutron flux (tn2)
+SEUPerNeutronFlux = 1e-13
+SELPerNeutronFlux = 1e-8
+
+def createDoseRateArray(altitudesInkm: np.ndarray, doses: np.ndarray) -> np.ndarray:
+    """
+    Create the structured array of dose and flux rates at each altitude.
+    
+    Parameters:
+    -----------
+    altitudesInkm : np.ndarray
+        Altitudes in kilometers
+    doses : np.ndarray
+        Array with shape (altitudes, response types), with response types
+        ordered as in particleResponse.fullListOfDoseResponseTypes
+        
+    Returns:
+    --------
+    np.ndarray
+        Structured array with fields doseRateOutputColumns, including the SEU and
+        SEL rates derived from the >10 MeV neutron flux
+    """
+    outputArray = np.zeros(len(altitudesInkm), dtype=doseRateOutputDtype)
+    outputArray["altitude (km)"] = altitudesInkm
+
+    for doseTypeIndex, doseType in enumerate(particleResponse.fullListOfDoseResponseTypes):
+        outputArray[doseType] = doses[:, doseTypeIndex]
+
+    # Calculate SEU and SEL rates from thermal neutron flux
+    outputArray["SEU"] = outputArray["tn2"] * SEUPerNeutronFlux
+    outputArray["SEL"] = outputArray["tn2"] * SELPerNeutronFlux
+
+    return outputArray
+
+def formatDoseRateOutput(outputArray: np.ndarray, output: str = "dataframe") -> Union[pd.DataFrame, np.ndarray]:
+    """
+    Convert a structured array of dose and flux rates to the requested output format.
+    
+    Parameters:
+    -----------
+    outputArray : np.ndarray
+        Structured array as returned by createDoseRateArray
+    output : str, default="dataframe"
+        "dataframe" to return a pandas DataFrame, or "array" to return outputArray unchanged
+        
+    Returns:
+    --------
+    Union[pd.DataFrame, np.ndarray]
+        DataFrame or structured array containing dose and flux rates at each altitude
+    """
+    if output == "array":
+        return outputArray
+    return pd.DataFrame(outputArray)
+
+def calculateWithResultCache(resultCache: "DoseResultCache",
+                             calculationKey: str,
+                             calculateOutputArray: Callable[[], np.ndarray],
+                             output: str = "dataframe") -> Union[pd.DataFrame, np.ndarray]:
+    """
+    Get dose and flux rates from a result cache, calculating them if they are not cached.
+    
+    Parameters:
+    -----------
+    resultCache : DoseResultCache
+        Cache to look the result up in
+    calculationKey : str
+        Key of the calculation, see DoseResultCache.calculateKey
+    calculateOutputArray : Callable[[], np.ndarray]
+        Function calculating the result as a structured array
+    output : str, default="dataframe"
+        "dataframe" to return a pandas DataFrame, or "array" to return a NumPy structured array
+        
+    Returns:
+    --------
+    Union[pd.DataFrame, np.ndarray]
+        DataFrame or structured array containing dose and flux rates at each altitude
+    """
+    if output not in doseRateOutputFormats:
+        raise ValueError(f"output must be one of {doseRateOutputFormats}!")
+
+    # Cached arrays are read-only and shared, so every caller gets its own copy
+    outputArray = resultCache.getOrCalculate(calculationKey, calculateOutputArray)
+    return formatDoseRateOutput(outputArray.copy(), output)
+
+def calculateSpeciesIntegratedFluxes(
+                            speciesEnergySpectra: Dict[str, Tuple[np.ndarray, Union[np.ndarray, List[float]]]],
+                            altitudesInkm: Union[np.ndarray, List[float]],
+                            verticalCutOffRigidity: float = 0.0) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+    """
+    Validate the energy spectra of one or more species and convert them to energy-integrated fluxes.
+    
+    Parameters:
+    -----------
+    speciesEnergySpectra : Dict[str, Tuple[np.ndarray, Union[np.ndarray, List[float]]]]
+        Dictionary mapping each particle name ("proton" or "alpha") to a tuple of
+        energy bin edges in MeV/n and differential flux values at bin midpoints
+        (particles/cm²/sr/(MeV/n)/s)
+    altitudesInkm : Union[np.ndarray, List[float]]
+        Altitudes in kilometers
+    verticalCutOffRigidity : float, default=0.0
+        Vertical cutoff rigidity in GV
+        
+    Returns:
+    --------
+    Tuple[Dict[str, np.ndarray], np.ndarray]
+        Tuple containing:
+        - Energy-integrated fluxes (particles/cm²/s) of each species, with shape (1, 50)
+        - Altitudes in kilometers as an array
+    """
+    speciesIntegratedFluxes = {}
+    for speciesName, (inputEnergyBins, inputFluxesMeV) in speciesEnergySpectra.items():
+        # Map spectra given on other energy grids onto the MAIRE grid the responses are tabulated for
+        if not callable(inputFluxesMeV):
+            inputEnergyBins, inputFluxesMeV = rebinEnergySpectraToMaireGrid(inputEnergyBins, inputFluxesMeV)
+
+        # Format input variables and apply cutoff rigidity if specified
+        particleForCalculations, inputEnergyBinsArray, altitudesInkmArray, inputFluxesArray = settings.formatInputVariables(
+            inputEnergyBins, 
+            inputFluxesMeV, 
+            altitudesInkm, 
+            speciesName, 
+            verticalCutOffRigidity
+        )
+
+        if len(inputFluxesArray) != batchCalculator.numberOfEnergyBins:
+            raise Exception(f"Currently only the {batchCalculator.numberOfEnergyBins} MAIRE energy bins are supported!")
+
+        # Calculate energy bin widths
+        inputEnergyBinsArray = np.asarray(inputEnergyBinsArray, dtype=np.float64)
+        inputEnergyDifferences = inputEnergyBinsArray[1:] - inputEnergyBinsArray[:-1]
+        
+        # Calculate integrated flux values (optimized with Numba)
+        inputFluxesIntegrated = calculate_energy_integrated_flux(np.asarray(inputFluxesArray, dtype=np.float64),
+                                                                 inputEnergyDifferences)
+
+        weightedFluxes = calculateWeightedFluxesForParticle(inputEnergyBinsArray, inputFluxesIntegrated,
+                                                            particleForCalculations)
+        speciesIntegratedFluxes[speciesName] = weightedFluxes[np.newaxis, :]
+
+    return speciesIntegratedFluxes, altitudesInkmArray
+
+def calculateFromSpeciesEnergySpectra(
+                            speciesEnergySpectra: Dict[str, Tuple[np.ndarray, Union[np.ndarray, List[float]]]],
+                            altitudesInkm: Union[np.ndarray, List[float]],
+                            verticalCutOffRigidity: float = 0.0,
+                            output: str = "dataframe") -> Union[pd.DataFrame, np.ndarray]:
+    """
+    Calculate total dose and flux rates from the energy spectra of one or more particle species.
+    
+    Parameters:
+    -----------
+    speciesEnergySpectra : Dict[str, Tuple[np.ndarray, Union[np.ndarray, List[float]]]]
+        Dictionary mapping each particle name ("proton" or "alpha") to a tuple of
+        energy bin edges in MeV/n and differential flux values at bin midpoints
+        (particles/cm²/sr/(MeV/n)/s)
+    altitudesInkm : Union[np.ndarray, List[float]]
+        Altitudes in kilometers
+    verticalCutOffRigidity : float, default=0.0
+        Vertical cutoff rigidity in GV
+    output : str, default="dataframe"
+        "dataframe" to return a pandas DataFrame, or "array" to return a NumPy
+        structured array with the same columns (see doseRateOutputColumns)
+        
+    Returns:
+    --------
+    Union[pd.DataFrame, np.ndarray]
+        DataFrame or structured array containing dose and flux rates at each altitude, summed over species
+        
+    Notes:
+    ------
+    All species are evaluated together in a single matrix product, see
+    batchCalculator.calculateDosesFromSpeciesFluxes.
+    """
+    if output not in doseRateOutputFormats:
+        raise ValueError(f"output must be one of {doseRateOutputFormats}!")
+
+    speciesIntegratedFluxes, altitudesInkmArray = calculateSpeciesIntegratedFluxes(speciesEnergySpectra,
+                                                                                   altitudesInkm,
+                                                                                   verticalCutOffRigidity)
+
+    # Calculate doses for each response type and altitude, summed over species
+    doses = batchCalculator.calculateDosesFromSpeciesFluxes(speciesIntegratedFluxes, altitudesInkmArray)[0]
+
+    return formatDoseRateOutput(createDoseRateArray(altitudesInkmArray, doses), output)
+
 def calculate_from_energy_spec(
                             inputEnergyDistributionFunctionMeV: Callable, 
                             altitudesInkm: List[float], 
                             particleName: str = "proton", 
                             inputEnergyBins: np.ndarray = 10**(0.1*(np.array(range(1,52))-1)+1),
-                            verticalCutOffRigidity: float = 0.0) -> pd.DataFrame:
+                            verticalCutOffRigidity: float = 0.0,
+                            output: str = "dataframe") -> Union[pd.DataFrame, np.ndarray]:
     """
     Calculate dose and flux rates using an energy spectrum as input.
     
@@ -51,7 +241,9 @@ def calculate_from_energy_spec(
     -----------
     inputEnergyDistributionFunctionMeV : Callable
         Function that takes kinetic energy per nucleon (MeV/n) and returns
-        differential flux (particles/cm²/sr/(MeV/n)/s)
+        differential flux (particles/cm²/sr/(MeV/n)/s). Any callable is accepted;
+        functions that work on NumPy arrays are evaluated at all bin midpoints in
+        a single call (see settings.evaluateSpectrumFunction).
     altitudesInkm : List[float]
         List of altitudes in kilometers
     particleName : str, default="proton"
@@ -60,52 +252,160 @@ def calculate_from_energy_spec(
         Energy bin edges in MeV/n. The default is the MAIRE 50-bin grid.
     verticalCutOffRigidity : float, default=0.0
         Vertical cutoff rigidity in GV
+    output : str, default="dataframe"
+        "dataframe" to return a pandas DataFrame, or "array" to return a NumPy
+        structured array with the same columns (see doseRateOutputColumns)
         
     Returns:
     --------
-    pd.DataFrame
-        DataFrame containing dose and flux rates at each altitude
+    Union[pd.DataFrame, np.ndarray]
+        DataFrame or structured array containing dose and flux rates at each altitude
         
     Notes:
     ------
     This function calculates radiation dose and flux rates based on the input energy distribution.
     The vertical cutoff rigidity feature is currently disabled pending review.
     """
+    checkEnergySpectrumFunctionCutOff(verticalCutOffRigidity)
+
+    speciesEnergySpectra = calculateSpeciesEnergySpectraFromEnergyFunction(inputEnergyDistributionFunctionMeV,
+                                                                           particleName,
+                                                                           inputEnergyBins)
+
+    # Calculate dose and flux rates
+    outputDF = calculateFromSpeciesEnergySpectra(speciesEnergySpectra,
+                                                 altitudesInkm,
+                                                 verticalCutOffRigidity=verticalCutOffRigidity,
+                                                 output=output)
+
+    return outputDF
+
+def checkEnergySpectrumFunctionCutOff(verticalCutOffRigidity: float):
+    """
+    Check that no vertical cutoff rigidity is applied to an energy spectrum function.
+    
+    Parameters:
+    -----------
+    verticalCutOffRigidity : float
+        Vertical cutoff rigidity in GV
+        
+    Raises:
+    -------
+    Exception
+        If verticalCutOffRigidity is not zero
+    """
     try:
         assert verticalCutOffRigidity == 0.0
     except AssertionError:
         raise Exception("Vertical cutoff rigidity is not currently supported, testing has revealed an error in previous vertical cut-off rigidity calculations, please manually set your spectrum to include vertical cut-off rigidity for now!")
 
+def calculateSpeciesEnergySpectraFromEnergyFunction(
+                            inputEnergyDistributionFunctionMeV: Callable,
+                            particleName: str,
+                            inputEnergyBins: np.ndarray) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Evaluate an energy spectrum function at the energy bin midpoints for each species.
+    
+    Parameters:
+    -----------
+    inputEnergyDistributionFunctionMeV : Callable
+        Function that takes kinetic energy per nucleon (MeV/n) and returns
+        differential flux (particles/cm²/sr/(MeV/n)/s)
+    particleName : str
+        Particle type ("proton", "alpha", or "both")
+    inputEnergyBins : np.ndarray
+        Energy bin edges in MeV/n
+        
+    Returns:
+    --------
+    Dict[str, Tuple[np.ndarray, np.ndarray]]
+        Dictionary mapping each species to its energy bin edges in MeV/n and
+        differential flux values at bin midpoints (particles/cm²/sr/(MeV/n)/s)
+    """
     # Calculate energy bin midpoints
     energyBinMidPoints = (inputEnergyBins[1:] + inputEnergyBins[:-1])/2
     
     # Get flux values at each midpoint
-    inputFluxesMeV = list(map(inputEnergyDistributionFunctionMeV, energyBinMidPoints))
+    inputFluxesMeV = settings.evaluateSpectrumFunction(inputEnergyDistributionFunctionMeV, energyBinMidPoints)
 
-    # Calculate dose and flux rates
-    outputDF = calculate_from_energy_spec_array(
-                            inputEnergyBins,
-                            inputFluxesMeV, 
-                            altitudesInkm, 
-                            particleName=particleName,
-                            verticalCutOffRigidity=verticalCutOffRigidity)
+    return calculateSpeciesEnergySpectraFromEnergyArray(inputEnergyBins, inputFluxesMeV, particleName)
 
-    return outputDF
+def calculateSpeciesEnergySpectraFromEnergyArray(
+                            inputEnergyBins: np.ndarray,
+                            inputFluxesMeV: Union[np.ndarray, List[float]],
+                            particleName: str) -> Dict[str, Tuple[np.ndarray, Union[np.ndarray, List[float]]]]:
+    """
+    Get the energy spectrum of each species from a single per-nucleon energy spectrum.
+    
+    Parameters:
+    -----------
+    inputEnergyBins : np.ndarray
+        Energy bin edges in MeV/n
+    inputFluxesMeV : Union[np.ndarray, List[float]]
+        Differential flux values at bin midpoints (particles/cm²/sr/(MeV/n)/s)
+    particleName : str
+        Particle type ("proton", "alpha", or "both")
+        
+    Returns:
+    --------
+    Dict[str, Tuple[np.ndarray, Union[np.ndarray, List[float]]]]
+        Dictionary mapping each species to the energy bins and fluxes
+    """
+    # The same per-nucleon spectrum is used for every species
+    return {
+        speciesName: (inputEnergyBins, inputFluxesMeV)
+        for speciesName in settings.getParticleNamesForCalculation(particleName)
+    }
+
+def calculateSpeciesEnergySpectraFromRigidityArray(
+                            inputRigidityBins: np.ndarray,
+                            inputFluxesGV: Union[np.ndarray, List[float], Callable],
+                            particleName: str) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Convert a total-rigidity spectrum to the per-nucleon energy spectrum of each species.
+    
+    Parameters:
+    -----------
+    inputRigidityBins : np.ndarray
+        Rigidity bin edges in GV
+    inputFluxesGV : Union[np.ndarray, List[float], Callable]
+        Differential flux values at bin midpoints (particles/cm²/sr/GV/s) or function to calculate them
+    particleName : str
+        Particle type ("proton", "alpha", or "both")
+        
+    Returns:
+    --------
+    Dict[str, Tuple[np.ndarray, np.ndarray]]
+        Dictionary mapping each species to its energy bin edges in MeV/n and
+        differential flux values at bin midpoints (particles/cm²/sr/(MeV/n)/s)
+    """
+    speciesEnergySpectra = {}
+    for speciesName in settings.getParticleNamesForCalculation(particleName):
+        # Initialize particle object for calculations
+        particleForCalculations = particle.Particle(speciesName)
+
+        # Convert total-rigidity bins and fluxes to the per-nucleon energy grid
+        speciesEnergySpectra[speciesName] = settings.convertRigiditySpecToEnergySpec(
+            inputRigidityBins, inputFluxesGV, particleForCalculations)
+
+    return speciesEnergySpectra
 
-@settings.allowCalculationForTotalOfParticles
 def calculate_from_rigidity_spec(
                             inputRigidityDistributionFunctionGV: Callable, 
                             altitudesInkm: List[float], 
                             particleName: str = "proton", 
                             inputRigidityBins: np.ndarray = None,
-                            verticalCutOffRigidity: float = 0.0) -> pd.DataFrame:
+                            verticalCutOffRigidity: float = 0.0,
+                            output: str = "dataframe") -> Union[pd.DataFrame, np.ndarray]:
     """
     Calculate dose and flux rates using a rigidity spectrum as input.
     
     Parameters:
     -----------
     inputRigidityDistributionFunctionGV : Callable
-        Function that takes rigidity (GV) as input and returns differential flux (particles/cm²/sr/GV/s)
+        Function that takes rigidity (GV) as input and returns differential flux (particles/cm²/sr/GV/s).
+        Any callable is accepted; functions that work on NumPy arrays are evaluated at all
+        bin midpoints in a single call (see settings.evaluateSpectrumFunction).
     altitudesInkm : List[float]
         List of altitudes in kilometers
     particleName : str, default="proton"
@@ -114,11 +414,14 @@ def calculate_from_rigidity_spec(
         Rigidity bin edges in GV, if None will be derived from default energy bins
     verticalCutOffRigidity : float, default=0.0
         Vertical cutoff rigidity in GV
+    output : str, default="dataframe"
+        "dataframe" to return a pandas DataFrame, or "array" to return a NumPy
+        structured array with the same columns (see doseRateOutputColumns)
         
     Returns:
     --------
-    pd.DataFrame
-        DataFrame containing dose and flux rates at each altitude
+    Union[pd.DataFrame, np.ndarray]
+        DataFrame or structured array containing dose and flux rates at each altitude
         
     Notes:
     ------
@@ -126,40 +429,64 @@ def calculate_from_rigidity_spec(
     internally. Default rigidity bins are generated from that MeV/n grid using
     total kinetic energy \(A \times E_n\), not by treating MeV/n as total MeV.
     """
-    # Initialize particle object for calculations
-    particleForCalculations = particle.Particle(particleName)
-
-    # Generate rigidity bins from the MAIRE MeV/n energy grid if not provided
-    if inputRigidityBins is None:
-        inputEnergyBins = 10**(0.1*(np.array(range(1,52))-1)+1)
-        inputRigidityBins = np.array(PRCT.convertPerNucleonEnergyToTotalRigidity(
-            inputEnergyBins,
-            particleMassAU=particleForCalculations.atomicMass,
-            particleChargeAU=particleForCalculations.atomicCharge))
-
-    # Calculate rigidity bin midpoints
-    rigidityBinMidPoints = (inputRigidityBins[1:] + inputRigidityBins[:-1])/2
-    
-    # Get flux values at each midpoint
-    inputFluxesGV = list(map(inputRigidityDistributionFunctionGV, rigidityBinMidPoints))
+    speciesEnergySpectra = calculateSpeciesEnergySpectraFromRigidityFunction(inputRigidityDistributionFunctionGV,
+                                                                             particleName,
+                                                                             inputRigidityBins=inputRigidityBins)
 
-    # Calculate dose and flux rates
-    outputDF = calculate_from_rigidity_spec_array(
-                            inputRigidityBins,
-                            inputFluxesGV, 
-                            altitudesInkm, 
-                            particleName=particleName,
-                            verticalCutOffRigidity=verticalCutOffRigidity)
+    # Calculate dose and flux rates for all species in a single pass
+    outputDF = calculateFromSpeciesEnergySpectra(speciesEnergySpectra,
+                                                 altitudesInkm,
+                                                 verticalCutOffRigidity=verticalCutOffRigidity,
+                                                 output=output)
 
     return outputDF
 
-@settings.allowCalculationForTotalOfParticles
+def calculateSpeciesEnergySpectraFromRigidityFunction(
+                            inputRigidityDistributionFunctionGV: Callable,
+                            particleName: str,
+                            inputRigidityBins: np.ndarray = None) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Evaluate a rigidity spectrum function and convert it to the energy spectrum of each species.
+    
+    Parameters:
+    -----------
+    inputRigidityDistributionFunctionGV : Callable
+        Function that takes rigidity (GV) as input and returns differential flux (particles/cm²/sr/GV/s)
+    particleName : str
+        Particle type ("proton", "alpha", or "both")
+    inputRigidityBins : np.ndarray, optional
+        Rigidity bin edges in GV, if None will be derived from default energy bins
+        
+    Returns:
+    --------
+    Dict[str, Tuple[np.ndarray, np.ndarray]]
+        Dictionary mapping each species to its energy bin edges in MeV/n and
+        differential flux values at bin midpoints (particles/cm²/sr/(MeV/n)/s)
+    """
+    speciesEnergySpectra = {}
+    for speciesName in settings.getParticleNamesForCalculation(particleName):
+        # Initialize particle object for calculations
+        particleForCalculations = particle.Particle(speciesName)
+
+        # Rigidity bins default to the MAIRE MeV/n energy grid, converted once per particle
+        conversionPlan = getRigidityConversionPlan(particleForCalculations, inputRigidityBins)
+
+        # Get flux values at each midpoint
+        inputFluxesGV = settings.evaluateSpectrumFunction(inputRigidityDistributionFunctionGV,
+                                                          conversionPlan.rigidityMidPoints)
+
+        speciesEnergySpectra[speciesName] = (conversionPlan.energyBins, conversionPlan.convertFluxes(inputFluxesGV))
+
+    return speciesEnergySpectra
+
 def calculate_from_energy_spec_array(
                             inputEnergyBins: np.ndarray,
                             inputFluxesMeV: Union[np.ndarray, List[float]], 
                             altitudesInkm: Union[np.ndarray, List[float]], 
                             particleName: str = "proton",
-                            verticalCutOffRigidity: float = 0.0) -> pd.DataFrame:
+                            verticalCutOffRigidity: float = 0.0,
+                            output: str = "dataframe",
+                            resultCache: Optional["DoseResultCache"] = None) -> Union[pd.DataFrame, np.ndarray]:
     """
     Calculate dose and flux rates using an array of energy bins and flux values.
     
@@ -175,61 +502,48 @@ def calculate_from_energy_spec_array(
         Particle type ("proton", "alpha", or "both")
     verticalCutOffRigidity : float, default=0.0
         Vertical cutoff rigidity in GV
+    output : str, default="dataframe"
+        "dataframe" to return a pandas DataFrame, or "array" to return a NumPy
+        structured array with the same columns (see doseRateOutputColumns)
+    resultCache : DoseResultCache, optional
+        Cache to memoize the result in, keyed by the values of all other inputs.
+        Results for fluxes given as a function are not cached.
         
     Returns:
     --------
-    pd.DataFrame
-        DataFrame containing dose and flux rates at each altitude
+    Union[pd.DataFrame, np.ndarray]
+        DataFrame or structured array containing dose and flux rates at each altitude
         
     Notes:
     ------
     This is a lower-level function that handles array inputs directly.
     """
-    # Format input variables and apply cutoff rigidity if specified
-    particleForCalculations, inputEnergyBinsArray, altitudesInkmArray, inputFluxesArray = settings.formatInputVariables(
-        inputEnergyBins, 
-        inputFluxesMeV, 
-        altitudesInkm, 
-        particleName, 
-        verticalCutOffRigidity
-    )
-
-    # Calculate energy bin widths
-    inputEnergyDifferences = inputEnergyBinsArray[1:] - inputEnergyBinsArray[:-1]
-    
-    # Calculate integrated flux values (optimized with Numba)
-    inputFluxesIntegrated = calculate_energy_integrated_flux(inputFluxesArray, inputEnergyDifferences)
-
-    # Initialize output DataFrame
-    outputDF = pd.DataFrame({
-        "altitude (km)": altitudesInkmArray,
-    })
-
-    # Calculate doses for each response type
-    for doseType in particleResponse.fullListOfDoseResponseTypes:
-        doseResponseForParticle = particleResponse.fullDoseResponseDict[doseType](particleForCalculations, doseType)
-    
-        coordinateDosesList = []
-        for altitudeInkm in altitudesInkmArray:
-            altitude = units.Distance(altitudeInkm * 1000.0)
-            totalDose = doseResponseForParticle.calculateDose(altitude, inputEnergyBinsArray, inputFluxesIntegrated)
-            coordinateDosesList.append(totalDose)
-
-        outputDF[doseType] = coordinateDosesList
+    # Functions cannot be identified by value, so their results are never cached
+    if resultCache is not None and not callable(inputFluxesMeV):
+        calculationKey = resultCache.calculateKey("calculate_from_energy_spec_array", inputEnergyBins, inputFluxesMeV,
+                                                  altitudesInkm, particleName, float(verticalCutOffRigidity))
+        return calculateWithResultCache(resultCache, calculationKey,
+                                        lambda: calculate_from_energy_spec_array(inputEnergyBins, inputFluxesMeV,
+                                                                                 altitudesInkm, particleName,
+                                                                                 verticalCutOffRigidity,
+                                                                                 output="array"),
+                                        output)
 
-    # Calculate SEU and SEL rates from thermal neutron flux
-    outputDF["SEU"] = outputDF["tn2"] * 1e-13
-    outputDF["SEL"] = outputDF["tn2"] * 1e-8
+    speciesEnergySpectra = calculateSpeciesEnergySpectraFromEnergyArray(inputEnergyBins, inputFluxesMeV, particleName)
 
-    return outputDF
+    return calculateFromSpeciesEnergySpectra(speciesEnergySpectra,
+                                             altitudesInkm,
+                                             verticalCutOffRigidity=verticalCutOffRigidity,
+                                             output=output)
 
-@settings.allowCalculationForTotalOfParticles
 def calculate_from_rigidity_spec_array(
                             inputRigidityBins: np.ndarray,
                             inputFluxesGV: Union[np.ndarray, List[float], Callable], 
                             altitudesInkm: Union[np.ndarray, List[float]], 
                             particleName: str = "proton",
-                            verticalCutOffRigidity: float = 0.0) -> pd.DataFrame:
+                            verticalCutOffRigidity: float = 0.0,
+                            output: str = "dataframe",
+                            resultCache: Optional["DoseResultCache"] = None) -> Union[pd.DataFrame, np.ndarray]:
     """
     Calculate dose and flux rates using an array of rigidity bins and flux values.
     
@@ -245,49 +559,41 @@ def calculate_from_rigidity_spec_array(
         Particle type ("proton", "alpha", or "both")
     verticalCutOffRigidity : float, default=0.0
         Vertical cutoff rigidity in GV
+    output : str, default="dataframe"
+        "dataframe" to return a pandas DataFrame, or "array" to return a NumPy
+        structured array with the same columns (see doseRateOutputColumns)
+    resultCache : DoseResultCache, optional
+        Cache to memoize the result in, keyed by the values of all other inputs.
+        Results for fluxes given as a function are not cached.
         
     Returns:
     --------
-    pd.DataFrame
-        DataFrame containing dose and flux rates at each altitude
+    Union[pd.DataFrame, np.ndarray]
+        DataFrame or structured array containing dose and flux rates at each altitude
         
     Notes:
     ------
     This function converts rigidity-based inputs to the MAIRE MeV/n energy grid
     internally. Rigidity is total GV; energy is kinetic energy per nucleon.
     """
-    # Initialize particle object for calculations
-    particleForCalculations = particle.Particle(particleName)
-
-    # Convert total rigidity bins to MeV/n energy bins
-    inputEnergyBins = np.array(PRCT.convertTotalRigidityToPerNucleonEnergy(inputRigidityBins,
-                                particleMassAU=particleForCalculations.atomicMass,
-                                particleChargeAU=particleForCalculations.atomicCharge))
-
-    # Calculate rigidity bin midpoints
-    rigidityMidPoints = (inputRigidityBins[1:] + inputRigidityBins[:-1])/2
-
-    # Process input flux values
-    if inspect.isfunction(inputFluxesGV):
-        inputFluxesGVarray = np.array(list(map(inputFluxesGV, rigidityMidPoints)))
-    elif isinstance(inputFluxesGV, (int, float, list, np.ndarray)):
-        inputFluxesGVarray = settings.convertListOrFloatToArray(inputFluxesGV)
-    else:
-        raise Exception("inputFluxesGV not specified as a valid type!")
-
-    # Convert total-rigidity fluxes to per-nucleon energy fluxes
-    inputFluxesMeV = PRCT.convertTotalRigiditySpecToPerNucleonEnergySpec(rigidityMidPoints,
-                                                                   inputFluxesGVarray, 
-                                                                   particleMassAU=particleForCalculations.atomicMass,
-                                                                   particleChargeAU=particleForCalculations.atomicCharge)["Energy distribution values"]
-
-    # Calculate dose and flux rates using energy-based method
-    outputDoseFluxRates = calculate_from_energy_spec_array(
-                            inputEnergyBins,
-                            inputFluxesMeV, 
-                            altitudesInkm, 
-                            particleName=particleName,
-                            verticalCutOffRigidity=verticalCutOffRigidity)
+    # Functions cannot be identified by value, so their results are never cached
+    if resultCache is not None and not callable(inputFluxesGV):
+        calculationKey = resultCache.calculateKey("calculate_from_rigidity_spec_array", inputRigidityBins,
+                                                  inputFluxesGV, altitudesInkm, particleName,
+                                                  float(verticalCutOffRigidity))
+        return calculateWithResultCache(resultCache, calculationKey,
+                                        lambda: calculate_from_rigidity_spec_array(inputRigidityBins, inputFluxesGV,
+                                                                                   altitudesInkm, particleName,
+                                                                                   verticalCutOffRigidity,
+                                                                                   output="array"),
+                                        output)
 
-    return outputDoseFluxRates
+    speciesEnergySpectra = calculateSpeciesEnergySpectraFromRigidityArray(inputRigidityBins, inputFluxesGV, particleName)
 
+    # Calculate dose and flux rates for all species in a single pass
+    outputDoseFluxRates = calculateFromSpeciesEnergySpectra(speciesEnergySpectra,
+                                                            altitudesInkm,
+                                                            verticalCutOffRigidity=verticalCutOffRigidity,
+                                                            output=output)
+
+    return outputDoseFluxRates
@@ -0,0 +1,282 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from . import batchCalculator
+from . import particle
+from . import particleResponse
+from . import settings
+from .doseGrid import calculateSpeciesEnergySpectra, spectrumTypes
+from .responseTableRegistry import responseTableRegistry, supportedParticleNames
+
+# Shared memory blocks attached by a worker process, kept open for the worker's lifetime
+_workerSharedMemoryBlocks: List[shared_memory.SharedMemory] = []
+
+def _initializeWorker(sharedTensorDescriptions: Dict[str, Tuple[str, Tuple[int, ...]]]):
+    """
+    Place the shared response tensors in a worker process' response table registry.
+    """
+    for particleName, (sharedMemoryName, shape) in sharedTensorDescriptions.items():
+        # Workers share the parent's resource tracker, which unlinks the block if the parent dies
+        sharedMemoryBlock = shared_memory.SharedMemory(name=sharedMemoryName)
+        _workerSharedMemoryBlocks.append(sharedMemoryBlock)
+
+        sharedTensor = np.ndarray(shape, dtype=np.float64, buffer=sharedMemoryBlock.buf)
+        responseTableRegistry.setTable(particleName, particleResponse.stackedResponseTensorTableName, sharedTensor)
+
+def _formatSpeciesSpectra(spectrum: Union[np.ndarray, List[float], Callable],
+                          particleName: str,
+                          spectrumType: str,
+                          inputEnergyBins: np.ndarray,
+                          inputRigidityBins: Optional[np.ndarray]) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    if spectrumType == "rigidity" and not callable(spectrum):
+        if inputRigidityBins is None:
+            raise ValueError("inputRigidityBins must be given for rigidity spectra given as arrays!")
+        return {speciesName: settings.convertRigiditySpecToEnergySpec(inputRigidityBins, spectrum,
+                                                                      particle.Particle(speciesName))
+                for speciesName in settings.getParticleNamesForCalculation(particleName)}
+
+    return calculateSpeciesEnergySpectra(spectrum, particleName, inputEnergyBins, spectrumType)
+
+def calculateSpectrumCatalogChunk(spectra: Sequence[Union[np.ndarray, List[float], Callable]],
+                                  altitudesInkm: np.ndarray,
+                                  particleName: str,
+                                  spectrumType: str,
+                                  verticalCutOffRigidities: np.ndarray,
+                                  inputEnergyBins: np.ndarray,
+                                  inputRigidityBins: Optional[np.ndarray]) -> np.ndarray:
+    """
+    Calculate dose and flux rates for a chunk of a spectrum catalog.
+
+    Parameters
+    ----------
+    spectra : Sequence[Union[np.ndarray, List[float], Callable]]
+        Spectra in the chunk, see DoseBatchExecutor.calculate
+    altitudesInkm : np.ndarray
+        Altitudes in kilometers
+    particleName : str
+        Particle type ("proton", "alpha", or "both")
+    spectrumType : str
+        "energy" or "rigidity"
+    verticalCutOffRigidities : np.ndarray
+        Vertical cutoff rigidity in GV for each spectrum in the chunk
+    inputEnergyBins : np.ndarray
+        Energy bin edges in MeV/n for energy spectra
+    inputRigidityBins : Optional[np.ndarray]
+        Rigidity bin edges in GV for rigidity spectra
+
+    Returns
+    -------
+    np.ndarray
+        Array with shape (spectra, altitudes, response types)
+    """
+    speciesSpectra = [_formatSpeciesSpectra(spectrum, particleName, spectrumType, inputEnergyBins, inputRigidityBins)
+                      for spectrum in spectra]
+
+    # Spectra in a chunk share their energy grid, so each species is converted as one flux matrix
+    speciesIntegratedFluxes = {}
+    for speciesName in settings.getParticleNamesForCalculation(particleName):
+        speciesEnergyBins = speciesSpectra[0][speciesName][0]
+        speciesFluxesMatrix = np.array([spectrumBySpecies[speciesName][1] for spectrumBySpecies in speciesSpectra],
+                                       dtype=np.float64)
+        speciesIntegratedFluxes[speciesName] = batchCalculator.formatFluxMatrix(
+            speciesEnergyBins, speciesFluxesMatrix, speciesName, verticalCutOffRigidities)
+
+    return batchCalculator.calculateDosesFromSpeciesFluxes(speciesIntegratedFluxes, altitudesInkm)
+
+class DoseBatchExecutor:
+    """
+    Process pool evaluating large catalogs of spectra.
+
+    The stacked response tensor of every particle is copied into shared memory
+    once, and attached by each worker process when it starts, so workers
+    neither re-parse the response files nor hold their own copy of the tables.
+    A catalog is split into chunks of spectra, which are evaluated in parallel
+    with the batched calculator and gathered back in input order.
+
+    Use the executor as a context manager, or call shutdown() when done, so
+    that the worker processes and shared memory are released.
+
+    Attributes
+    ----------
+    maxWorkers : int
+        Number of worker processes
+    chunkSize : Optional[int]
+        Number of spectra per task, chosen automatically when None
+    particleNames : List[str]
+        Particles whose response tensors are shared with the workers
+
+    Methods
+    -------
+    calculate(spectra, altitudesInkm, ...)
+        Calculate dose and flux rates for every spectrum in a catalog
+    shutdown()
+        Stop the worker processes and release the shared memory
+    """
+
+    def __init__(self, maxWorkers: Optional[int] = None, chunkSize: Optional[int] = None,
+                 particleNames: Optional[Sequence[str]] = None, mpContext=None):
+        """
+        Start the worker processes and share the response tensors with them.
+
+        Parameters
+        ----------
+        maxWorkers : int, optional
+            Number of worker processes, defaults to the number of CPUs
+        chunkSize : int, optional
+            Number of spectra per task. By default each catalog is split into
+            about four chunks per worker, with at most 1024 spectra per chunk.
+        particleNames : Sequence[str], optional
+            Particles to share response tensors for, defaults to all supported particles
+        mpContext : multiprocessing.context.BaseContext, optional
+            Multiprocessing context used to start the workers
+        """
+        if chunkSize is not None and chunkSize < 1:
+            raise ValueError("chunkSize must be at least 1!")
+
+        self.maxWorkers = maxWorkers if maxWorkers is not None else (os.cpu_count() or 1)
+        self.chunkSize = chunkSize
+        self.particleNames = list(particleNames) if particleNames is not None else list(supportedParticleNames)
+
+        self._sharedMemoryBlocks: List[shared_memory.SharedMemory] = []
+        sharedTensorDescriptions = {}
+        try:
+            for particleName in self.particleNames:
+                responseTensor = particleResponse.getStackedResponseTensor(particleName)
+                sharedMemoryBlock = shared_memory.SharedMemory(create=True, size=responseTensor.nbytes)
+                self._sharedMemoryBlocks.append(sharedMemoryBlock)
+
+                np.ndarray(responseTensor.shape, dtype=np.float64, buffer=sharedMemoryBlock.buf)[:] = responseTensor
+                sharedTensorDescriptions[particleName] = (sharedMemoryBlock.name, responseTensor.shape)
+
+            self._executor = ProcessPoolExecutor(max_workers=self.maxWorkers,
+                                                 mp_context=mpContext,
+                                                 initializer=_initializeWorker,
+                                                 initargs=(sharedTensorDescriptions,))
+        except BaseException:
+            self._releaseSharedMemory()
+            raise
+
+    def _getChunkSize(self, numberOfSpectra: int) -> int:
+        if self.chunkSize is not None:
+            return self.chunkSize
+        return max(1, min(1024, math.ceil(numberOfSpectra / (4 * self.maxWorkers))))
+
+    def calculate(self, spectra: Sequence[Union[np.ndarray, List[float], Callable]],
+                  altitudesInkm: Union[np.ndarray, List[float]],
+                  particleName: str = "proton",
+                  spectrumType: str = "energy",
+                  verticalCutOffRigidity: Union[float, np.ndarray, List[float]] = 0.0,
+                  inputEnergyBins: np.ndarray = settings.defaultEnergyBins,
+                  inputRigidityBins: Optional[np.ndarray] = None,
+                  progressCallback: Optional[Callable[[int, int], Any]] = None) -> np.ndarray:
+        """
+        Calculate dose and flux rates for every spectrum in a catalog.
+
+        Parameters
+        ----------
+        spectra : Sequence[Union[np.ndarray, List[float], Callable]]
+            Catalog of spectra. For spectrumType "energy", each is an array of
+            differential fluxes at the midpoints of inputEnergyBins
+            (particles/cm²/sr/(MeV/n)/s) or a function of MeV/n returning them.
+            For spectrumType "rigidity", each is a function of rigidity (GV), or
+            an array of fluxes at the midpoints of inputRigidityBins, in
+            particles/cm²/sr/GV/s. Functions must be picklable (e.g. module-level
+            functions or functools.partial objects of them).
+        altitudesInkm : Union[np.ndarray, List[float]]
+            Altitudes in kilometers
+        particleName : str, default="proton"
+            Particle type ("proton", "alpha", or "both")
+        spectrumType : str, default="energy"
+            "energy" or "rigidity"
+        verticalCutOffRigidity : Union[float, np.ndarray, List[float]], default=0.0
+            Vertical cutoff rigidity in GV, either one for all spectra or one per spectrum
+        inputEnergyBins : np.ndarray, default=MAIRE energy bins
+            Energy bin edges in MeV/n for energy spectra, spectra on other grids are rebinned onto the MAIRE grid
+        inputRigidityBins : np.ndarray, optional
+            Rigidity bin edges in GV for rigidity spectra. Required for spectra
+            given as arrays; functions default to the rigidity grid used by
+            calculate_from_rigidity_spec.
+        progressCallback : Callable[[int, int], Any], optional
+            Function called with (spectra completed, total spectra) whenever a chunk finishes
+
+        Returns
+        -------
+        np.ndarray
+            Array with shape (spectra, altitudes, response types) in the order
+            of spectra, with response types ordered as in
+            particleResponse.fullListOfDoseResponseTypes
+
+        Raises
+        ------
+        ValueError
+            If spectrumType is invalid, a particle's tables are not shared with
+            the workers, or the cutoff rigidities do not match the catalog
+        """
+        if spectrumType not in spectrumTypes:
+            raise ValueError(f"spectrumType must be one of {spectrumTypes}!")
+        for speciesName in settings.getParticleNamesForCalculation(particleName):
+            if speciesName not in self.particleNames:
+                raise ValueError(f"Response tables for {speciesName} are not shared with this executor!")
+
+        spectra = list(spectra)
+        altitudesInkmArray = np.atleast_1d(np.asarray(altitudesInkm, dtype=np.float64))
+        verticalCutOffRigidities = np.broadcast_to(np.asarray(verticalCutOffRigidity, dtype=np.float64),
+                                                   (len(spectra),))
+
+        output = np.empty((len(spectra), len(altitudesInkmArray), len(particleResponse.fullListOfDoseResponseTypes)))
+        if len(spectra) == 0:
+            return output
+
+        chunkSize = self._getChunkSize(len(spectra))
+        futures = {}
+        for chunkStart in range(0, len(spectra), chunkSize):
+            chunkEnd = min(chunkStart + chunkSize, len(spectra))
+            future = self._executor.submit(calculateSpectrumCatalogChunk,
+                                           spectra[chunkStart:chunkEnd],
+                                           altitudesInkmArray,
+                                           particleName,
+                                           spectrumType,
+                                           np.array(verticalCutOffRigidities[chunkStart:chunkEnd]),
+                                           inputEnergyBins,
+                                           inputRigidityBins)
+            futures[future] = (chunkStart, chunkEnd)
+
+        numberOfSpectraCompleted = 0
+        try:
+            for future in as_completed(futures):
+                chunkStart, chunkEnd = futures[future]
+                output[chunkStart:chunkEnd] = future.result()
+
+                numberOfSpectraCompleted += chunkEnd - chunkStart
+                if progressCallback is not None:
+                    progressCallback(numberOfSpectraCompleted, len(spectra))
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+        return output
+
+    def _releaseSharedMemory(self):
+        for sharedMemoryBlock in self._sharedMemoryBlocks:
+            sharedMemoryBlock.close()
+            sharedMemoryBlock.unlink()
+        self._sharedMemoryBlocks = []
+
+    def shutdown(self):
+        """
+        Stop the worker processes and release the shared memory.
+        """
+        self._executor.shutdown(wait=True)
+        self._releaseSharedMemory()
+
+    def __enter__(self) -> "DoseBatchExecutor":
+        return self
+
+    def __exit__(self, exceptionType, exceptionValue, traceback):
+        self.shutdown()
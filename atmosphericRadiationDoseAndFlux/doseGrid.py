@@ -0,0 +1,244 @@
+import numpy as np
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from . import batchCalculator
+from . import settings
+from .doseAndFluxCalculator import (
+    SELPerNeutronFlux,
+    SEUPerNeutronFlux,
+    calculateSpeciesEnergySpectraFromRigidityFunction,
+    doseRateOutputColumns,
+)
+from .particleResponse import fullListOfDoseResponseTypes
+
+# Quantities along the last axis of a DoseGrid
+doseGridQuantities = doseRateOutputColumns[1:]
+
+spectrumTypes = ["energy", "rigidity"]
+
+class DoseGrid:
+    """
+    Dose and flux rates on a grid of cutoff rigidities and altitudes.
+
+    The values array has one axis per grid dimension (by default latitude and
+    longitude), followed by an altitude axis and a quantity axis holding the
+    six response types and the SEU and SEL rates. dims and coords follow the
+    conventions of xarray, and toXarray converts the grid to an xarray.DataArray.
+
+    Attributes
+    ----------
+    values : np.ndarray
+        Array with shape grid shape + (altitudes, quantities)
+    dims : Tuple[str, ...]
+        Names of the axes of values
+    coords : Dict[str, np.ndarray]
+        Coordinate values along each axis
+
+    Methods
+    -------
+    __getitem__(quantity)
+        Get the grid of one quantity, e.g. grid["edose"]
+    toXarray()
+        Convert the grid to an xarray.DataArray
+    """
+
+    def __init__(self, values: np.ndarray, dims: Tuple[str, ...], coords: Dict[str, np.ndarray]):
+        """
+        Initialize a dose grid.
+
+        Parameters
+        ----------
+        values : np.ndarray
+            Array with shape grid shape + (altitudes, quantities)
+        dims : Tuple[str, ...]
+            Names of the axes of values
+        coords : Dict[str, np.ndarray]
+            Coordinate values along each axis
+        """
+        self.values = values
+        self.dims = dims
+        self.coords = coords
+
+    def __getitem__(self, quantity: str) -> np.ndarray:
+        """
+        Get the grid of one quantity.
+
+        Parameters
+        ----------
+        quantity : str
+            One of doseGridQuantities, e.g. 'edose' or 'SEU'
+
+        Returns
+        -------
+        np.ndarray
+            Array with shape grid shape + (altitudes,)
+        """
+        return self.values[..., doseGridQuantities.index(quantity)]
+
+    def toXarray(self):
+        """
+        Convert the grid to an xarray.DataArray.
+
+        Returns
+        -------
+        xarray.DataArray
+            Data array with the grid's values, dims and coords
+
+        Raises
+        ------
+        ImportError
+            If xarray is not installed
+        """
+        try:
+            import xarray
+        except ImportError:
+            raise ImportError("xarray is required to convert a DoseGrid to an xarray.DataArray!")
+
+        return xarray.DataArray(self.values, dims=self.dims, coords=self.coords, name="doseAndFluxRates")
+
+def calculateSpeciesEnergySpectra(spectrum: Union[np.ndarray, List[float], Callable],
+                                  particleName: str,
+                                  inputEnergyBins: np.ndarray,
+                                  spectrumType: str) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Get the energy spectrum of each species from an energy or rigidity spectrum.
+
+    Parameters
+    ----------
+    spectrum : Union[np.ndarray, List[float], Callable]
+        For spectrumType 'energy', differential fluxes at the midpoints of
+        inputEnergyBins (particles/cm²/sr/(MeV/n)/s) or a function of MeV/n
+        returning them. For spectrumType 'rigidity', a function of rigidity (GV)
+        returning differential fluxes in particles/cm²/sr/GV/s.
+    particleName : str
+        Particle type ("proton", "alpha", or "both")
+    inputEnergyBins : np.ndarray
+        Energy bin edges in MeV/n, used for spectrumType 'energy'
+    spectrumType : str
+        'energy' or 'rigidity'
+
+    Returns
+    -------
+    Dict[str, Tuple[np.ndarray, np.ndarray]]
+        Dictionary mapping each species to its energy bin edges in MeV/n and
+        differential flux values at bin midpoints (particles/cm²/sr/(MeV/n)/s)
+
+    Raises
+    ------
+    ValueError
+        If spectrumType is not 'energy' or 'rigidity', or a rigidity spectrum is not a function
+    """
+    if spectrumType not in spectrumTypes:
+        raise ValueError(f"spectrumType must be one of {spectrumTypes}!")
+
+    if spectrumType == "rigidity":
+        if not callable(spectrum):
+            raise ValueError("Rigidity spectra must be given as a function of rigidity in GV!")
+        return calculateSpeciesEnergySpectraFromRigidityFunction(spectrum, particleName)
+
+    inputEnergyBinsArray = np.asarray(inputEnergyBins, dtype=np.float64)
+    if callable(spectrum):
+        energyBinMidPoints = (inputEnergyBinsArray[1:] + inputEnergyBinsArray[:-1])/2
+        inputFluxesMeV = settings.evaluateSpectrumFunction(spectrum, energyBinMidPoints)
+    else:
+        inputFluxesMeV = np.asarray(spectrum, dtype=np.float64)
+
+    # The same per-nucleon spectrum is used for every species
+    return {speciesName: (inputEnergyBinsArray, inputFluxesMeV)
+            for speciesName in settings.getParticleNamesForCalculation(particleName)}
+
+def calculate_dose_grid(cutoffRigidityGrid: Union[np.ndarray, List[List[float]]],
+                        altitudesInkm: Union[np.ndarray, List[float]],
+                        spectrum: Union[np.ndarray, List[float], Callable],
+                        particleName: str = "proton",
+                        inputEnergyBins: np.ndarray = settings.defaultEnergyBins,
+                        spectrumType: str = "energy",
+                        gridDims: Sequence[str] = ("latitude", "longitude"),
+                        gridCoords: Optional[Dict[str, np.ndarray]] = None) -> DoseGrid:
+    """
+    Calculate dose and flux rates over a grid of vertical cutoff rigidities and altitudes.
+
+    Grid cells only differ by their cutoff rigidity, so each distinct cutoff
+    value is evaluated once, and all distinct cutoffs and altitudes are
+    evaluated together with the batched response kernels (see
+    batchCalculator.calculateDosesFromSpeciesFluxes).
+
+    Parameters:
+    -----------
+    cutoffRigidityGrid : Union[np.ndarray, List[List[float]]]
+        Vertical cutoff rigidity in GV of each grid cell, e.g. indexed by
+        [latitude, longitude]
+    altitudesInkm : Union[np.ndarray, List[float]]
+        Altitudes in kilometers
+    spectrum : Union[np.ndarray, List[float], Callable]
+        Spectrum of the incoming particles, see spectrumType
+    particleName : str, default="proton"
+        Particle type ("proton", "alpha", or "both")
+    inputEnergyBins : np.ndarray, default=MAIRE energy bins
+        Energy bin edges in MeV/n for energy spectra, spectra on other grids are rebinned onto the MAIRE grid
+    spectrumType : str, default="energy"
+        "energy" if spectrum is an array of differential fluxes at the midpoints
+        of inputEnergyBins (particles/cm²/sr/(MeV/n)/s) or a function of MeV/n
+        returning them, "rigidity" if spectrum is a function of rigidity (GV)
+        returning differential fluxes in particles/cm²/sr/GV/s (as for
+        calculate_from_rigidity_spec)
+    gridDims : Sequence[str], default=("latitude", "longitude")
+        Names of the axes of cutoffRigidityGrid
+    gridCoords : Dict[str, np.ndarray], optional
+        Coordinate values along the grid axes, e.g. {"latitude": ..., "longitude": ...},
+        defaults to cell indices
+
+    Returns:
+    --------
+    DoseGrid
+        Dose and flux rates with dims gridDims + ("altitude", "quantity"), where
+        the quantities are the six response types followed by SEU and SEL
+
+    Raises:
+    -------
+    ValueError
+        If gridDims does not match the number of dimensions of cutoffRigidityGrid
+
+    Notes:
+    ------
+    Each cell is evaluated as calculate_from_energy_spec_array (or
+    calculate_from_rigidity_spec_array) would evaluate it with the cell's
+    cutoff rigidity, i.e. fluxes in energy bins whose midpoint lies below the
+    cutoff energy are set to zero.
+    """
+    cutoffRigidityArray = np.asarray(cutoffRigidityGrid, dtype=np.float64)
+    altitudesInkmArray = np.atleast_1d(np.asarray(altitudesInkm, dtype=np.float64))
+    gridDims = tuple(gridDims)
+
+    if len(gridDims) != cutoffRigidityArray.ndim:
+        raise ValueError(f"gridDims must name each of the {cutoffRigidityArray.ndim} axes of cutoffRigidityGrid!")
+
+    uniqueCutOffRigidities, cellToUniqueCutOff = np.unique(cutoffRigidityArray, return_inverse=True)
+
+    speciesIntegratedFluxes = {}
+    for speciesName, (speciesEnergyBins, speciesFluxes) in calculateSpeciesEnergySpectra(
+            spectrum, particleName, inputEnergyBins, spectrumType).items():
+        speciesFluxesArray = np.asarray(speciesFluxes, dtype=np.float64)
+        speciesFluxesMatrix = np.broadcast_to(speciesFluxesArray,
+                                              (len(uniqueCutOffRigidities), speciesFluxesArray.shape[-1]))
+        speciesIntegratedFluxes[speciesName] = batchCalculator.formatFluxMatrix(
+            speciesEnergyBins, speciesFluxesMatrix, speciesName, uniqueCutOffRigidities)
+
+    # (unique cutoffs, altitudes, response types)
+    uniqueDoses = batchCalculator.calculateDosesFromSpeciesFluxes(speciesIntegratedFluxes, altitudesInkmArray)
+
+    neutronFlux = uniqueDoses[..., fullListOfDoseResponseTypes.index("tn2")]
+    uniqueDoses = np.concatenate([uniqueDoses,
+                                  (neutronFlux * SEUPerNeutronFlux)[..., np.newaxis],
+                                  (neutronFlux * SELPerNeutronFlux)[..., np.newaxis]], axis=-1)
+
+    values = uniqueDoses[cellToUniqueCutOff.reshape(-1)].reshape(
+        cutoffRigidityArray.shape + (len(altitudesInkmArray), len(doseGridQuantities)))
+
+    coords = {dim: np.arange(size) for dim, size in zip(gridDims, cutoffRigidityArray.shape)}
+    if gridCoords is not None:
+        coords.update({dim: np.asarray(coordinateValues) for dim, coordinateValues in gridCoords.items()})
+    coords["altitude"] = altitudesInkmArray
+    coords["quantity"] = np.array(doseGridQuantities)
+
+    return DoseGrid(values, gridDims + ("altitude", "quantity"), coords)
@@ -0,0 +1,91 @@
+import numpy as np
+from typing import List, NamedTuple, Union
+
+from . import settings
+from .batchCalculator import calculateResponseKernelAltitudeDerivatives, calculateResponseKernels
+from .responseKernels import calculateFluxIntegrationMatrix, inputGridTypes
+
+class DoseJacobians(NamedTuple):
+    """
+    Dose and flux rates with their derivatives with respect to the input fluxes and altitude.
+
+    Attributes
+    ----------
+    doses : np.ndarray
+        Dose and flux rates with shape (altitudes, response types), or
+        (spectra, altitudes, response types) for several spectra
+    fluxJacobian : np.ndarray
+        d(doses)/d(inputFluxes) with shape (altitudes, response types, input bins).
+        The rates are linear in the fluxes, so this is the same for every
+        spectrum and equal to get_response_kernels.
+    altitudeJacobian : np.ndarray
+        d(doses)/d(altitude) per km, with the shape of doses
+    """
+    doses: np.ndarray
+    fluxJacobian: np.ndarray
+    altitudeJacobian: np.ndarray
+
+def calculate_dose_jacobians(inputBins: Union[np.ndarray, List[float]],
+                             inputFluxes: Union[np.ndarray, List[float], List[List[float]]],
+                             altitudesInkm: Union[np.ndarray, List[float]],
+                             particleName: str = "proton",
+                             inputGrid: str = "energy",
+                             verticalCutOffRigidity: float = 0.0) -> DoseJacobians:
+    """
+    Calculate dose and flux rates together with their exact derivatives with respect to the input fluxes and altitude.
+
+    The rates are linear in the input fluxes, and linear in altitude within
+    each altitude layer through the interpolation factor f1 (see
+    responseFileParameters.calculate_altitude_layer_params_array), so both
+    derivatives are evaluated exactly, for all altitudes at once, with the same
+    matrix products as the rates themselves. At a boundary between altitude
+    layers the altitude derivative is that of the layer above the boundary.
+
+    Parameters:
+    -----------
+    inputBins : Union[np.ndarray, List[float]]
+        Energy bin edges in MeV/n, or rigidity bin edges in GV for inputGrid="rigidity"
+    inputFluxes : Union[np.ndarray, List[float], List[List[float]]]
+        Differential flux values at bin midpoints, in particles/cm²/sr/(MeV/n)/s
+        or particles/cm²/sr/GV/s, as one spectrum or with one spectrum per row
+    altitudesInkm : Union[np.ndarray, List[float]]
+        Altitudes in kilometers
+    particleName : str, default="proton"
+        Particle type ("proton", "alpha", or "both")
+    inputGrid : str, default="energy"
+        "energy" or "rigidity", as in get_response_kernels
+    verticalCutOffRigidity : float, default=0.0
+        Vertical cutoff rigidity in GV
+
+    Returns:
+    --------
+    DoseJacobians
+        Rates, flux Jacobian and altitude Jacobian, with response types ordered
+        as in particleResponse.fullListOfDoseResponseTypes (edose, adose, dosee, tn1, tn2, tn3)
+
+    Raises:
+    -------
+    ValueError
+        If inputGrid is not "energy" or "rigidity"
+    Exception
+        If the number of fluxes does not match the number of bins
+    """
+    if inputGrid not in inputGridTypes:
+        raise ValueError(f"inputGrid must be one of {inputGridTypes}!")
+    inputFluxesArray = np.asarray(inputFluxes, dtype=np.float64)
+    if inputFluxesArray.ndim == 0 or inputFluxesArray.shape[-1] != len(inputBins) - 1:
+        raise Exception("Number of bins does not match number of flux values!")
+
+    fluxJacobian = 0.0
+    kernelAltitudeDerivatives = 0.0
+    for speciesName in settings.getParticleNamesForCalculation(particleName):
+        fluxIntegrationMatrix = calculateFluxIntegrationMatrix(inputBins, speciesName, inputGrid,
+                                                               verticalCutOffRigidity)
+        fluxJacobian = fluxJacobian + calculateResponseKernels(altitudesInkm, speciesName) @ fluxIntegrationMatrix.T
+        kernelAltitudeDerivatives = (kernelAltitudeDerivatives
+                                     + calculateResponseKernelAltitudeDerivatives(altitudesInkm, speciesName)
+                                     @ fluxIntegrationMatrix.T)
+
+    return DoseJacobians(doses=np.einsum("mrn,...n->...mr", fluxJacobian, inputFluxesArray),
+                         fluxJacobian=fluxJacobian,
+                         altitudeJacobian=np.einsum("mrn,...n->...mr", kernelAltitudeDerivatives, inputFluxesArray))
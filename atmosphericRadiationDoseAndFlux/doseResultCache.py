@@ -0,0 +1,260 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .binaryResponseTables import _writeAtomically, calculateFileChecksum
+from .requestHashing import calculateValueKey
+
+# Version of the cached results, increase whenever a code change alters calculated results
+# so that results persisted by earlier versions are no longer used
+resultFormatVersion = 2
+
+_responseTableChecksums: Optional[Tuple[Tuple[str, str, str], ...]] = None
+_responseTableChecksumsLock = threading.Lock()
+
+def getResponseTableChecksums() -> Tuple[Tuple[str, str, str], ...]:
+    """
+    Get the SHA-256 checksums of the response files shipped with the package, calculated once per process.
+
+    Returns
+    -------
+    Tuple[Tuple[str, str, str], ...]
+        (particle name, response file name, checksum) of every response file
+    """
+    global _responseTableChecksums
+
+    with _responseTableChecksumsLock:
+        if _responseTableChecksums is None:
+            from .responseTableRegistry import getPathToResponseFile, responseFileNames, supportedParticleNames
+            _responseTableChecksums = tuple(
+                (particleName, responseFileName,
+                 calculateFileChecksum(getPathToResponseFile(particleName, responseFileName)))
+                for particleName in supportedParticleNames
+                for responseFileName in responseFileNames)
+        return _responseTableChecksums
+
+def getResultVersionKey() -> Tuple[Any, ...]:
+    """
+    Get the versions of the code and response tables that results are calculated with.
+
+    Returns
+    -------
+    Tuple[Any, ...]
+        resultFormatVersion, the package version and the response table checksums
+    """
+    from . import __version__
+    return (resultFormatVersion, __version__, getResponseTableChecksums())
+
+class DoseResultCache:
+    """
+    LRU cache of dose and flux rate results, keyed by a hash of the calculation inputs.
+
+    Pass a cache as resultCache to calculate_from_energy_spec_array or
+    calculate_from_rigidity_spec_array to memoize their results. Entries are
+    keyed by a SHA-256 hash of the function name, the bin and flux values, the
+    altitudes, the particle and the cutoff rigidity, so equal spectra given as
+    different arrays share an entry. Keys also include resultFormatVersion, the
+    package version and the checksums of the response tables, so results
+    persisted by other versions are not reused. Results are stored as structured arrays
+    (see doseAndFluxCalculator.doseRateOutputColumns), and the least recently
+    used ones are evicted when the cache holds more than maximumSizeInBytes.
+
+    If cacheDirectory is given, every calculated result is also written there
+    as a .npy file, and results missing from memory are looked up on disk
+    before being calculated, so a restarted process recovers a warm cache.
+    Files on disk are not evicted; call clear(removeFiles=True) to delete them.
+
+    Attributes
+    ----------
+    maximumSizeInBytes : int
+        Maximum memory held by cached results
+    cacheDirectory : Optional[str]
+        Directory results are persisted to, or None to keep results in memory only
+    hits : int
+        Number of lookups served from memory
+    diskHits : int
+        Number of lookups served from cacheDirectory
+    misses : int
+        Number of lookups that required a calculation
+    evictions : int
+        Number of results evicted from memory
+
+    Methods
+    -------
+    calculateKey(calculationName, *values)
+        Get the key of a calculation
+    getOrCalculate(key, calculate)
+        Get a cached result, calculating and storing it if missing
+    clear(removeFiles=False)
+        Remove all cached results and reset statistics
+    getStats()
+        Get a dictionary of cache statistics
+    """
+
+    def __init__(self, maximumSizeInBytes: int = 64 * 1024**2, cacheDirectory: Optional[str] = None):
+        """
+        Initialize an empty cache.
+
+        Parameters
+        ----------
+        maximumSizeInBytes : int, default=64 MiB
+            Maximum memory held by cached results
+        cacheDirectory : str, optional
+            Directory to persist results to, created if it does not exist.
+            By default results are only held in memory.
+        """
+        if maximumSizeInBytes < 1:
+            raise ValueError("maximumSizeInBytes must be at least 1!")
+
+        self.maximumSizeInBytes = maximumSizeInBytes
+        self.cacheDirectory = cacheDirectory
+        if cacheDirectory is not None:
+            os.makedirs(cacheDirectory, exist_ok=True)
+
+        self._results: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.diskHits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def calculateKey(calculationName: str, *values: Any) -> str:
+        """
+        Get the key of a calculation, including the code and response table versions (see getResultVersionKey).
+
+        Parameters
+        ----------
+        calculationName : str
+            Name of the calculating function
+        *values : Any
+            Calculation inputs, arrays and lists are identified by their values
+
+        Returns
+        -------
+        str
+            Hexadecimal SHA-256 digest identifying the calculation
+
+        Raises
+        ------
+        ValueError
+            If a value is a function, whose results cannot be identified by value
+        """
+        # Function keys would depend on the object's address, which can be reused
+        if any(callable(value) for value in values):
+            raise ValueError("Results for functions cannot be cached!")
+        valueKeys = (getResultVersionKey(), calculationName) + tuple(calculateValueKey(value) for value in values)
+        return hashlib.sha256(repr(valueKeys).encode()).hexdigest()
+
+    def _getPathToResult(self, key: str) -> str:
+        return os.path.join(self.cacheDirectory, key + ".npy")
+
+    def _loadResult(self, key: str) -> Optional[np.ndarray]:
+        if self.cacheDirectory is None:
+            return None
+        try:
+            return np.load(self._getPathToResult(key), allow_pickle=False)
+        except (OSError, ValueError):
+            return None
+
+    def _storeResult(self, key: str, result: np.ndarray):
+        # Called with the lock held
+        if key in self._results:
+            self._results.move_to_end(key)
+            return
+
+        self._results[key] = result
+        self._nbytes += result.nbytes
+        while self._nbytes > self.maximumSizeInBytes and len(self._results) > 1:
+            _, evictedResult = self._results.popitem(last=False)
+            self._nbytes -= evictedResult.nbytes
+            self.evictions += 1
+
+    def getOrCalculate(self, key: str, calculate: Callable[[], np.ndarray]) -> np.ndarray:
+        """
+        Get a cached result, calculating and storing it if missing.
+
+        Parameters
+        ----------
+        key : str
+            Key of the calculation, see calculateKey
+        calculate : Callable[[], np.ndarray]
+            Function calculating the result if it is not cached
+
+        Returns
+        -------
+        np.ndarray
+            Read-only result array, copy it before modifying it
+        """
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return result
+
+        result = self._loadResult(key)
+        if result is not None:
+            wasLoadedFromDisk = True
+        else:
+            wasLoadedFromDisk = False
+            result = np.array(calculate())
+            if self.cacheDirectory is not None:
+                _writeAtomically(self._getPathToResult(key), lambda resultFile: np.save(resultFile, result))
+
+        result.setflags(write=False)
+        with self._lock:
+            if wasLoadedFromDisk:
+                self.diskHits += 1
+            else:
+                self.misses += 1
+            self._storeResult(key, result)
+
+        return result
+
+    def clear(self, removeFiles: bool = False):
+        """
+        Remove all cached results and reset statistics.
+
+        Parameters
+        ----------
+        removeFiles : bool, default=False
+            Whether to also delete the results persisted in cacheDirectory
+        """
+        with self._lock:
+            self._results.clear()
+            self._nbytes = 0
+            self.hits = 0
+            self.diskHits = 0
+            self.misses = 0
+            self.evictions = 0
+
+            if removeFiles and self.cacheDirectory is not None:
+                for fileName in os.listdir(self.cacheDirectory):
+                    if fileName.endswith(".npy"):
+                        os.remove(os.path.join(self.cacheDirectory, fileName))
+
+    def getStats(self) -> Dict[str, Any]:
+        """
+        Get a dictionary of cache statistics.
+
+        Returns
+        -------
+        Dict[str, Any]
+            Dictionary containing the number of cached results, memory held and
+            its maximum in bytes, and hit/disk hit/miss/eviction counts
+        """
+        with self._lock:
+            return {
+                "size": len(self._results),
+                "nbytes": self._nbytes,
+                "maximumSizeInBytes": self.maximumSizeInBytes,
+                "hits": self.hits,
+                "diskHits": self.diskHits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,313 @@
+import numpy as np
+import pandas as pd
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from . import batchCalculator
+from . import particle
+from . import settings
+from .altitudeResponseCache import AltitudeResponseCache
+from .doseAndFluxCalculator import createDoseRateArray, doseRateOutputColumns
+from .doseGrid import spectrumTypes
+from .requestHashing import calculateArrayHash
+from .rigidityConversionPlan import getRigidityConversionPlan
+from .routeDose import convertTimestampToSeconds
+
+# Columns of a dose time series, one row per (timestamp, altitude) pair
+doseTimeSeriesOutputColumns = ["timestamp (s)"] + doseRateOutputColumns
+doseTimeSeriesOutputDtype = np.dtype([(column, np.float64) for column in doseTimeSeriesOutputColumns])
+
+class DoseTimeSeries:
+    """
+    Streaming calculation of dose and flux rate histories at fixed altitudes.
+
+    Everything that does not depend on the spectrum is prepared once: the
+    rigidity-to-energy conversion of each species, the rebinning onto the MAIRE
+    grid and the altitude-interpolated response matrices (held in an
+    AltitudeResponseCache). Spectra are then evaluated chunkSize timestamps at a
+    time with a single batched matrix product per chunk.
+
+    Results are returned as structured arrays with the fields of
+    doseTimeSeriesOutputColumns, with one row per (timestamp, altitude) pair in
+    time order. Each chunk is yielded by iterate(), kept in memory unless
+    keepInMemory is False, and appended to a CSV file if outputPath is given.
+
+    Attributes
+    ----------
+    altitudesInkm : np.ndarray
+        Altitudes in kilometers every spectrum is evaluated at
+    particleName : str
+        Particle type ("proton", "alpha", or "both")
+    spectrumType : str
+        "rigidity" or "energy"
+    chunkSize : int
+        Number of timestamps evaluated together
+    outputPath : Optional[str]
+        CSV file each chunk is appended to
+
+    Methods
+    -------
+    iterate(timeSeries)
+        Calculate dose rates for a time series of spectra, one chunk at a time
+    append(timestamp, spectrum)
+        Add one spectrum, evaluating the pending spectra once chunkSize are waiting
+    flush()
+        Evaluate all pending spectra
+    toArray()
+        Get all results kept in memory
+    toDataFrame()
+        Get all results kept in memory as a DataFrame
+    """
+
+    def __init__(self, altitudesInkm: Union[np.ndarray, List[float]],
+                 particleName: str = "proton",
+                 spectrumType: str = "rigidity",
+                 inputRigidityBins: Optional[np.ndarray] = None,
+                 inputEnergyBins: np.ndarray = settings.defaultEnergyBins,
+                 verticalCutOffRigidity: float = 0.0,
+                 chunkSize: int = 60,
+                 outputPath: Optional[str] = None,
+                 keepInMemory: bool = True):
+        """
+        Prepare the calculation for a set of altitudes and a spectrum format.
+
+        Parameters
+        ----------
+        altitudesInkm : Union[np.ndarray, List[float]]
+            Altitudes in kilometers, e.g. a set of flight levels
+        particleName : str, default="proton"
+            Particle type ("proton", "alpha", or "both")
+        spectrumType : str, default="rigidity"
+            "rigidity" if spectra are functions of rigidity (GV) or arrays at the
+            midpoints of inputRigidityBins, in particles/cm²/sr/GV/s, as for
+            calculate_from_rigidity_spec; "energy" if spectra are functions of
+            MeV/n or arrays at the midpoints of inputEnergyBins, in
+            particles/cm²/sr/(MeV/n)/s, as for calculate_from_energy_spec_array
+        inputRigidityBins : np.ndarray, optional
+            Rigidity bin edges in GV for rigidity spectra. Required for spectra
+            given as arrays; functions default to the rigidity grid used by
+            calculate_from_rigidity_spec.
+        inputEnergyBins : np.ndarray, default=MAIRE energy bins
+            Energy bin edges in MeV/n for energy spectra, spectra on other grids
+            are rebinned onto the MAIRE grid
+        verticalCutOffRigidity : float, default=0.0
+            Vertical cutoff rigidity in GV
+        chunkSize : int, default=60
+            Number of timestamps evaluated together
+        outputPath : str, optional
+            CSV file to append each chunk of results to. The file is overwritten
+            when the first chunk is written.
+        keepInMemory : bool, default=True
+            Whether to keep all results in memory for toArray and toDataFrame
+        """
+        if spectrumType not in spectrumTypes:
+            raise ValueError(f"spectrumType must be one of {spectrumTypes}!")
+        if chunkSize < 1:
+            raise ValueError("chunkSize must be at least 1!")
+
+        self.altitudesInkm = np.atleast_1d(np.asarray(altitudesInkm, dtype=np.float64))
+        self.particleName = particleName
+        self.spectrumType = spectrumType
+        self.verticalCutOffRigidity = verticalCutOffRigidity
+        self.chunkSize = chunkSize
+        self.outputPath = outputPath
+        self.keepInMemory = keepInMemory
+
+        self._speciesNames = settings.getParticleNamesForCalculation(particleName)
+        self._hasRigidityBins = inputRigidityBins is not None
+        if spectrumType == "rigidity":
+            # The default rigidity grid differs between species, as it is derived from the MAIRE MeV/n grid
+            self._conversionPlans = {speciesName: getRigidityConversionPlan(particle.Particle(speciesName),
+                                                                            inputRigidityBins)
+                                     for speciesName in self._speciesNames}
+            self._speciesEnergyBins = {speciesName: conversionPlan.energyBins
+                                       for speciesName, conversionPlan in self._conversionPlans.items()}
+            self._speciesBinMidPoints = {speciesName: conversionPlan.rigidityMidPoints
+                                         for speciesName, conversionPlan in self._conversionPlans.items()}
+        else:
+            inputEnergyBinsArray = np.asarray(inputEnergyBins, dtype=np.float64)
+            binMidPoints = (inputEnergyBinsArray[1:] + inputEnergyBinsArray[:-1])/2
+            self._speciesEnergyBins = {speciesName: inputEnergyBinsArray for speciesName in self._speciesNames}
+            self._speciesBinMidPoints = {speciesName: binMidPoints for speciesName in self._speciesNames}
+        # Species whose bin midpoints are equal share one evaluation of a spectrum function
+        self._speciesBinMidPointKeys = {speciesName: calculateArrayHash(binMidPoints)
+                                        for speciesName, binMidPoints in self._speciesBinMidPoints.items()}
+
+        self._altitudeResponseCache = AltitudeResponseCache(maximumSize=max(1, len(self._speciesNames)
+                                                                            * len(self.altitudesInkm)))
+        self._pendingTimestamps: List[float] = []
+        self._pendingSpectra: Dict[str, List[np.ndarray]] = {speciesName: [] for speciesName in self._speciesNames}
+        self._results: List[np.ndarray] = []
+        self._hasWrittenOutput = False
+
+    def _evaluateSpectrum(self, spectrum: Union[np.ndarray, List[float], Callable]) -> Dict[str, np.ndarray]:
+        if not callable(spectrum):
+            if self.spectrumType == "rigidity" and not self._hasRigidityBins:
+                raise ValueError("inputRigidityBins must be given for rigidity spectra given as arrays!")
+            fluxes = np.asarray(spectrum, dtype=np.float64)
+            return {speciesName: fluxes for speciesName in self._speciesNames}
+
+        evaluatedFluxes = {}
+        speciesFluxes = {}
+        for speciesName, binMidPoints in self._speciesBinMidPoints.items():
+            binMidPointsKey = self._speciesBinMidPointKeys[speciesName]
+            if binMidPointsKey not in evaluatedFluxes:
+                evaluatedFluxes[binMidPointsKey] = np.asarray(
+                    settings.evaluateSpectrumFunction(spectrum, binMidPoints), dtype=np.float64)
+            speciesFluxes[speciesName] = evaluatedFluxes[binMidPointsKey]
+        return speciesFluxes
+
+    def _calculateChunk(self, timestampsInSeconds: np.ndarray, speciesFluxesMatrices: Dict[str, np.ndarray]) -> np.ndarray:
+        speciesIntegratedFluxes = {}
+        for speciesName, speciesFluxesMatrix in speciesFluxesMatrices.items():
+            if self.spectrumType == "rigidity":
+                speciesFluxesMatrix = self._conversionPlans[speciesName].convertFluxes(speciesFluxesMatrix)
+            speciesIntegratedFluxes[speciesName] = batchCalculator.formatFluxMatrix(
+                self._speciesEnergyBins[speciesName], speciesFluxesMatrix, speciesName, self.verticalCutOffRigidity)
+
+        # (timestamps, altitudes, response types)
+        doses = batchCalculator.calculateDosesFromSpeciesFluxes(speciesIntegratedFluxes, self.altitudesInkm,
+                                                                altitudeResponseCache=self._altitudeResponseCache)
+
+        numberOfAltitudes = len(self.altitudesInkm)
+        doseRateArray = createDoseRateArray(np.tile(self.altitudesInkm, len(timestampsInSeconds)),
+                                            doses.reshape(len(timestampsInSeconds) * numberOfAltitudes, -1))
+
+        outputArray = np.zeros(len(doseRateArray), dtype=doseTimeSeriesOutputDtype)
+        outputArray["timestamp (s)"] = np.repeat(timestampsInSeconds, numberOfAltitudes)
+        for column in doseRateOutputColumns:
+            outputArray[column] = doseRateArray[column]
+        return outputArray
+
+    def _storeChunk(self, outputArray: np.ndarray):
+        if self.keepInMemory:
+            self._results.append(outputArray)
+
+        if self.outputPath is not None:
+            with open(self.outputPath, "a" if self._hasWrittenOutput else "w") as outputFile:
+                np.savetxt(outputFile, outputArray, delimiter=",", fmt="%.10g",
+                           header="" if self._hasWrittenOutput else ",".join(doseTimeSeriesOutputColumns),
+                           comments="")
+            self._hasWrittenOutput = True
+
+    def append(self, timestamp: Any, spectrum: Union[np.ndarray, List[float], Callable]) -> Optional[np.ndarray]:
+        """
+        Add one spectrum, evaluating the pending spectra once chunkSize are waiting.
+
+        Parameters
+        ----------
+        timestamp : Any
+            Time of the spectrum, in seconds or as a datetime (see routeDose.convertTimestampToSeconds)
+        spectrum : Union[np.ndarray, List[float], Callable]
+            Spectrum at that time, see spectrumType
+
+        Returns
+        -------
+        Optional[np.ndarray]
+            Results of the evaluated chunk, or None if spectra are still pending
+        """
+        speciesFluxes = self._evaluateSpectrum(spectrum)
+        self._pendingTimestamps.append(convertTimestampToSeconds(timestamp))
+        for speciesName, fluxes in speciesFluxes.items():
+            self._pendingSpectra[speciesName].append(fluxes)
+
+        if len(self._pendingTimestamps) >= self.chunkSize:
+            return self.flush()
+        return None
+
+    def flush(self) -> Optional[np.ndarray]:
+        """
+        Evaluate all pending spectra.
+
+        Returns
+        -------
+        Optional[np.ndarray]
+            Results of the evaluated chunk, or None if no spectra were pending
+        """
+        if len(self._pendingTimestamps) == 0:
+            return None
+
+        timestampsInSeconds = np.array(self._pendingTimestamps)
+        speciesFluxesMatrices = {speciesName: np.array(pendingSpectra, dtype=np.float64)
+                                 for speciesName, pendingSpectra in self._pendingSpectra.items()}
+        self._pendingTimestamps = []
+        self._pendingSpectra = {speciesName: [] for speciesName in self._speciesNames}
+
+        outputArray = self._calculateChunk(timestampsInSeconds, speciesFluxesMatrices)
+        self._storeChunk(outputArray)
+        return outputArray
+
+    def iterate(self, timeSeries: Iterable[Tuple[Any, Union[np.ndarray, List[float], Callable]]]) -> Iterator[np.ndarray]:
+        """
+        Calculate dose rates for a time series of spectra, one chunk at a time.
+
+        Spectra are read lazily, so timeSeries can be a generator fed by a live
+        data source; a chunk is yielded as soon as chunkSize spectra have been
+        read, and the last, possibly shorter, chunk when timeSeries ends.
+
+        Parameters
+        ----------
+        timeSeries : Iterable[Tuple[Any, Union[np.ndarray, List[float], Callable]]]
+            (timestamp, spectrum) pairs
+
+        Returns
+        -------
+        Iterator[np.ndarray]
+            Structured arrays with the fields of doseTimeSeriesOutputColumns
+        """
+        for timestamp, spectrum in timeSeries:
+            outputArray = self.append(timestamp, spectrum)
+            if outputArray is not None:
+                yield outputArray
+
+        outputArray = self.flush()
+        if outputArray is not None:
+            yield outputArray
+
+    def toArray(self) -> np.ndarray:
+        """
+        Get all results kept in memory.
+
+        Returns
+        -------
+        np.ndarray
+            Structured array with the fields of doseTimeSeriesOutputColumns
+        """
+        if len(self._results) == 0:
+            return np.zeros(0, dtype=doseTimeSeriesOutputDtype)
+        if len(self._results) > 1:
+            self._results = [np.concatenate(self._results)]
+        return self._results[0]
+
+    def toDataFrame(self) -> pd.DataFrame:
+        """
+        Get all results kept in memory as a DataFrame.
+
+        Returns
+        -------
+        pd.DataFrame
+            DataFrame with the columns doseTimeSeriesOutputColumns
+        """
+        return pd.DataFrame(self.toArray())
+
+def iterate_dose_time_series(timeSeries: Iterable[Tuple[Any, Union[np.ndarray, List[float], Callable]]],
+                             altitudesInkm: Union[np.ndarray, List[float]],
+                             **kwargs) -> Iterator[np.ndarray]:
+    """
+    Calculate dose and flux rate histories for a stream of (timestamp, spectrum) pairs.
+
+    Parameters
+    ----------
+    timeSeries : Iterable[Tuple[Any, Union[np.ndarray, List[float], Callable]]]
+        (timestamp, spectrum) pairs, see DoseTimeSeries.iterate
+    altitudesInkm : Union[np.ndarray, List[float]]
+        Altitudes in kilometers
+    **kwargs
+        Further arguments of DoseTimeSeries, e.g. particleName or spectrumType
+
+    Returns
+    -------
+    Iterator[np.ndarray]
+        Structured arrays with the fields of doseTimeSeriesOutputColumns, one per chunk
+    """
+    kwargs.setdefault("keepInMemory", False)
+    return DoseTimeSeries(altitudesInkm, **kwargs).iterate(timeSeries)
@@ -0,0 +1,216 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from typing import Dict, List, NamedTuple, Tuple, Union
+
+from .requestHashing import calculateArrayHash
+from .settings import defaultEnergyBins
+
+# Relative tolerance within which bin edges are treated as the MAIRE grid itself
+maireGridRelativeTolerance = 1e-6
+
+# Maximum number of rebinning matrices kept, one per distinct input grid
+maximumNumberOfCachedRebinningMatrices = 256
+
+class RebinningMatrix(NamedTuple):
+    """
+    Sparse matrix mapping differential fluxes on an input grid to the MAIRE grid, in CSR layout.
+
+    Row j holds, for every input bin i overlapping MAIRE bin j, the width of
+    the overlap divided by the width of MAIRE bin j, so that the product with
+    a piecewise-constant input spectrum conserves the integrated flux in each
+    MAIRE bin.
+    """
+    rowPointers: np.ndarray
+    columnIndices: np.ndarray
+    weights: np.ndarray
+    numberOfInputBins: int
+
+def isMaireEnergyGrid(inputEnergyBins: Union[np.ndarray, List[float]]) -> bool:
+    """
+    Check whether energy bin edges are the MAIRE grid, up to maireGridRelativeTolerance.
+
+    Parameters
+    ----------
+    inputEnergyBins : Union[np.ndarray, List[float]]
+        Energy bin edges in MeV/n
+
+    Returns
+    -------
+    bool
+        True if the bin edges match the 51 MAIRE bin edges
+    """
+    inputEnergyBinsArray = np.asarray(inputEnergyBins, dtype=np.float64)
+    return inputEnergyBinsArray.shape == defaultEnergyBins.shape and \
+        np.allclose(inputEnergyBinsArray, defaultEnergyBins, rtol=maireGridRelativeTolerance, atol=0.0)
+
+def calculateRebinningMatrix(inputEnergyBins: Union[np.ndarray, List[float]]) -> RebinningMatrix:
+    """
+    Calculate the overlap matrix mapping fluxes on an input energy grid to the MAIRE grid.
+
+    Fluxes are assumed constant within each input bin. Parts of the input grid
+    outside the MAIRE grid (10 MeV/n to 1e6 MeV/n) are dropped, as there are no
+    responses for them, and MAIRE bins not covered by the input grid get zero flux.
+
+    Parameters
+    ----------
+    inputEnergyBins : Union[np.ndarray, List[float]]
+        Strictly increasing energy bin edges in MeV/n
+
+    Returns
+    -------
+    RebinningMatrix
+        Matrix with one row per MAIRE bin and one column per input bin
+
+    Raises
+    ------
+    ValueError
+        If there are fewer than two bin edges or the edges are not strictly increasing
+    """
+    inputEnergyBinsArray = np.asarray(inputEnergyBins, dtype=np.float64)
+    if inputEnergyBinsArray.ndim != 1 or len(inputEnergyBinsArray) < 2:
+        raise ValueError("At least two energy bin edges are required for rebinning!")
+    if np.any(np.diff(inputEnergyBinsArray) <= 0):
+        raise ValueError("Energy bin edges must be strictly increasing for rebinning!")
+
+    maireBinWidths = np.diff(defaultEnergyBins)
+
+    rowPointers = np.zeros(len(maireBinWidths) + 1, dtype=np.int64)
+    columnIndices = []
+    weights = []
+    for maireBinIndex, (lowerEdge, upperEdge) in enumerate(zip(defaultEnergyBins[:-1], defaultEnergyBins[1:])):
+        # Input bins with an upper edge above lowerEdge and a lower edge below upperEdge
+        firstInputBin = max(np.searchsorted(inputEnergyBinsArray, lowerEdge, side="right") - 1, 0)
+        lastInputBin = min(np.searchsorted(inputEnergyBinsArray, upperEdge, side="left"), len(inputEnergyBinsArray) - 1)
+        for inputBinIndex in range(firstInputBin, lastInputBin):
+            overlap = min(upperEdge, inputEnergyBinsArray[inputBinIndex + 1]) - max(lowerEdge, inputEnergyBinsArray[inputBinIndex])
+            if overlap > 0:
+                columnIndices.append(inputBinIndex)
+                weights.append(overlap / maireBinWidths[maireBinIndex])
+        rowPointers[maireBinIndex + 1] = len(columnIndices)
+
+    return RebinningMatrix(rowPointers,
+                           np.array(columnIndices, dtype=np.int64),
+                           np.array(weights, dtype=np.float64),
+                           len(inputEnergyBinsArray) - 1)
+
+_rebinningMatrices: "OrderedDict[str, RebinningMatrix]" = OrderedDict()
+_rebinningMatricesLock = threading.Lock()
+
+def getRebinningMatrix(inputEnergyBins: Union[np.ndarray, List[float]]) -> RebinningMatrix:
+    """
+    Get the rebinning matrix for an input energy grid, calculating it on first use.
+
+    Matrices are cached by the values of the bin edges, keeping the
+    maximumNumberOfCachedRebinningMatrices most recently used grids.
+
+    Parameters
+    ----------
+    inputEnergyBins : Union[np.ndarray, List[float]]
+        Strictly increasing energy bin edges in MeV/n
+
+    Returns
+    -------
+    RebinningMatrix
+        Matrix mapping fluxes on inputEnergyBins to the MAIRE grid
+    """
+    key = calculateArrayHash(inputEnergyBins)
+    with _rebinningMatricesLock:
+        rebinningMatrix = _rebinningMatrices.get(key)
+        if rebinningMatrix is not None:
+            _rebinningMatrices.move_to_end(key)
+            return rebinningMatrix
+
+    rebinningMatrix = calculateRebinningMatrix(inputEnergyBins)
+    with _rebinningMatricesLock:
+        _rebinningMatrices[key] = rebinningMatrix
+        while len(_rebinningMatrices) > maximumNumberOfCachedRebinningMatrices:
+            _rebinningMatrices.popitem(last=False)
+
+    return rebinningMatrix
+
+def clearRebinningMatrices():
+    """
+    Remove all cached rebinning matrices.
+    """
+    with _rebinningMatricesLock:
+        _rebinningMatrices.clear()
+
+def applyRebinningMatrix(rebinningMatrix: RebinningMatrix, inputFluxes: np.ndarray) -> np.ndarray:
+    """
+    Multiply fluxes by a rebinning matrix.
+
+    Parameters
+    ----------
+    rebinningMatrix : RebinningMatrix
+        Matrix as returned by getRebinningMatrix
+    inputFluxes : np.ndarray
+        Differential fluxes on the input grid, with the input bins along the last axis
+
+    Returns
+    -------
+    np.ndarray
+        Differential fluxes on the MAIRE grid, with the MAIRE bins along the last axis
+    """
+    inputFluxesArray = np.asarray(inputFluxes, dtype=np.float64)
+    numberOfMaireBins = len(rebinningMatrix.rowPointers) - 1
+    outputFluxes = np.zeros(inputFluxesArray.shape[:-1] + (numberOfMaireBins,))
+
+    contributions = inputFluxesArray[..., rebinningMatrix.columnIndices] * rebinningMatrix.weights
+    nonEmptyRows = np.flatnonzero(np.diff(rebinningMatrix.rowPointers) > 0)
+    if len(nonEmptyRows) > 0:
+        outputFluxes[..., nonEmptyRows] = np.add.reduceat(contributions,
+                                                          rebinningMatrix.rowPointers[nonEmptyRows], axis=-1)
+    return outputFluxes
+
+def rebinEnergySpectraToMaireGrid(inputEnergyBins: Union[np.ndarray, List[float]],
+                                  inputFluxes: Union[np.ndarray, List[float]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Map differential fluxes on any energy grid onto the MAIRE grid.
+
+    Spectra already on the MAIRE grid are returned unchanged.
+
+    Parameters
+    ----------
+    inputEnergyBins : Union[np.ndarray, List[float]]
+        Energy bin edges in MeV/n
+    inputFluxes : Union[np.ndarray, List[float]]
+        Differential fluxes at bin midpoints (particles/cm²/sr/(MeV/n)/s), with
+        the energy bins along the last axis
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        Tuple containing:
+        - Energy bin edges in MeV/n
+        - Differential fluxes on those bins
+
+    Raises
+    ------
+    Exception
+        If the number of fluxes does not match the number of bins
+    """
+    if isMaireEnergyGrid(inputEnergyBins):
+        return inputEnergyBins, inputFluxes
+
+    inputFluxesArray = np.asarray(inputFluxes, dtype=np.float64)
+    if inputFluxesArray.ndim == 0 or np.size(inputEnergyBins) != inputFluxesArray.shape[-1] + 1:
+        raise Exception("Number of bins does not match number of flux values!")
+
+    return defaultEnergyBins, applyRebinningMatrix(getRebinningMatrix(inputEnergyBins), inputFluxesArray)
+
+def getRebinningMatrixStats() -> Dict[str, int]:
+    """
+    Get the number of cached rebinning matrices and the memory they hold.
+
+    Returns
+    -------
+    Dict[str, int]
+        Dictionary with the number of cached matrices and their size in bytes
+    """
+    with _rebinningMatricesLock:
+        return {
+            "size": len(_rebinningMatrices),
+            "nbytes": sum(matrix.rowPointers.nbytes + matrix.columnIndices.nbytes + matrix.weights.nbytes
+                          for matrix in _rebinningMatrices.values()),
+        }
@@ -0,0 +1,54 @@
+import time
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+def warmup(particleNames: Optional[Iterable[str]] = None) -> Dict[str, float]:
+    """
+    Compile (or load from the on-disk cache) all Numba kernels and preload response tables.
+
+    Calling this once at process start-up, e.g. while a worker is being brought
+    into service, moves JIT compilation and response table loading out of the
+    first real request.
+
+    Parameters
+    ----------
+    particleNames : Iterable[str], optional
+        Particles to preload response tables for, defaults to all supported particles
+
+    Returns
+    -------
+    Dict[str, float]
+        Time in seconds spent on each warm-up stage: 'kernelCompilation' (importing
+        the calculator modules, which compiles or loads the kernels),
+        'responseTableLoading' and 'firstCalculation'
+    """
+    timings = {}
+
+    startTime = time.perf_counter()
+    from . import doseAndFluxCalculator
+    from . import particleResponse
+    from . import responseTableRegistry
+    from . import settings
+    timings["kernelCompilation"] = time.perf_counter() - startTime
+
+    if particleNames is None:
+        particleNames = responseTableRegistry.supportedParticleNames
+    particleNames = list(particleNames)
+
+    startTime = time.perf_counter()
+    responseTableRegistry.preloadResponseTables(particleNames)
+    for particleName in particleNames:
+        particleResponse.getStackedResponseTensor(particleName)
+    timings["responseTableLoading"] = time.perf_counter() - startTime
+
+    startTime = time.perf_counter()
+    for particleName in particleNames:
+        doseAndFluxCalculator.calculate_from_energy_spec_array(settings.defaultEnergyBins,
+                                                               np.ones(len(settings.defaultEnergyBins) - 1),
+                                                               [0.0, 10.0],
+                                                               particleName=particleName,
+                                                               output="array")
+    timings["firstCalculation"] = time.perf_counter() - startTime
+
+    return timings
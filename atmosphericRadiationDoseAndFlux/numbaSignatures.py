@@ -0,0 +1,17 @@
+from numba import types
+
+# Explicit signatures let the @njit kernels compile eagerly, and together with
+# cache=True the compiled machine code is stored on disk (next to the source
+# files, or in NUMBA_CACHE_DIR if set), so new processes load the kernels from
+# the cache rather than JIT-compiling them on their first call.
+#
+# Array arguments are declared read-only with any layout, as the response tables
+# are shared read-only arrays and writable arrays convert to read-only ones.
+# Callers must pass float64 (and int64 for index) arrays.
+
+readonlyFloatArray1D = types.Array(types.float64, 1, "A", readonly=True)
+readonlyFloatArray2D = types.Array(types.float64, 2, "A", readonly=True)
+readonlyIntArray1D = types.Array(types.int64, 1, "A", readonly=True)
+floatArray1D = types.float64[:]
+readonlyFloatArray3D = types.Array(types.float64, 3, "A", readonly=True)
+floatArray3D = types.float64[:, :, :]
@@ -0,0 +1,128 @@
+import os
+import numpy as np
+import numba
+from numba import njit, prange
+from typing import Optional
+
+from .numbaSignatures import floatArray3D, readonlyFloatArray1D, readonlyFloatArray2D, readonlyFloatArray3D, readonlyIntArray1D
+
+# Environment variable setting the default number of threads used by the parallel kernels
+numberOfThreadsEnvironmentVariable = "ATMOSPHERIC_RADIATION_NUM_THREADS"
+
+_numberOfThreads: Optional[int] = None
+
+def getMaximumNumberOfThreads() -> int:
+    """
+    Get the largest number of threads the parallel kernels can use.
+
+    Returns
+    -------
+    int
+        Numba's thread pool size, which is set by the NUMBA_NUM_THREADS
+        environment variable and defaults to the number of CPU cores
+    """
+    return numba.config.NUMBA_NUM_THREADS
+
+def setNumberOfThreads(numberOfThreads: Optional[int]):
+    """
+    Set the number of threads used by the parallel kernels.
+
+    Parameters
+    ----------
+    numberOfThreads : Optional[int]
+        Number of threads, between 1 and getMaximumNumberOfThreads(). None
+        restores the default (see getNumberOfThreads).
+
+    Raises
+    ------
+    ValueError
+        If numberOfThreads is out of range
+    """
+    global _numberOfThreads
+    if numberOfThreads is not None and not 1 <= numberOfThreads <= getMaximumNumberOfThreads():
+        raise ValueError(f"numberOfThreads must be between 1 and {getMaximumNumberOfThreads()} (NUMBA_NUM_THREADS)!")
+    _numberOfThreads = numberOfThreads
+
+def getNumberOfThreads() -> int:
+    """
+    Get the number of threads used by the parallel kernels.
+
+    Returns
+    -------
+    int
+        The value set with setNumberOfThreads, otherwise the
+        ATMOSPHERIC_RADIATION_NUM_THREADS environment variable, otherwise
+        getMaximumNumberOfThreads(). Values are capped at getMaximumNumberOfThreads().
+    """
+    numberOfThreads = _numberOfThreads
+    if numberOfThreads is None:
+        numberOfThreads = int(os.environ.get(numberOfThreadsEnvironmentVariable, getMaximumNumberOfThreads()))
+    return max(1, min(numberOfThreads, getMaximumNumberOfThreads()))
+
+# The kernels below are compiled twice, serially and with parallel=True. Every
+# output element is accumulated sequentially by a single thread in the same
+# order, so results are bitwise identical in both modes and for any thread count.
+
+def _calculate_response_kernels(responseTensor: np.ndarray, altitudeLayerIndices: np.ndarray,
+                                altIndicesAbove: np.ndarray, f1Values: np.ndarray) -> np.ndarray:
+    numberOfResponseTypes, _, numberOfEnergyBins = responseTensor.shape
+    kernels = np.empty((len(f1Values), numberOfResponseTypes, numberOfEnergyBins))
+
+    for altitudeIndex in prange(len(f1Values)):
+        f1 = f1Values[altitudeIndex]
+        for responseIndex in range(numberOfResponseTypes):
+            for energyIndex in range(numberOfEnergyBins):
+                kernels[altitudeIndex, responseIndex, energyIndex] = (
+                    f1 * responseTensor[responseIndex, altitudeLayerIndices[altitudeIndex], energyIndex]
+                    + (1.0 - f1) * responseTensor[responseIndex, altIndicesAbove[altitudeIndex], energyIndex])
+
+    return kernels
+
+def _calculate_doses_from_kernels(inputFluxesIntegrated: np.ndarray, kernels: np.ndarray) -> np.ndarray:
+    numberOfSpectra, numberOfEnergyBins = inputFluxesIntegrated.shape
+    numberOfAltitudes, numberOfResponseTypes, _ = kernels.shape
+    doses = np.empty((numberOfSpectra, numberOfAltitudes, numberOfResponseTypes))
+
+    # Flattened (spectrum, altitude) iteration space, so that work is shared out evenly
+    for pairIndex in prange(numberOfSpectra * numberOfAltitudes):
+        spectrumIndex = pairIndex // numberOfAltitudes
+        altitudeIndex = pairIndex % numberOfAltitudes
+        for responseIndex in range(numberOfResponseTypes):
+            dose = 0.0
+            for energyIndex in range(numberOfEnergyBins):
+                dose += kernels[altitudeIndex, responseIndex, energyIndex] * inputFluxesIntegrated[spectrumIndex, energyIndex]
+            doses[spectrumIndex, altitudeIndex, responseIndex] = dose
+
+    return doses
+
+_responseKernelsSignature = floatArray3D(readonlyFloatArray3D, readonlyIntArray1D, readonlyIntArray1D, readonlyFloatArray1D)
+_dosesFromKernelsSignature = floatArray3D(readonlyFloatArray2D, readonlyFloatArray3D)
+
+calculate_response_kernels_serial = njit(_responseKernelsSignature, cache=True)(_calculate_response_kernels)
+calculate_response_kernels_parallel = njit(_responseKernelsSignature, cache=True, parallel=True)(_calculate_response_kernels)
+calculate_doses_from_kernels_serial = njit(_dosesFromKernelsSignature, cache=True)(_calculate_doses_from_kernels)
+calculate_doses_from_kernels_parallel = njit(_dosesFromKernelsSignature, cache=True, parallel=True)(_calculate_doses_from_kernels)
+
+def runParallelKernel(parallelKernel, *args) -> np.ndarray:
+    """
+    Run a parallel kernel with the configured number of threads.
+
+    Parameters
+    ----------
+    parallelKernel : Callable
+        One of the *_parallel kernels in this module
+    *args
+        Arguments of the kernel
+
+    Returns
+    -------
+    np.ndarray
+        Output of the kernel
+    """
+    # Numba's thread count is specific to the calling thread, so it is set for each call
+    previousNumberOfThreads = numba.get_num_threads()
+    numba.set_num_threads(getNumberOfThreads())
+    try:
+        return parallelKernel(*args)
+    finally:
+        numba.set_num_threads(previousNumberOfThreads)
@@ -1,6 +1,26 @@
-import ParticleRigidityCalculationTools
+import warnings
 from typing import Dict, Union, List, Optional
 
+class AlphaParticleWarning(UserWarning):
+    """
+    Warning that alpha particle calculations include all simulated heavier ions.
+    """
+
+_alphaParticleWarningIssued = False
+
+def warnAboutAlphaParticleContributions():
+    """
+    Warn (once per process) that alpha particle results include heavier ions.
+    """
+    global _alphaParticleWarningIssued
+    if _alphaParticleWarningIssued:
+        return
+    _alphaParticleWarningIssued = True
+
+    warnings.warn("Warning from atmosphericRadiationDoseAndFlux module: currently using an alpha particle as input "
+                  "actually calculates the contribution from alpha + all simulated heavier ions, rather than just "
+                  "alpha particles!", AlphaParticleWarning, stacklevel=3)
+
 class Particle:
     """
     Class representing a cosmic ray particle with defined properties.
@@ -48,8 +68,10 @@ class Particle:
             self.atomicCharge = 1
         elif particleName == "alpha":
             self.atomicCharge = 2
+            warnAboutAlphaParticleContributions()
         else:
             raise Exception("Error: currently only protons and alpha particles can be used!")
 
-        # Get atomic mass using the PRCT module
+        # Get atomic mass using the PRCT module, imported here as it imports pandas
+        import ParticleRigidityCalculationTools
         self.atomicMass = ParticleRigidityCalculationTools.getAtomicMass(self.atomicCharge)
\ No newline at end of file
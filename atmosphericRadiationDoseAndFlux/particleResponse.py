@@ -1,5 +1,5 @@
 import numpy as np
-from numba import njit, jit
+from numba import njit, jit, types
 from typing import Tuple, Dict, List, Union, Optional
 import importlib.resources
 
@@ -7,12 +7,13 @@ from .particle import Particle
 from .responseFileParameters import ResponseFileParameters
 from .settings import dataFileDirectory
 from .units import Distance
-
-# Remove deprecated pkg_resources import and use importlib.resources instead
-import importlib_resources
+from .numbaSignatures import readonlyFloatArray1D, readonlyFloatArray2D
+from .binaryResponseTables import binaryTablesEnabled, loadOrBuildStackedResponseTensor
+from .responseTableRegistry import responseTableRegistry, responseFileNames, getPathToResponseFile
 
 # Numba-optimized calculation of dose response
-@njit
+@njit(types.float64(readonlyFloatArray1D, readonlyFloatArray2D, types.int64, types.int64, types.float64),
+      cache=True)
 def calculate_dose_response(weighted_fluxes: np.ndarray, 
                            response_values: np.ndarray, 
                            alt_index: int, 
@@ -47,7 +48,9 @@ def calculate_dose_response(weighted_fluxes: np.ndarray,
     return output_dose
 
 # Numba-optimized calculation of neutron flux response
-@njit
+@njit(types.float64(readonlyFloatArray1D, readonlyFloatArray2D, types.int64, types.int64, types.float64,
+                   types.int64),
+      cache=True)
 def calculate_neutron_response(weighted_fluxes: np.ndarray, 
                               response_values: np.ndarray, 
                               alt_index: int, 
@@ -98,14 +101,16 @@ class ParticleResponse:
     doseType : str
         Type of dose/flux to calculate
     particleResponseArray : np.ndarray
-        Array of response values loaded from response file
+        Read-only array of response values, shared through the response table registry
         
     Methods
     -------
     __init__(particle, doseTypeName)
         Initialize the particle response object
+    getResponseFileName()
+        Get the name of the response file (implemented by subclasses)
     getPathToResponseFile()
-        Get the path to the response file (implemented by subclasses)
+        Get the path to the response file
     calculateDose(altitude, inputEnergyBins, inputFluxesIntegrated)
         Calculate dose or flux at the specified altitude
     getDoseResponseTerms(altitudeLayerIndex, altIndexAbove, energyIndex, f1)
@@ -126,8 +131,20 @@ class ParticleResponse:
         self.particle = particle
         self.doseType = doseTypeName
 
-        pathToRelevantResponseFile = self.getPathToResponseFile()
-        self.particleResponseArray = np.genfromtxt(pathToRelevantResponseFile)
+        # Response files are parsed once per process and shared between instances
+        self.particleResponseArray = responseTableRegistry.getResponseTable(
+            self.particle.particleName, self.getResponseFileName())
+
+    def getPathToResponseFile(self) -> str:
+        """
+        Get the path to the response file.
+        
+        Returns
+        -------
+        str
+            Path to the response file
+        """
+        return getPathToResponseFile(self.particle.particleName, self.getResponseFileName())
 
     def calculateDose(self, altitude: Distance, inputEnergyBins: np.ndarray, 
                     inputFluxesIntegrated: np.ndarray) -> float:
@@ -196,25 +213,35 @@ class DoseRateResponse(ParticleResponse):
     
     Methods
     -------
-    getPathToResponseFile()
-        Get the path to the dose response file
+    getResponseFileName()
+        Get the name of the dose response file
+    getResponseMatrix()
+        Get the (altitude layer x energy bin) response values
     getDoseResponseTerms(altitudeLayerIndex, altIndexAbove, energyIndex, f1)
         Get dose response terms for calculation
     """
 
-    def getPathToResponseFile(self) -> str:
+    def getResponseFileName(self) -> str:
         """
-        Get the path to the dose response file.
+        Get the name of the dose response file.
         
         Returns
         -------
         str
-            Path to the response file
+            Name of the response file
         """
-        # Use importlib_resources instead of pkg_resources
-        with importlib_resources.path(f"atmosphericRadiationDoseAndFlux.data.{self.particle.particleName}", 
-                                    f"{self.doseType}.rpf") as path:
-            return str(path)
+        return f"{self.doseType}.rpf"
+
+    def getResponseMatrix(self) -> np.ndarray:
+        """
+        Get the response values for this dose type.
+        
+        Returns
+        -------
+        np.ndarray
+            Array of response values with shape (altitude layers, 50 energy bins)
+        """
+        return self.particleResponseArray[:, 0:50]
 
     def getDoseResponseTerms(self, altitudeLayerIndex: int, altIndexAbove: int, 
                            energyIndex: int, f1: float) -> Tuple[float, float]:
@@ -255,8 +282,10 @@ class NeutronFluxResponse(ParticleResponse):
         
     Methods
     -------
-    getPathToResponseFile()
-        Get the path to the neutron response file
+    getResponseFileName()
+        Get the name of the neutron response file
+    getResponseMatrix()
+        Get the (altitude layer x energy bin) response values
     getDoseResponseTerms(altitudeLayerIndex, altIndexAbove, energyIndex, f1)
         Get neutron flux response terms for calculation
     """
@@ -267,19 +296,28 @@ class NeutronFluxResponse(ParticleResponse):
         "tn3": 100,  # High-energy neutrons
     }
 
-    def getPathToResponseFile(self) -> str:
+    def getResponseFileName(self) -> str:
         """
-        Get the path to the neutron response file.
+        Get the name of the neutron response file.
         
         Returns
         -------
         str
-            Path to the neutron response file
+            Name of the neutron response file
         """
-        # Use importlib_resources instead of pkg_resources
-        with importlib_resources.path(f"atmosphericRadiationDoseAndFlux.data.{self.particle.particleName}", 
-                                    "neutron.rpf") as path:
-            return str(path)
+        return "neutron.rpf"
+
+    def getResponseMatrix(self) -> np.ndarray:
+        """
+        Get the neutron flux response values for this energy range.
+        
+        Returns
+        -------
+        np.ndarray
+            Array of response values with shape (altitude layers, 50 energy bins)
+        """
+        translationIndex = self.energyIndexTranslationDict[self.doseType]
+        return self.particleResponseArray[:, translationIndex:translationIndex + 50]
 
     def getDoseResponseTerms(self, altitudeLayerIndex: int, altIndexAbove: int, 
                            energyIndex: int, f1: float) -> Tuple[float, float]:
@@ -320,4 +358,56 @@ neutronDoseResponseDict = dict.fromkeys(neutronDoseTypes, NeutronFluxResponse)
 
 # Combined dose response types and classes
 fullListOfDoseResponseTypes = humanDoseTypes + neutronDoseTypes
-fullDoseResponseDict = {**humanDoseResponseDict, **neutronDoseResponseDict}
\ No newline at end of file
+fullDoseResponseDict = {**humanDoseResponseDict, **neutronDoseResponseDict}
+
+# Name of the stacked response tensor in the response table registry
+stackedResponseTensorTableName = "stackedResponseTensor"
+
+def buildStackedResponseTensor(particleName: str) -> np.ndarray:
+    """
+    Stack the response matrices of all response types for a particle.
+
+    Parameters
+    ----------
+    particleName : str
+        Name of the particle ('proton' or 'alpha')
+
+    Returns
+    -------
+    np.ndarray
+        Array with shape (response types, altitude layers, 50 energy bins),
+        with response types ordered as in fullListOfDoseResponseTypes
+    """
+    particleForCalculations = Particle(particleName)
+    return np.stack([fullDoseResponseDict[doseType](particleForCalculations, doseType).getResponseMatrix()
+                     for doseType in fullListOfDoseResponseTypes])
+
+def getStackedResponseTensor(particleName: str) -> np.ndarray:
+    """
+    Get all response types for a particle stacked into a single tensor.
+    
+    The tensor is memory-mapped from the binary table cache (see
+    binaryResponseTables.loadOrBuildStackedResponseTensor), so that processes
+    do not stack the individual response tables into a new array, and is
+    shared through the response table registry.
+    
+    Parameters
+    ----------
+    particleName : str
+        Name of the particle ('proton' or 'alpha')
+        
+    Returns
+    -------
+    np.ndarray
+        Read-only array with shape (response types, altitude layers, 50 energy bins),
+        with response types ordered as in fullListOfDoseResponseTypes
+    """
+    def loadStackedResponseTensor() -> np.ndarray:
+        if not binaryTablesEnabled():
+            return buildStackedResponseTensor(particleName)
+        pathsToSourceFiles = [getPathToResponseFile(particleName, responseFileName)
+                              for responseFileName in responseFileNames]
+        return loadOrBuildStackedResponseTensor(particleName, pathsToSourceFiles,
+                                                lambda: buildStackedResponseTensor(particleName))
+
+    return responseTableRegistry.getTable(particleName, stackedResponseTensorTableName, loadStackedResponseTensor)
@@ -0,0 +1,65 @@
+import functools
+import hashlib
+import numpy as np
+from typing import Any, Hashable
+
+def calculateArrayHash(array: Any) -> str:
+    """
+    Calculate a hash of the values of an array.
+
+    Parameters
+    ----------
+    array : Any
+        Array or list of numbers
+
+    Returns
+    -------
+    str
+        Hexadecimal SHA-256 digest of the array's shape and float64 values
+    """
+    floatArray = np.ascontiguousarray(array, dtype=np.float64)
+    arrayHash = hashlib.sha256(str(floatArray.shape).encode())
+    arrayHash.update(floatArray.tobytes())
+    return arrayHash.hexdigest()
+
+def calculateValueKey(value: Any) -> Hashable:
+    """
+    Get a hashable key identifying a calculation input.
+
+    Arrays, lists and array-likes such as pandas Series are identified by the
+    hash of their values, so that equal spectra given as different objects have
+    the same key. functools.partial objects are identified by their function and
+    arguments. Other callables cannot be compared by value and are identified by
+    the object itself, so their keys are only valid while the object is alive.
+
+    Parameters
+    ----------
+    value : Any
+        Spectrum, bins, altitudes or scalar calculation input
+
+    Returns
+    -------
+    Hashable
+        Key which is equal for equal inputs
+
+    Raises
+    ------
+    TypeError
+        If the value is neither hashable nor convertible to an array of numbers
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (np.ndarray, list, tuple)) or hasattr(value, "__array__"):
+        return ("array", calculateArrayHash(value))
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, functools.partial):
+        return ("partial",
+                calculateValueKey(value.func),
+                tuple(calculateValueKey(argument) for argument in value.args),
+                tuple(sorted((name, calculateValueKey(argument)) for name, argument in value.keywords.items())))
+    try:
+        hash(value)
+    except TypeError:
+        raise TypeError(f"Cannot identify calculation input of type {type(value).__name__} by value!") from None
+    return ("object", value)
@@ -1,11 +1,12 @@
 import numpy as np
-from numba import njit, jit
+from numba import njit, jit, types
 from typing import Tuple, Dict, List, Union, Optional
 
 from .particle import Particle
 from .units import Distance
+from .numbaSignatures import floatArray1D, readonlyFloatArray1D
 
-@njit
+@njit(types.Tuple((types.int64, types.float64))(types.float64, types.float64), cache=True)
 def calculate_altitude_layer_params(altitude_meters: float, altitude_km: float) -> Tuple[int, float]:
     """
     Calculate altitude layer index and interpolation factor using Numba optimization.
@@ -79,7 +80,136 @@ def calculate_altitude_layer_params(altitude_meters: float, altitude_km: float)
     
     return altitude_layer_index, f1
 
-@njit
+# Piecewise altitude layer boundaries used by calculate_altitude_layer_params. Each row is
+# (upper bound in km, first layer number, interpolation mode, start, width), where the
+# interpolation mode is one of:
+#   "constant"      : f1 = 1
+#   "uniformLayers" : layers of `width` metres starting at `start` metres
+#   "integerMeters" : f1 = 1 - (int(metres) - start)/width
+#   "kilometers"    : f1 = 1 - (km - start)/width
+altitudeLayerBoundaryTable = [
+    (0.025, 1, "constant", 0.0, 1.0),
+    (1.025, 1, "uniformLayers", 25, 50),
+    (1.15, 21, "integerMeters", 1025, 1025.0),
+    (5.05, 22, "uniformLayers", 1150, 100),
+    (5.3, 61, "kilometers", 5.05, 0.25),
+    (15.1, 62, "uniformLayers", 5300, 200),
+    (16.5, 111, "kilometers", 15.1, 1.4),
+    (38.5, 112, "uniformLayers", 16500, 1000),
+    (40.5, 134, "kilometers", 38.5, 2.0),
+    (62.5, 135, "kilometers", 40.5, 22.0),
+    (97.5, 136, "kilometers", 40.5, 57.5),
+    (np.inf, 137, "constant", 0.0, 1.0),
+]
+altitudeLayerUpperBoundsInkm = np.array([row[0] for row in altitudeLayerBoundaryTable[:-1]])
+
+# Index of the last altitude layer in the response files
+maximumAltitudeLayerIndex = 136
+
+def calculate_altitude_layer_params_array(altitudesInkm: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Calculate altitude layer indices and interpolation factors for an array of altitudes.
+    
+    This is the array version of calculate_altitude_layer_params: every altitude is
+    assigned to a piece of altitudeLayerBoundaryTable with a single searchsorted call,
+    and the layer index and interpolation factor of each piece are then evaluated for
+    all of its altitudes at once, using the same arithmetic as the scalar version.
+    
+    Parameters
+    ----------
+    altitudesInkm : np.ndarray
+        Altitudes in kilometers
+        
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray, np.ndarray]
+        Tuple containing:
+        - Altitude layer indices (0-indexed)
+        - Indices of the altitude layers above, bounded by the last layer in the
+          response files (the last layer always has f1 = 1)
+        - Interpolation factors (f1)
+        
+    Raises
+    ------
+    Exception
+        If any altitude is greater than 100 km
+    """
+    # Same unit conversion as units.Distance(altitudeInkm * 1000.0)
+    altitudesInMeters = np.atleast_1d(np.asarray(altitudesInkm, dtype=np.float64)) * 1000.0
+    altitudesInkmArray = altitudesInMeters / 1000.0
+
+    if np.any(altitudesInkmArray > 100.0):
+        raise Exception("altitude.km has to be less than 100 km!")
+
+    integerAltitudesInMeters = np.trunc(altitudesInMeters).astype(np.int64)
+    pieceIndices = np.searchsorted(altitudeLayerUpperBoundsInkm, altitudesInkmArray, side="right")
+
+    layers = np.zeros(len(altitudesInMeters), dtype=np.int64)
+    f1 = np.ones(len(altitudesInMeters), dtype=np.float64)
+
+    for pieceIndex in np.unique(pieceIndices):
+        _, firstLayer, interpolationMode, start, width = altitudeLayerBoundaryTable[pieceIndex]
+        inPiece = pieceIndices == pieceIndex
+
+        if interpolationMode == "uniformLayers":
+            metersAboveStart = integerAltitudesInMeters[inPiece] - start
+            layers[inPiece] = metersAboveStart // width + firstLayer
+            f1[inPiece] = 1.0 - (metersAboveStart % width)/float(width)
+        else:
+            layers[inPiece] = firstLayer
+            if interpolationMode == "integerMeters":
+                f1[inPiece] = 1.0 - (integerAltitudesInMeters[inPiece] - start)/width
+            elif interpolationMode == "kilometers":
+                f1[inPiece] = 1.0 - (altitudesInkmArray[inPiece] - start)/width
+
+    # Convert from 1-indexed to 0-indexed for Python arrays
+    altitudeLayerIndices = layers - 1
+    altIndicesAbove = np.minimum(altitudeLayerIndices + 1, maximumAltitudeLayerIndex)
+
+    return altitudeLayerIndices, altIndicesAbove, f1
+
+def calculate_altitude_layer_slopes_array(altitudesInkm: np.ndarray) -> np.ndarray:
+    """
+    Calculate the derivative of the interpolation factor f1 with respect to altitude.
+
+    Within each piece of altitudeLayerBoundaryTable, f1 falls linearly from 1
+    at one layer to 0 at the next, so its slope is -1/width (in km) and does
+    not depend on the altitude within the piece. Pieces evaluated in whole
+    metres ("uniformLayers" and "integerMeters") are treated as linear in
+    altitude, rather than as 1 m steps. At layer boundaries the slope is that
+    of the layer starting there, as in calculate_altitude_layer_params_array.
+
+    Parameters
+    ----------
+    altitudesInkm : np.ndarray
+        Altitudes in kilometers
+
+    Returns
+    -------
+    np.ndarray
+        df1/dh in 1/km for each altitude, zero where f1 is constant
+
+    Raises
+    ------
+    Exception
+        If any altitude is greater than 100 km
+    """
+    altitudesInkmArray = np.atleast_1d(np.asarray(altitudesInkm, dtype=np.float64))
+
+    if np.any(altitudesInkmArray > 100.0):
+        raise Exception("altitude.km has to be less than 100 km!")
+
+    pieceSlopes = np.zeros(len(altitudeLayerBoundaryTable))
+    for pieceIndex, (_, _, interpolationMode, _, width) in enumerate(altitudeLayerBoundaryTable):
+        if interpolationMode in ("uniformLayers", "integerMeters"):
+            pieceSlopes[pieceIndex] = -1000.0/width
+        elif interpolationMode == "kilometers":
+            pieceSlopes[pieceIndex] = -1.0/width
+
+    return pieceSlopes[np.searchsorted(altitudeLayerUpperBoundsInkm, altitudesInkmArray, side="right")]
+
+@njit(types.Tuple((floatArray1D, types.int64))(readonlyFloatArray1D, readonlyFloatArray1D, types.float64),
+      cache=True)
 def calculate_weighted_fluxes(energyBins: np.ndarray, fluxes: np.ndarray, 
                              cutoffEnergy: float) -> Tuple[np.ndarray, int]:
     """
@@ -121,6 +251,39 @@ def calculate_weighted_fluxes(energyBins: np.ndarray, fluxes: np.ndarray,
     
     return weightedFluxes, energyIndex
 
+def calculateWeightedFluxesForParticle(energyBins: np.ndarray, fluxes: np.ndarray,
+                                       particle: Particle) -> np.ndarray:
+    """
+    Calculate weighted flux values for a particle, independently of altitude.
+    
+    Parameters
+    ----------
+    energyBins : np.ndarray
+        Energy bin edges in MeV
+    fluxes : np.ndarray
+        Flux values
+    particle : Particle
+        Particle object (proton or alpha)
+        
+    Returns
+    -------
+    np.ndarray
+        Weighted flux values
+    """
+    # Rigidity cutoff is not relevant for these calculations
+    rigidityCutoff = 0.0
+        
+    # Calculate cutoff energy
+    cutoffEnergy = 1000.0 * (np.sqrt(((rigidityCutoff**2)/particle.atomicMass) + (0.938**2)) - 0.938)
+    
+    # Use Numba-optimized function for weighted flux calculation
+    # Convert to correct types for Numba
+    energyBins_np = np.array(energyBins, dtype=np.float64)
+    fluxes_np = np.array(fluxes, dtype=np.float64)
+    
+    weightedFluxes, _ = calculate_weighted_fluxes(energyBins_np, fluxes_np, cutoffEnergy)
+
+    return weightedFluxes
 
 class ResponseFileParameters:
     """
@@ -216,24 +379,11 @@ class ResponseFileParameters:
         fluxes : np.ndarray
             Flux values
         """
-        # Rigidity cutoff is not relevant for these calculations
-        rigidityCutoff = 0.0
-        
-        # Calculate altitude index above (bounded by max layer)
+        # Calculate altitude index above (bounded by the last layer, which always has f1 = 1)
         altIndexAbove = self.altitudeLayerIndex + 1
-        if altIndexAbove > 137:
-            altIndexAbove = 137
+        if altIndexAbove > maximumAltitudeLayerIndex:
+            altIndexAbove = maximumAltitudeLayerIndex
             
-        # Calculate cutoff energy
-        cutoffEnergy = 1000.0 * (np.sqrt(((rigidityCutoff**2)/self.particle.atomicMass) + (0.938**2)) - 0.938)
-        
-        # Use Numba-optimized function for weighted flux calculation
-        # Convert to correct types for Numba
-        energyBins_np = np.array(energyBins, dtype=np.float64)
-        fluxes_np = np.array(fluxes, dtype=np.float64)
-        
-        weightedFluxes, _ = calculate_weighted_fluxes(energyBins_np, fluxes_np, cutoffEnergy)
-        
         # Store results
         self.altIndexAbove = altIndexAbove
-        self.weightedFluxes = weightedFluxes
\ No newline at end of file
+        self.weightedFluxes = calculateWeightedFluxesForParticle(energyBins, fluxes, self.particle)
@@ -0,0 +1,113 @@
+import numpy as np
+from typing import List, Optional, Union
+
+from . import settings
+from .batchCalculator import calculateResponseKernels, formatFluxMatrix
+from .rigidityConversionPlan import getRigidityConversionPlan
+
+inputGridTypes = ["energy", "rigidity"]
+
+def calculateFluxIntegrationMatrix(inputBins: Optional[Union[np.ndarray, List[float]]],
+                                   speciesName: str,
+                                   inputGrid: str,
+                                   verticalCutOffRigidity: float) -> np.ndarray:
+    """
+    Calculate the matrix mapping differential fluxes on an input grid to energy-integrated MAIRE fluxes.
+
+    Every step from input fluxes to the integrated fluxes contracted with the
+    response tables (rigidity conversion, rebinning onto the MAIRE grid, the
+    vertical cutoff and the factor pi * dE) is linear, so the matrix is found by
+    passing the unit spectrum of each input bin through batchCalculator.formatFluxMatrix.
+
+    Parameters
+    ----------
+    inputBins : Union[np.ndarray, List[float]], optional
+        Energy bin edges in MeV/n or rigidity bin edges in GV. By default, the
+        MAIRE energy grid, or its edges as rigidities of the species.
+    speciesName : str
+        Particle type ("proton" or "alpha")
+    inputGrid : str
+        "energy" or "rigidity"
+    verticalCutOffRigidity : float
+        Vertical cutoff rigidity in GV
+
+    Returns
+    -------
+    np.ndarray
+        Matrix with shape (input bins, 50)
+    """
+    if inputGrid == "rigidity":
+        conversionPlan = getRigidityConversionPlan(speciesName, inputBins)
+        inputEnergyBins = conversionPlan.energyBins
+        unitSpectra = np.diag(conversionPlan.jacobian)
+    else:
+        inputEnergyBins = settings.defaultEnergyBins if inputBins is None else np.asarray(inputBins, dtype=np.float64)
+        unitSpectra = np.eye(len(inputEnergyBins) - 1)
+
+    return formatFluxMatrix(inputEnergyBins, unitSpectra, speciesName, verticalCutOffRigidity)
+
+def get_response_kernels(altitudesInkm: Union[np.ndarray, List[float]],
+                         particleName: str = "proton",
+                         inputGrid: str = "energy",
+                         inputBins: Optional[Union[np.ndarray, List[float]]] = None,
+                         verticalCutOffRigidity: float = 0.0) -> np.ndarray:
+    """
+    Get the linear kernels giving dose and flux rates as dot products with differential input fluxes.
+
+    The dose and flux rates are linear in the input spectrum, so for each
+    altitude and response type,
+
+        doses[m, r] = kernels[m, r, :] @ inputFluxes
+
+    reproduces calculate_from_energy_spec_array (inputGrid="energy") or
+    calculate_from_rigidity_spec_array (inputGrid="rigidity") for the same
+    bins, particle and cutoff. The kernels include the pi * dE factor of the
+    energy integration, the rigidity-to-energy Jacobian for rigidity grids, and
+    the rebinning of other grids onto the MAIRE grid.
+
+    Parameters:
+    -----------
+    altitudesInkm : Union[np.ndarray, List[float]]
+        Altitudes in kilometers
+    particleName : str, default="proton"
+        Particle type ("proton", "alpha", or "both"). For "both", the kernels
+        of both species are summed, as the same input spectrum is applied to each.
+    inputGrid : str, default="energy"
+        "energy" for fluxes in particles/cm²/sr/(MeV/n)/s on energy bins, or
+        "rigidity" for fluxes in particles/cm²/sr/GV/s on rigidity bins
+    inputBins : Union[np.ndarray, List[float]], optional
+        Energy bin edges in MeV/n or rigidity bin edges in GV. By default, the
+        MAIRE energy grid, or for rigidity grids, the rigidities of the MAIRE
+        grid edges for the particle (which differ between protons and alphas,
+        so inputBins must be given for particleName "both").
+    verticalCutOffRigidity : float, default=0.0
+        Vertical cutoff rigidity in GV
+
+    Returns:
+    --------
+    np.ndarray
+        Array with shape (altitudes, response types, input bins), with response
+        types ordered as in particleResponse.fullListOfDoseResponseTypes
+        (edose, adose, dosee, tn1, tn2, tn3)
+
+    Raises:
+    -------
+    ValueError
+        If inputGrid is not "energy" or "rigidity", or rigidity kernels for
+        both particles are requested without inputBins
+    """
+    if inputGrid not in inputGridTypes:
+        raise ValueError(f"inputGrid must be one of {inputGridTypes}!")
+    speciesNames = settings.getParticleNamesForCalculation(particleName)
+    if inputGrid == "rigidity" and inputBins is None and len(speciesNames) > 1:
+        raise ValueError("The default rigidity grid differs between particles, "
+                         "inputBins must be given for rigidity kernels of both particles!")
+
+    kernels = 0.0
+    for speciesName in speciesNames:
+        fluxIntegrationMatrix = calculateFluxIntegrationMatrix(inputBins, speciesName, inputGrid,
+                                                               verticalCutOffRigidity)
+        # (altitudes, responses, 50) @ (50, input bins)
+        kernels = kernels + calculateResponseKernels(altitudesInkm, speciesName) @ fluxIntegrationMatrix.T
+
+    return kernels
@@ -0,0 +1,268 @@
+import threading
+import time
+import numpy as np
+from typing import Callable, Dict, Iterable, Optional, Tuple, Any
+
+# Remove deprecated pkg_resources import and use importlib.resources instead
+import importlib_resources
+
+from .binaryResponseTables import binaryTablesEnabled, loadOrConvertResponseTable
+
+# Response files shipped for every particle type in atmosphericRadiationDoseAndFlux.data
+responseFileNames = ["edose.rpf", "adose.rpf", "dosee.rpf", "neutron.rpf"]
+supportedParticleNames = ["proton", "alpha"]
+
+def getPathToResponseFile(particleName: str, responseFileName: str) -> str:
+    """
+    Get the path to a response file shipped with the package.
+
+    Parameters
+    ----------
+    particleName : str
+        Name of the particle ('proton' or 'alpha')
+    responseFileName : str
+        Name of the response file (e.g. 'edose.rpf', 'neutron.rpf')
+
+    Returns
+    -------
+    str
+        Path to the response file
+    """
+    with importlib_resources.path(f"atmosphericRadiationDoseAndFlux.data.{particleName}",
+                                  responseFileName) as path:
+        return str(path)
+
+def loadResponseFile(particleName: str, responseFileName: str) -> np.ndarray:
+    """
+    Load a response file from disk into a float64 array.
+
+    Unless disabled through the ATMOSPHERIC_RADIATION_DISABLE_BINARY_TABLES
+    environment variable, the table is memory-mapped from the binary table
+    cache, which is (re)built from the ASCII file whenever it is missing or stale.
+
+    Parameters
+    ----------
+    particleName : str
+        Name of the particle ('proton' or 'alpha')
+    responseFileName : str
+        Name of the response file (e.g. 'edose.rpf', 'neutron.rpf')
+
+    Returns
+    -------
+    np.ndarray
+        Array of response values with one row per altitude layer
+    """
+    pathToResponseFile = getPathToResponseFile(particleName, responseFileName)
+
+    if binaryTablesEnabled():
+        return loadOrConvertResponseTable(particleName, responseFileName, pathToResponseFile)
+
+    return np.genfromtxt(pathToResponseFile)
+
+class ResponseTableRegistry:
+    """
+    Process-wide, thread-safe store of parsed response tables.
+
+    Response tables are loaded lazily the first time they are requested and
+    are then shared by every ParticleResponse object in the process. Stored
+    arrays are marked read-only so that no caller can modify the shared copy.
+
+    Attributes
+    ----------
+    hits : int
+        Number of requests served from already loaded tables
+    misses : int
+        Number of requests that required a table to be loaded
+    loadTimeInSeconds : float
+        Total time spent loading tables
+
+    Methods
+    -------
+    getResponseTable(particleName, responseFileName)
+        Get the (read-only) response table for a particle and response file
+    getTable(particleName, tableName, buildTable)
+        Get a (read-only) table, building it on first use
+    setTable(particleName, tableName, table)
+        Place an already built table in the registry
+    preload(particleNames)
+        Load all response tables for the given particles
+    clear()
+        Remove all loaded tables and reset statistics
+    getStats()
+        Get a dictionary of registry statistics
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty registry.
+        """
+        self._tables: Dict[Tuple[str, str], np.ndarray] = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.loadTimeInSeconds = 0.0
+
+    def getResponseTable(self, particleName: str, responseFileName: str) -> np.ndarray:
+        """
+        Get the response table for a particle and response file.
+
+        Parameters
+        ----------
+        particleName : str
+            Name of the particle ('proton' or 'alpha')
+        responseFileName : str
+            Name of the response file (e.g. 'edose.rpf', 'neutron.rpf')
+
+        Returns
+        -------
+        np.ndarray
+            Read-only array of response values
+        """
+        return self.getTable(particleName, responseFileName,
+                             lambda: loadResponseFile(particleName, responseFileName))
+
+    def getTable(self, particleName: str, tableName: str, buildTable: Callable[[], np.ndarray]) -> np.ndarray:
+        """
+        Get a table from the registry, building it on first use.
+
+        This is used both for the response files themselves and for tables
+        derived from them (such as the stacked response tensor used by the
+        batched calculator), so that derived tables are also only built once.
+
+        Parameters
+        ----------
+        particleName : str
+            Name of the particle ('proton' or 'alpha')
+        tableName : str
+            Name of the table (a response file name or derived table name)
+        buildTable : Callable[[], np.ndarray]
+            Function building the table if it has not been loaded yet
+
+        Returns
+        -------
+        np.ndarray
+            Read-only table
+        """
+        key = (particleName, tableName)
+
+        # Fast path without taking the lock; dict lookups are atomic
+        table = self._tables.get(key)
+        if table is not None:
+            with self._lock:
+                self.hits += 1
+            return table
+
+        with self._lock:
+            # Another thread may have loaded the table while we were waiting
+            table = self._tables.get(key)
+            if table is not None:
+                self.hits += 1
+                return table
+
+            startTime = time.perf_counter()
+            table = np.ascontiguousarray(buildTable(), dtype=np.float64)
+            table.setflags(write=False)
+            self.loadTimeInSeconds += time.perf_counter() - startTime
+
+            self._tables[key] = table
+            self.misses += 1
+
+        return table
+
+    def setTable(self, particleName: str, tableName: str, table: np.ndarray):
+        """
+        Place an already built table in the registry.
+
+        This is used to share tables that live outside the registry, such as
+        response tensors in shared memory, without copying them.
+
+        Parameters
+        ----------
+        particleName : str
+            Name of the particle ('proton' or 'alpha')
+        tableName : str
+            Name of the table (a response file name or derived table name)
+        table : np.ndarray
+            Contiguous float64 table, which is marked read-only
+        """
+        table = np.ascontiguousarray(table, dtype=np.float64)
+        table.setflags(write=False)
+
+        with self._lock:
+            self._tables[(particleName, tableName)] = table
+
+    def preload(self, particleNames: Optional[Iterable[str]] = None):
+        """
+        Load all response tables for the given particles.
+
+        Parameters
+        ----------
+        particleNames : Iterable[str], optional
+            Particles to load tables for, defaults to all supported particles
+        """
+        if particleNames is None:
+            particleNames = supportedParticleNames
+
+        for particleName in particleNames:
+            for responseFileName in responseFileNames:
+                self.getResponseTable(particleName, responseFileName)
+
+    def clear(self):
+        """
+        Remove all loaded tables and reset statistics.
+        """
+        with self._lock:
+            self._tables.clear()
+            self.hits = 0
+            self.misses = 0
+            self.loadTimeInSeconds = 0.0
+
+    def getStats(self) -> Dict[str, Any]:
+        """
+        Get a dictionary of registry statistics.
+
+        Returns
+        -------
+        Dict[str, Any]
+            Dictionary containing the loaded table keys, hit/miss counts,
+            total memory held in bytes and total load time in seconds
+        """
+        with self._lock:
+            return {
+                "tables": sorted(self._tables.keys()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "nbytes": sum(table.nbytes for table in self._tables.values()),
+                "loadTimeInSeconds": self.loadTimeInSeconds,
+            }
+
+# Single registry shared by the whole process
+responseTableRegistry = ResponseTableRegistry()
+
+def preloadResponseTables(particleNames: Optional[Iterable[str]] = None):
+    """
+    Load all response tables for the given particles into the shared registry.
+
+    Parameters
+    ----------
+    particleNames : Iterable[str], optional
+        Particles to load tables for, defaults to all supported particles
+    """
+    responseTableRegistry.preload(particleNames)
+
+def clearResponseTables():
+    """
+    Remove all response tables from the shared registry.
+    """
+    responseTableRegistry.clear()
+
+def getResponseTableStats() -> Dict[str, Any]:
+    """
+    Get statistics for the shared response table registry.
+
+    Returns
+    -------
+    Dict[str, Any]
+        Dictionary of registry statistics, see ResponseTableRegistry.getStats
+    """
+    return responseTableRegistry.getStats()
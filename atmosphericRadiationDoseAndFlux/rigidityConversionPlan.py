@@ -0,0 +1,160 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from typing import Dict, Hashable, List, NamedTuple, Optional, Union
+
+import ParticleRigidityCalculationTools as PRCT
+
+from .particle import Particle
+from .requestHashing import calculateArrayHash
+from .settings import defaultEnergyBins
+
+# Maximum number of conversion plans kept, one per (particle, rigidity grid)
+maximumNumberOfCachedConversionPlans = 256
+
+class RigidityConversionPlan(NamedTuple):
+    """
+    Precomputed conversion of spectra on one total-rigidity grid to per-nucleon energy spectra for one particle.
+
+    Attributes
+    ----------
+    rigidityBins : np.ndarray
+        Rigidity bin edges in GV
+    rigidityMidPoints : np.ndarray
+        Rigidity bin midpoints in GV, where spectra are evaluated
+    energyBins : np.ndarray
+        The rigidity bin edges as kinetic energies per nucleon in MeV/n
+    jacobian : np.ndarray
+        dR/d(E/n) in GV/(MeV/n) at each rigidity midpoint, so that fluxes per
+        MeV/n are the fluxes per GV multiplied by this vector
+    """
+    rigidityBins: np.ndarray
+    rigidityMidPoints: np.ndarray
+    energyBins: np.ndarray
+    jacobian: np.ndarray
+
+    def convertFluxes(self, inputFluxesGV: Union[np.ndarray, List[float]]) -> np.ndarray:
+        """
+        Convert differential fluxes per GV at the rigidity midpoints to fluxes per MeV/n.
+
+        Parameters
+        ----------
+        inputFluxesGV : Union[np.ndarray, List[float]]
+            Differential fluxes (particles/cm²/sr/GV/s), with the rigidity bins along the last axis
+
+        Returns
+        -------
+        np.ndarray
+            Differential fluxes (particles/cm²/sr/(MeV/n)/s)
+        """
+        return np.asarray(inputFluxesGV, dtype=np.float64) * self.jacobian
+
+def calculateRigidityConversionPlan(inputRigidityBins: Union[np.ndarray, List[float]],
+                                    particleForCalculations: Particle) -> RigidityConversionPlan:
+    """
+    Calculate the conversion plan for a rigidity grid and particle.
+
+    The energy bin edges and the Jacobian are calculated with
+    ParticleRigidityCalculationTools, once, so that converting spectra with the
+    plan gives the same results as converting each spectrum with it.
+
+    Parameters
+    ----------
+    inputRigidityBins : Union[np.ndarray, List[float]]
+        Rigidity bin edges in GV
+    particleForCalculations : Particle
+        Particle object (proton or alpha)
+
+    Returns
+    -------
+    RigidityConversionPlan
+        Conversion plan with read-only arrays
+    """
+    rigidityBins = np.array(inputRigidityBins, dtype=np.float64)
+    rigidityMidPoints = (rigidityBins[1:] + rigidityBins[:-1])/2
+
+    energyBins = np.array(PRCT.convertTotalRigidityToPerNucleonEnergy(rigidityBins,
+                          particleMassAU=particleForCalculations.atomicMass,
+                          particleChargeAU=particleForCalculations.atomicCharge), dtype=np.float64)
+
+    # The converted spectrum of a flat unit spectrum is the Jacobian itself
+    jacobian = np.array(PRCT.convertTotalRigiditySpecToPerNucleonEnergySpec(rigidityMidPoints,
+                        np.ones(len(rigidityMidPoints)),
+                        particleMassAU=particleForCalculations.atomicMass,
+                        particleChargeAU=particleForCalculations.atomicCharge)["Energy distribution values"],
+                        dtype=np.float64)
+
+    for array in (rigidityBins, rigidityMidPoints, energyBins, jacobian):
+        array.setflags(write=False)
+
+    return RigidityConversionPlan(rigidityBins, rigidityMidPoints, energyBins, jacobian)
+
+_conversionPlans: "OrderedDict[Hashable, RigidityConversionPlan]" = OrderedDict()
+_conversionPlansLock = threading.Lock()
+
+def getRigidityConversionPlan(particleForCalculations: Union[Particle, str],
+                              inputRigidityBins: Optional[Union[np.ndarray, List[float]]] = None) -> RigidityConversionPlan:
+    """
+    Get the conversion plan for a particle and rigidity grid, calculating it on first use.
+
+    Plans are cached by particle and by the values of the bin edges, keeping
+    the maximumNumberOfCachedConversionPlans most recently used plans.
+
+    Parameters
+    ----------
+    particleForCalculations : Union[Particle, str]
+        Particle object or particle name ("proton" or "alpha")
+    inputRigidityBins : Union[np.ndarray, List[float]], optional
+        Rigidity bin edges in GV. By default, the rigidities of the MAIRE
+        energy grid edges for the particle are used.
+
+    Returns
+    -------
+    RigidityConversionPlan
+        Conversion plan with read-only arrays
+    """
+    if isinstance(particleForCalculations, str):
+        particleForCalculations = Particle(particleForCalculations)
+
+    particleKey = (particleForCalculations.atomicMass, particleForCalculations.atomicCharge)
+    rigidityBinsKey = None if inputRigidityBins is None else calculateArrayHash(inputRigidityBins)
+    key = (particleKey, rigidityBinsKey)
+
+    with _conversionPlansLock:
+        conversionPlan = _conversionPlans.get(key)
+        if conversionPlan is not None:
+            _conversionPlans.move_to_end(key)
+            return conversionPlan
+
+    if inputRigidityBins is None:
+        inputRigidityBins = PRCT.convertPerNucleonEnergyToTotalRigidity(
+            defaultEnergyBins,
+            particleMassAU=particleForCalculations.atomicMass,
+            particleChargeAU=particleForCalculations.atomicCharge)
+
+    conversionPlan = calculateRigidityConversionPlan(inputRigidityBins, particleForCalculations)
+    with _conversionPlansLock:
+        _conversionPlans[key] = conversionPlan
+        while len(_conversionPlans) > maximumNumberOfCachedConversionPlans:
+            _conversionPlans.popitem(last=False)
+
+    return conversionPlan
+
+def clearRigidityConversionPlans():
+    """
+    Remove all cached conversion plans.
+    """
+    with _conversionPlansLock:
+        _conversionPlans.clear()
+
+def getRigidityConversionPlanStats() -> Dict[str, int]:
+    """
+    Get the number of cached conversion plans.
+
+    Returns
+    -------
+    Dict[str, int]
+        Dictionary with the number of cached plans
+    """
+    with _conversionPlansLock:
+        return {"size": len(_conversionPlans)}
@@ -0,0 +1,261 @@
+import datetime
+import itertools
+import numpy as np
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Union
+
+from . import batchCalculator
+from . import particleResponse
+from . import settings
+from .doseAndFluxCalculator import createDoseRateArray
+
+# Response types integrated along a route; doses in µSv/hr become µSv and
+# neutron fluxes in n/cm2/s become fluences in n/cm2
+routeDoseOutputColumns = particleResponse.fullListOfDoseResponseTypes
+routeDoseOutputDtype = np.dtype([(column, np.float64) for column in routeDoseOutputColumns])
+
+# Factor converting each response type's rate multiplied by seconds into its integrated unit
+_secondsToRateTimeUnit = np.array([1.0 / 3600.0 if responseType in particleResponse.humanDoseTypes else 1.0
+                                   for responseType in routeDoseOutputColumns])
+
+class RouteWaypoint(NamedTuple):
+    """
+    A point along a flight route.
+
+    Attributes
+    ----------
+    timestamp : Union[float, datetime.datetime, np.datetime64]
+        Time of the waypoint, either in seconds or as a datetime
+    latitude : float
+        Latitude in degrees
+    longitude : float
+        Longitude in degrees
+    altitudeInkm : float
+        Altitude in kilometers
+    verticalCutOffRigidity : float
+        Vertical cutoff rigidity at the waypoint in GV
+    """
+    timestamp: Union[float, datetime.datetime, np.datetime64]
+    latitude: float
+    longitude: float
+    altitudeInkm: float
+    verticalCutOffRigidity: float
+
+class RouteDoseChunk(NamedTuple):
+    """
+    Dose and flux rates for one chunk of waypoints, with running totals.
+
+    Attributes
+    ----------
+    timestampsInSeconds : np.ndarray
+        Timestamps of the waypoints in the chunk in seconds
+    doseRates : np.ndarray
+        Structured array of dose and flux rates at each waypoint, with the
+        fields of doseAndFluxCalculator.doseRateOutputColumns
+    cumulativeDoses : np.ndarray
+        Structured array of doses (µSv) and neutron fluences (n/cm2) accumulated
+        from the start of the route up to each waypoint, with the fields of
+        routeDoseOutputColumns
+    """
+    timestampsInSeconds: np.ndarray
+    doseRates: np.ndarray
+    cumulativeDoses: np.ndarray
+
+def convertTimestampToSeconds(timestamp: Union[float, datetime.datetime, np.datetime64]) -> float:
+    """
+    Convert a waypoint timestamp to seconds.
+
+    Parameters
+    ----------
+    timestamp : Union[float, datetime.datetime, np.datetime64]
+        Timestamp in seconds, or as a datetime (naive datetimes are taken as UTC)
+
+    Returns
+    -------
+    float
+        Timestamp in seconds
+    """
+    if isinstance(timestamp, datetime.datetime):
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=datetime.timezone.utc)
+        return timestamp.timestamp()
+    if isinstance(timestamp, np.datetime64):
+        return float(timestamp.astype("datetime64[ns]").astype(np.int64)) / 1e9
+    return float(timestamp)
+
+def formatWaypoint(waypoint: Union[RouteWaypoint, Dict[str, Any], Iterable]) -> RouteWaypoint:
+    """
+    Convert a waypoint given as a RouteWaypoint, dictionary or sequence to a RouteWaypoint.
+
+    Parameters
+    ----------
+    waypoint : Union[RouteWaypoint, Dict[str, Any], Iterable]
+        Waypoint as a RouteWaypoint, a dictionary with the RouteWaypoint field
+        names as keys, or a sequence of (timestamp, latitude, longitude,
+        altitudeInkm, verticalCutOffRigidity)
+
+    Returns
+    -------
+    RouteWaypoint
+        The waypoint
+    """
+    if isinstance(waypoint, RouteWaypoint):
+        return waypoint
+    if isinstance(waypoint, dict):
+        return RouteWaypoint(**waypoint)
+    return RouteWaypoint(*waypoint)
+
+def _evaluateChunk(waypoints: List[RouteWaypoint],
+                   spectrumProvider: Union[np.ndarray, List[float], Callable[[RouteWaypoint], np.ndarray]],
+                   particleName: str,
+                   inputEnergyBins: np.ndarray) -> np.ndarray:
+    altitudesInkm = np.array([waypoint.altitudeInkm for waypoint in waypoints], dtype=np.float64)
+    verticalCutOffRigidities = np.array([waypoint.verticalCutOffRigidity for waypoint in waypoints], dtype=np.float64)
+
+    if callable(spectrumProvider):
+        inputFluxesMatrix = np.array([spectrumProvider(waypoint) for waypoint in waypoints], dtype=np.float64)
+    else:
+        inputFluxes = np.asarray(spectrumProvider, dtype=np.float64)
+        inputFluxesMatrix = np.broadcast_to(inputFluxes, (len(waypoints), inputFluxes.shape[-1]))
+
+    speciesIntegratedFluxes = {
+        speciesName: batchCalculator.formatFluxMatrix(inputEnergyBins, inputFluxesMatrix,
+                                                      speciesName, verticalCutOffRigidities)
+        for speciesName in settings.getParticleNamesForCalculation(particleName)
+    }
+
+    return batchCalculator.calculateDosesForSpectrumAltitudePairs(speciesIntegratedFluxes, altitudesInkm)
+
+def iterate_route_dose(trajectory: Iterable[Union[RouteWaypoint, Dict[str, Any], Iterable]],
+                       spectrumProvider: Union[np.ndarray, List[float], Callable[[RouteWaypoint], np.ndarray]],
+                       particleName: str = "proton",
+                       inputEnergyBins: np.ndarray = settings.defaultEnergyBins,
+                       chunkSize: int = 3600) -> Iterator[RouteDoseChunk]:
+    """
+    Calculate dose rates along a trajectory and integrate them over time, one chunk at a time.
+
+    Waypoints are read lazily from trajectory, so the trajectory can be a
+    generator and only chunkSize waypoints are held in memory at once. Dose
+    rates are integrated with the trapezoidal rule, including the interval
+    between the last waypoint of one chunk and the first waypoint of the next.
+
+    Parameters:
+    -----------
+    trajectory : Iterable[Union[RouteWaypoint, Dict[str, Any], Iterable]]
+        Waypoints in time order (see formatWaypoint for accepted formats)
+    spectrumProvider : Union[np.ndarray, List[float], Callable[[RouteWaypoint], np.ndarray]]
+        Differential flux values at the midpoints of inputEnergyBins
+        (particles/cm²/sr/(MeV/n)/s), either one spectrum used along the whole
+        route, or a function returning the spectrum at a given waypoint
+    particleName : str, default="proton"
+        Particle type ("proton", "alpha", or "both")
+    inputEnergyBins : np.ndarray, default=MAIRE energy bins
+        Energy bin edges in MeV/n, spectra on other grids are rebinned onto the MAIRE grid
+    chunkSize : int, default=3600
+        Number of waypoints evaluated together
+
+    Returns:
+    --------
+    Iterator[RouteDoseChunk]
+        Dose rates and cumulative doses for each chunk of waypoints
+
+    Raises:
+    -------
+    ValueError
+        If chunkSize is not positive or the timestamps are not in time order
+    """
+    if chunkSize < 1:
+        raise ValueError("chunkSize must be at least 1!")
+
+    waypointIterator = iter(trajectory)
+    cumulativeDoses = np.zeros(len(routeDoseOutputColumns))
+    previousTimestampInSeconds = None
+    previousDoses = None
+
+    while True:
+        waypoints = [formatWaypoint(waypoint) for waypoint in itertools.islice(waypointIterator, chunkSize)]
+        if len(waypoints) == 0:
+            return
+
+        timestampsInSeconds = np.array([convertTimestampToSeconds(waypoint.timestamp) for waypoint in waypoints])
+        doses = _evaluateChunk(waypoints, spectrumProvider, particleName, inputEnergyBins)
+
+        # Prepend the last waypoint of the previous chunk, so that the interval between chunks is included
+        if previousTimestampInSeconds is None:
+            integrationTimes = timestampsInSeconds
+            integrationDoses = doses
+        else:
+            integrationTimes = np.concatenate([[previousTimestampInSeconds], timestampsInSeconds])
+            integrationDoses = np.concatenate([previousDoses[np.newaxis, :], doses])
+
+        timeSteps = np.diff(integrationTimes)
+        if np.any(timeSteps < 0):
+            raise ValueError("Waypoint timestamps must be in time order!")
+
+        trapezoidIncrements = (integrationDoses[1:] + integrationDoses[:-1]) / 2 * timeSteps[:, np.newaxis] \
+                              * _secondsToRateTimeUnit
+        cumulativeIncrements = np.cumsum(trapezoidIncrements, axis=0)
+        if previousTimestampInSeconds is None:
+            cumulativeIncrements = np.concatenate([np.zeros((1, len(routeDoseOutputColumns))), cumulativeIncrements])
+
+        chunkCumulativeDoses = cumulativeDoses + cumulativeIncrements
+        cumulativeDoses = chunkCumulativeDoses[-1]
+        previousTimestampInSeconds = timestampsInSeconds[-1]
+        previousDoses = doses[-1]
+
+        cumulativeDoseArray = np.zeros(len(waypoints), dtype=routeDoseOutputDtype)
+        for columnIndex, column in enumerate(routeDoseOutputColumns):
+            cumulativeDoseArray[column] = chunkCumulativeDoses[:, columnIndex]
+
+        altitudesInkm = np.array([waypoint.altitudeInkm for waypoint in waypoints], dtype=np.float64)
+        yield RouteDoseChunk(timestampsInSeconds, createDoseRateArray(altitudesInkm, doses), cumulativeDoseArray)
+
+def calculate_route_dose(trajectory: Iterable[Union[RouteWaypoint, Dict[str, Any], Iterable]],
+                         spectrumProvider: Union[np.ndarray, List[float], Callable[[RouteWaypoint], np.ndarray]],
+                         particleName: str = "proton",
+                         inputEnergyBins: np.ndarray = settings.defaultEnergyBins,
+                         chunkSize: int = 3600,
+                         progressCallback: Optional[Callable[[RouteDoseChunk], Any]] = None) -> Dict[str, float]:
+    """
+    Calculate the total dose received along a flight route.
+
+    Parameters:
+    -----------
+    trajectory : Iterable[Union[RouteWaypoint, Dict[str, Any], Iterable]]
+        Waypoints in time order, as (timestamp, latitude, longitude, altitudeInkm,
+        verticalCutOffRigidity) sequences, dictionaries or RouteWaypoint objects.
+        Timestamps are in seconds or datetimes.
+    spectrumProvider : Union[np.ndarray, List[float], Callable[[RouteWaypoint], np.ndarray]]
+        Differential flux values at the midpoints of inputEnergyBins
+        (particles/cm²/sr/(MeV/n)/s), either one spectrum used along the whole
+        route, or a function returning the spectrum at a given waypoint
+    particleName : str, default="proton"
+        Particle type ("proton", "alpha", or "both")
+    inputEnergyBins : np.ndarray, default=MAIRE energy bins
+        Energy bin edges in MeV/n, spectra on other grids are rebinned onto the MAIRE grid
+    chunkSize : int, default=3600
+        Number of waypoints evaluated together
+    progressCallback : Callable[[RouteDoseChunk], Any], optional
+        Function called with each RouteDoseChunk as it is calculated, e.g. to
+        stream cumulative totals while the route is processed
+
+    Returns:
+    --------
+    Dict[str, float]
+        Total dose for each dose type in µSv, and total neutron fluence for each
+        neutron flux type in n/cm2
+
+    Notes:
+    ------
+    Each waypoint is evaluated as calculate_from_energy_spec_array would evaluate
+    its spectrum at its altitude and cutoff rigidity, but all waypoints in a
+    chunk are evaluated together (see iterate_route_dose).
+    """
+    totalDoses = {column: 0.0 for column in routeDoseOutputColumns}
+
+    for routeDoseChunk in iterate_route_dose(trajectory, spectrumProvider, particleName=particleName,
+                                             inputEnergyBins=inputEnergyBins, chunkSize=chunkSize):
+        totalDoses = {column: float(routeDoseChunk.cumulativeDoses[column][-1]) for column in routeDoseOutputColumns}
+        if progressCallback is not None:
+            progressCallback(routeDoseChunk)
+
+    return totalDoses
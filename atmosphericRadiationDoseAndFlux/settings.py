@@ -2,32 +2,15 @@ import os
 from functools import wraps
 import numpy as np
 import pandas as pd
-from numba import njit, jit
+from numba import njit, jit, types
 
 from .particle import Particle
+from .numbaSignatures import floatArray1D, readonlyFloatArray1D
 
 import ParticleRigidityCalculationTools as PRCT
 
-import inspect
 from typing import Union, List, Callable, Any, Dict, Tuple, Optional
 
-@njit
-def convert_array_float_numba(value: np.ndarray) -> np.ndarray:
-    """
-    Numba-optimized version of array conversion.
-    
-    Parameters
-    ----------
-    value : np.ndarray
-        Input array to ensure as float array
-        
-    Returns
-    -------
-    np.ndarray
-        Array converted to float64 type
-    """
-    return np.array(value, dtype=np.float64)
-
 def convertListOrFloatToArray(value) -> np.ndarray:
     """
     Convert various input types to numpy arrays.
@@ -51,6 +34,58 @@ def convertListOrFloatToArray(value) -> np.ndarray:
     
     return outputValue
 
+def evaluateSpectrumFunction(spectrumFunction: Callable, binMidPoints: np.ndarray) -> np.ndarray:
+    """
+    Evaluate a spectrum function at every bin midpoint.
+    
+    The function is first called once with the whole array of midpoints, which
+    works for NumPy ufuncs and for most arithmetic expressions such as
+    lambda x: A*x**-mu. If that call raises an error or does not return one value
+    per midpoint, the function is instead called separately for each midpoint.
+    
+    Parameters
+    ----------
+    spectrumFunction : Callable
+        Any callable taking a single energy or rigidity value (functions, lambdas,
+        NumPy ufuncs, functools.partial objects or callable class instances)
+    binMidPoints : np.ndarray
+        Bin midpoints to evaluate the function at
+        
+    Returns
+    -------
+    np.ndarray
+        Float64 array of function values at each midpoint
+    """
+    binMidPointsArray = np.asarray(binMidPoints, dtype=np.float64)
+
+    try:
+        spectrumValues = np.asarray(spectrumFunction(binMidPointsArray), dtype=np.float64)
+        if spectrumValues.shape == binMidPointsArray.shape:
+            return spectrumValues
+    except Exception:
+        pass
+
+    # Fall back to evaluating the function one midpoint at a time
+    return np.array(list(map(spectrumFunction, binMidPointsArray)), dtype=np.float64)
+
+def getParticleNamesForCalculation(particleName: str) -> List[str]:
+    """
+    Get the particle species a calculation for particleName has to cover.
+    
+    Parameters
+    ----------
+    particleName : str
+        Particle type ('proton', 'alpha' or 'both')
+        
+    Returns
+    -------
+    List[str]
+        ['proton', 'alpha'] if particleName is 'both', otherwise [particleName]
+    """
+    if particleName == "both":
+        return ["proton", "alpha"]
+    return [particleName]
+
 def runAcrossBothParticleTypes(args, kwargs, doseFluxCalcFunc):
     """
     Run a calculation for both proton and alpha particles and sum the results.
@@ -90,7 +125,10 @@ def allowCalculationForTotalOfParticles(doseFluxCalcFunc):
     
     This decorator enables a dose or flux calculation function to handle
     the special case where particleName='both', which calculates and combines
-    results for both protons and alpha particles.
+    results for both protons and alpha particles by running the whole
+    calculation once per particle. The functions in doseAndFluxCalculator
+    handle 'both' natively in a single pass instead, so this is only needed
+    for user-defined calculation functions.
     
     Parameters
     ----------
@@ -116,7 +154,56 @@ def allowCalculationForTotalOfParticles(doseFluxCalcFunc):
 
     return totalDoseFlux
 
-@njit
+def convertRigiditySpecToEnergySpec(inputRigidityBins: np.ndarray,
+                                    inputFluxesGV: Union[np.ndarray, List[float], Callable],
+                                    particleForCalculations: Particle) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Convert a total-rigidity spectrum to the per-nucleon energy grid.
+    
+    The conversion uses a cached plan for the particle and rigidity grid, see
+    rigidityConversionPlan.getRigidityConversionPlan.
+    
+    Parameters
+    ----------
+    inputRigidityBins : np.ndarray
+        Rigidity bin edges in GV
+    inputFluxesGV : Union[np.ndarray, List[float], Callable]
+        Differential flux values at bin midpoints (particles/cm²/sr/GV/s) or function to calculate them
+    particleForCalculations : Particle
+        Particle object (proton or alpha)
+        
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        Tuple containing:
+        - Energy bin edges in MeV/n
+        - Differential flux values at bin midpoints (particles/cm²/sr/(MeV/n)/s)
+        
+    Raises
+    ------
+    Exception
+        If inputFluxesGV is not a valid type
+    """
+    # Imported here as the conversion plans module depends on this module
+    from .rigidityConversionPlan import getRigidityConversionPlan
+
+    # Energy bin edges and Jacobian are only calculated once per particle and rigidity grid
+    conversionPlan = getRigidityConversionPlan(particleForCalculations, inputRigidityBins)
+
+    # Process input flux values
+    if callable(inputFluxesGV):
+        inputFluxesGVarray = evaluateSpectrumFunction(inputFluxesGV, conversionPlan.rigidityMidPoints)
+    elif isinstance(inputFluxesGV, (int, float, list, np.ndarray)):
+        inputFluxesGVarray = convertListOrFloatToArray(inputFluxesGV)
+    else:
+        raise Exception("inputFluxesGV not specified as a valid type!")
+
+    # Convert total-rigidity fluxes to per-nucleon energy fluxes
+    inputFluxesMeV = conversionPlan.convertFluxes(inputFluxesGVarray)
+
+    return conversionPlan.energyBins, inputFluxesMeV
+
+@njit(floatArray1D(readonlyFloatArray1D, readonlyFloatArray1D, types.float64), cache=True)
 def apply_cutoff_rigidity_numba(energy_midpoints: np.ndarray, flux_array: np.ndarray, 
                                cutoff_energy: float) -> np.ndarray:
     """
@@ -176,11 +263,6 @@ def formatInputVariables(inputEnergyBins, inputFluxesMeV, altitudesInkm, particl
     # Create Particle object
     particleForCalculations = Particle(particleName)
 
-    # Convert total cutoff rigidity to kinetic energy per nucleon for the MeV/n grid
-    verticalCutOffRigidityInMeV = PRCT.convertTotalRigidityToPerNucleonEnergy(verticalCutOffRigidity,
-                                  particleMassAU=particleForCalculations.atomicMass,
-                                  particleChargeAU=particleForCalculations.atomicCharge)
-
     # Convert inputs to numpy arrays
     inputEnergyBinsArray = convertListOrFloatToArray(inputEnergyBins)
     altitudesInkmArray = convertListOrFloatToArray(altitudesInkm)
@@ -189,8 +271,8 @@ def formatInputVariables(inputEnergyBins, inputFluxesMeV, altitudesInkm, particl
     middleOfEnergyBinsArray = (inputEnergyBinsArray[1:] + inputEnergyBinsArray[:-1])/2
 
     # Process flux input based on type
-    if inspect.isfunction(inputFluxesMeV):
-        inputFluxesArrayMeV_noVcutOff = np.array(list(map(inputFluxesMeV, middleOfEnergyBinsArray)))
+    if callable(inputFluxesMeV):
+        inputFluxesArrayMeV_noVcutOff = evaluateSpectrumFunction(inputFluxesMeV, middleOfEnergyBinsArray)
     elif isinstance(inputFluxesMeV, (int, float, list, np.ndarray, pd.Series)):
         inputFluxesArrayMeV_noVcutOff = convertListOrFloatToArray(inputFluxesMeV)
     else:
@@ -202,10 +284,15 @@ def formatInputVariables(inputEnergyBins, inputFluxesMeV, altitudesInkm, particl
 
     # Apply cutoff rigidity using Numba-optimized function if arrays are compatible
     if verticalCutOffRigidity > 0:
+        # Convert total cutoff rigidity to kinetic energy per nucleon for the MeV/n grid
+        verticalCutOffRigidityInMeV = PRCT.convertTotalRigidityToPerNucleonEnergy(verticalCutOffRigidity,
+                                      particleMassAU=particleForCalculations.atomicMass,
+                                      particleChargeAU=particleForCalculations.atomicCharge)
+
         # For Numba optimization, ensure arrays are float64
         middleOfEnergyBinsArray_np = np.array(middleOfEnergyBinsArray, dtype=np.float64)
         inputFluxesArrayMeV_noVcutOff_np = np.array(inputFluxesArrayMeV_noVcutOff, dtype=np.float64)
-        cutoff_energy = float(verticalCutOffRigidityInMeV)
+        cutoff_energy = float(verticalCutOffRigidityInMeV.iloc[0])
         
         inputFluxesArray = apply_cutoff_rigidity_numba(
             middleOfEnergyBinsArray_np, 
@@ -219,6 +306,8 @@ def formatInputVariables(inputEnergyBins, inputFluxesMeV, altitudesInkm, particl
     return particleForCalculations, inputEnergyBinsArray, altitudesInkmArray, inputFluxesArray
 
 # Constants and paths
+defaultEnergyBins = 10**(0.1*(np.array(range(1,52))-1)+1)  # MAIRE 50-bin grid edges in MeV/n
+
 directory_of_this_file = os.path.dirname(os.path.realpath(__file__))
 homeDirectory = directory_of_this_file
 dataFileDirectory = f"{directory_of_this_file}/data/"
@@ -0,0 +1,311 @@
+import numpy as np
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+from . import particleResponse
+from . import settings
+from .responseKernels import get_response_kernels
+from .rigidityConversionPlan import getRigidityConversionPlan
+from .spectrumFamilies import differentiatePowerLawIntegral, integratePowerLaw
+
+class SpectrumFitResult(NamedTuple):
+    """
+    Result of fitting rigidity power-law spectra to measured dose or flux rates.
+
+    Attributes
+    ----------
+    parameters : Dict[str, float]
+        Fitted normalisation (particles/cm²/sr/GV/s at 1 GV) and spectral index
+        of each species, such as "protonNormalisation" and "protonSpectralIndex",
+        including parameters tied to other ones
+    parameterNames : List[str]
+        Names of the free parameters, in the order of the covariance matrix
+    covariance : np.ndarray
+        Covariance matrix of the free parameters
+    predictedDoses : np.ndarray
+        Dose and flux rates of the fitted spectra, with the shape of the measurements
+    chiSquared : float
+        Sum of squared weighted residuals at the fitted parameters
+    degreesOfFreedom : int
+        Number of measurements minus the number of free parameters
+    numberOfIterations : int
+        Number of Levenberg-Marquardt iterations performed
+    converged : bool
+        Whether the fit converged within the maximum number of iterations
+    """
+    parameters: Dict[str, float]
+    parameterNames: List[str]
+    covariance: np.ndarray
+    predictedDoses: np.ndarray
+    chiSquared: float
+    degreesOfFreedom: int
+    numberOfIterations: int
+    converged: bool
+
+class PowerLawDoseModel:
+    """
+    Dose and flux rates of rigidity power-law spectra, with their gradients, at a fixed set of measurements.
+
+    The model is linear in the flux of each MAIRE bin, so dose rates are dot
+    products of precomputed kernels with the exact bin integrals of
+    normalisation * R**-spectralIndex (see spectrumFamilies), and their
+    derivatives with respect to the spectral indices are dot products with the
+    analytic derivatives of those integrals.
+
+    The free parameters are the natural logarithm of each normalisation and
+    each spectral index. For particleName "both", the alpha spectral index can
+    be tied to the proton one, and the alpha normalisation can be fixed
+    relative to the proton one.
+
+    Parameters
+    ----------
+    altitudesInkm : Union[np.ndarray, List[float]]
+        Altitudes of the measurements in kilometers
+    responseTypes : List[str]
+        Response types of the measurements, from particleResponse.fullListOfDoseResponseTypes
+    particleName : str
+        Particle type ("proton", "alpha", or "both")
+    verticalCutOffRigidity : float
+        Vertical cutoff rigidity in GV
+    tieSpectralIndices : bool
+        If True, use the proton spectral index for alpha particles
+    alphaToProtonRatio : float, optional
+        If given, fix the alpha normalisation to this multiple of the proton normalisation
+    """
+    def __init__(self, altitudesInkm: Union[np.ndarray, List[float]], responseTypes: List[str], particleName: str,
+                 verticalCutOffRigidity: float, tieSpectralIndices: bool,
+                 alphaToProtonRatio: Optional[float] = None):
+        unknownResponseTypes = [responseType for responseType in responseTypes
+                                if responseType not in particleResponse.fullListOfDoseResponseTypes]
+        if unknownResponseTypes:
+            raise ValueError(f"Unknown response types {unknownResponseTypes}, "
+                             f"choose from {particleResponse.fullListOfDoseResponseTypes}!")
+        responseIndices = [particleResponse.fullListOfDoseResponseTypes.index(responseType)
+                           for responseType in responseTypes]
+
+        self.speciesNames = settings.getParticleNamesForCalculation(particleName)
+        inputEnergyDifferences = settings.defaultEnergyBins[1:] - settings.defaultEnergyBins[:-1]
+
+        self.speciesKernels = {}
+        self.speciesRigidityBins = {}
+        for speciesName in self.speciesNames:
+            # Kernels acting on the flux integrated over each MAIRE bin, rather than on differential fluxes
+            kernels = get_response_kernels(altitudesInkm, speciesName,
+                                           verticalCutOffRigidity=verticalCutOffRigidity) / inputEnergyDifferences
+            self.speciesKernels[speciesName] = kernels[:, responseIndices, :].reshape(-1, len(inputEnergyDifferences))
+            self.speciesRigidityBins[speciesName] = getRigidityConversionPlan(speciesName).rigidityBins
+
+        # Each species' (log normalisation index, log normalisation offset, spectral index index) in the parameter vector
+        self.parameterNames = []
+        self.speciesParameterIndices = {}
+        for speciesName in self.speciesNames:
+            if speciesName == "alpha" and "proton" in self.speciesParameterIndices and alphaToProtonRatio is not None:
+                logNormalisationIndex = self.speciesParameterIndices["proton"][0]
+                logNormalisationOffset = np.log(alphaToProtonRatio)
+            else:
+                logNormalisationIndex = len(self.parameterNames)
+                logNormalisationOffset = 0.0
+                self.parameterNames.append(f"{speciesName}Normalisation")
+
+            if speciesName == "alpha" and "proton" in self.speciesParameterIndices and tieSpectralIndices:
+                spectralIndexIndex = self.speciesParameterIndices["proton"][2]
+            else:
+                spectralIndexIndex = len(self.parameterNames)
+                self.parameterNames.append(f"{speciesName}SpectralIndex")
+
+            self.speciesParameterIndices[speciesName] = (logNormalisationIndex, logNormalisationOffset,
+                                                         spectralIndexIndex)
+
+    def getSpeciesParameters(self, parameterVector: np.ndarray) -> Dict[str, Tuple[float, float]]:
+        """
+        Get the normalisation and spectral index of each species from a parameter vector.
+        """
+        return {speciesName: (np.exp(parameterVector[logNormalisationIndex] + logNormalisationOffset),
+                              parameterVector[spectralIndexIndex])
+                for speciesName, (logNormalisationIndex, logNormalisationOffset, spectralIndexIndex)
+                in self.speciesParameterIndices.items()}
+
+    def calculateDosesAndJacobian(self, parameterVector: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Calculate the flattened dose and flux rates and their Jacobian with respect to the parameter vector.
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray]
+            Tuple containing:
+            - Dose and flux rates with shape (altitudes * response types,)
+            - Jacobian with shape (altitudes * response types, free parameters)
+        """
+        speciesParameters = self.getSpeciesParameters(parameterVector)
+
+        doses = 0.0
+        jacobian = np.zeros((len(next(iter(self.speciesKernels.values()))), len(parameterVector)))
+        for speciesName, (logNormalisationIndex, _, spectralIndexIndex) in self.speciesParameterIndices.items():
+            normalisation, spectralIndex = speciesParameters[speciesName]
+            rigidityBins = self.speciesRigidityBins[speciesName]
+            kernels = self.speciesKernels[speciesName]
+
+            speciesDoses = normalisation * (kernels @ integratePowerLaw(rigidityBins[:-1], rigidityBins[1:],
+                                                                        spectralIndex))
+            doses = doses + speciesDoses
+            jacobian[:, logNormalisationIndex] += speciesDoses
+            jacobian[:, spectralIndexIndex] += normalisation * (kernels @ differentiatePowerLawIntegral(
+                rigidityBins[:-1], rigidityBins[1:], spectralIndex))
+
+        return doses, jacobian
+
+def fit_power_law_spectrum(measuredDoses: Union[np.ndarray, List[List[float]]],
+                           altitudesInkm: Union[np.ndarray, List[float]],
+                           responseTypes: Union[str, List[str]] = "adose",
+                           particleName: str = "proton",
+                           measurementUncertainties: Optional[Union[np.ndarray, List[List[float]]]] = None,
+                           verticalCutOffRigidity: float = 0.0,
+                           initialSpectralIndex: float = 3.0,
+                           tieSpectralIndices: bool = True,
+                           alphaToProtonRatio: Optional[float] = None,
+                           maximumIterations: int = 100,
+                           tolerance: float = 1e-10) -> SpectrumFitResult:
+    """
+    Fit rigidity power-law spectra, normalisation * R**-spectralIndex, to measured dose and flux rates.
+
+    Measurements at several altitudes and of several response types are
+    fitted simultaneously with the Levenberg-Marquardt method. Each iteration
+    only evaluates dot products with response kernels calculated once per fit,
+    with analytic derivatives with respect to the spectral parameters, so no
+    spectrum function is evaluated during the fit. Spectra are integrated
+    exactly over each MAIRE bin, as in calculate_from_spectrum_family with the
+    "powerLaw" family.
+
+    Parameters:
+    -----------
+    measuredDoses : Union[np.ndarray, List[List[float]]]
+        Measured rates with shape (altitudes, response types), in the units of
+        the calculator outputs. NaN values mark missing measurements.
+    altitudesInkm : Union[np.ndarray, List[float]]
+        Altitudes of the measurements in kilometers
+    responseTypes : Union[str, List[str]], default="adose"
+        Response type of each column of measuredDoses, from
+        particleResponse.fullListOfDoseResponseTypes (edose, adose, dosee, tn1, tn2, tn3)
+    particleName : str, default="proton"
+        Particle type ("proton", "alpha", or "both"). For "both", proton and
+        alpha spectra are fitted jointly.
+    measurementUncertainties : Union[np.ndarray, List[List[float]]], optional
+        One-sigma uncertainties with the shape of measuredDoses. By default,
+        residuals are relative to the measurements and the covariance is scaled
+        by the reduced chi-squared.
+    verticalCutOffRigidity : float, default=0.0
+        Vertical cutoff rigidity in GV
+    initialSpectralIndex : float, default=3.0
+        Starting value of the spectral indices. Starting normalisations are
+        found by a linear least-squares fit at this index.
+    tieSpectralIndices : bool, default=True
+        For particleName "both", fit a single spectral index for both species
+    alphaToProtonRatio : float, optional
+        For particleName "both", fix the alpha normalisation to this multiple of
+        the proton normalisation instead of fitting it
+    maximumIterations : int, default=100
+        Maximum number of Levenberg-Marquardt iterations
+    tolerance : float, default=1e-10
+        Relative change in chi-squared below which the fit has converged
+
+    Returns:
+    --------
+    SpectrumFitResult
+        Fitted parameters, covariance of the free parameters (normalisations in
+        particles/cm²/sr/GV/s, spectral indices dimensionless), predicted rates
+        and fit statistics
+
+    Raises:
+    -------
+    ValueError
+        If the measurements, uncertainties or response types are inconsistent,
+        or there are fewer measurements than free parameters
+    """
+    if isinstance(responseTypes, str):
+        responseTypes = [responseTypes]
+    altitudesInkmArray = settings.convertListOrFloatToArray(altitudesInkm)
+    measuredDosesArray = np.asarray(measuredDoses, dtype=np.float64).reshape(len(altitudesInkmArray), -1)
+    if measuredDosesArray.shape[1] != len(responseTypes):
+        raise ValueError("measuredDoses must have one row per altitude and one column per response type!")
+
+    if measurementUncertainties is None:
+        uncertaintiesArray = np.abs(measuredDosesArray)
+    else:
+        uncertaintiesArray = np.broadcast_to(np.asarray(measurementUncertainties, dtype=np.float64),
+                                             measuredDosesArray.shape)
+    measured = np.isfinite(measuredDosesArray).ravel()
+    if np.any(uncertaintiesArray.ravel()[measured] <= 0):
+        raise ValueError("Measurement uncertainties must be positive!")
+
+    doseModel = PowerLawDoseModel(altitudesInkmArray, responseTypes, particleName, verticalCutOffRigidity,
+                                  tieSpectralIndices, alphaToProtonRatio)
+    numberOfParameters = len(doseModel.parameterNames)
+    degreesOfFreedom = int(np.sum(measured)) - numberOfParameters
+    if degreesOfFreedom < 0:
+        raise ValueError(f"At least {numberOfParameters} measurements are required to fit "
+                         f"{doseModel.parameterNames}!")
+
+    measuredValues = measuredDosesArray.ravel()[measured]
+    weights = 1.0 / uncertaintiesArray.ravel()[measured]
+
+    def calculateResiduals(parameterVector):
+        doses, jacobian = doseModel.calculateDosesAndJacobian(parameterVector)
+        return (doses[measured] - measuredValues) * weights, jacobian[measured] * weights[:, np.newaxis]
+
+    # Starting normalisations from a weighted linear least-squares fit at the initial spectral index
+    parameterVector = np.array([0.0 if name.endswith("Normalisation") else initialSpectralIndex
+                                for name in doseModel.parameterNames])
+    unitDoses = doseModel.calculateDosesAndJacobian(parameterVector)[0][measured] * weights
+    scale = np.dot(unitDoses, measuredValues * weights) / np.dot(unitDoses, unitDoses)
+    if scale > 0:
+        for index, name in enumerate(doseModel.parameterNames):
+            if name.endswith("Normalisation"):
+                parameterVector[index] = np.log(scale)
+
+    residuals, jacobian = calculateResiduals(parameterVector)
+    chiSquared = np.dot(residuals, residuals)
+    dampingFactor = 1e-3
+    converged = False
+    numberOfIterations = 0
+    while numberOfIterations < maximumIterations and not converged:
+        numberOfIterations += 1
+        normalMatrix = jacobian.T @ jacobian
+        gradient = jacobian.T @ residuals
+        while True:
+            dampedMatrix = normalMatrix + dampingFactor * np.diag(np.diag(normalMatrix))
+            step = -np.linalg.lstsq(dampedMatrix, gradient, rcond=None)[0]
+            trialResiduals, trialJacobian = calculateResiduals(parameterVector + step)
+            trialChiSquared = np.dot(trialResiduals, trialResiduals)
+            if np.isfinite(trialChiSquared) and trialChiSquared <= chiSquared:
+                converged = chiSquared - trialChiSquared <= tolerance * max(chiSquared, np.finfo(float).tiny)
+                parameterVector = parameterVector + step
+                residuals, jacobian, chiSquared = trialResiduals, trialJacobian, trialChiSquared
+                dampingFactor = max(dampingFactor / 10, 1e-12)
+                break
+            dampingFactor *= 10
+            if dampingFactor > 1e12:
+                converged = True
+                break
+
+    # Covariance of the logarithmic normalisations and spectral indices, then of the normalisations themselves
+    covariance = np.linalg.pinv(jacobian.T @ jacobian)
+    if measurementUncertainties is None and degreesOfFreedom > 0:
+        covariance = covariance * chiSquared / degreesOfFreedom
+    speciesParameters = doseModel.getSpeciesParameters(parameterVector)
+    parameterScales = np.array([np.exp(parameterVector[index]) if name.endswith("Normalisation") else 1.0
+                                for index, name in enumerate(doseModel.parameterNames)])
+    covariance = covariance * np.outer(parameterScales, parameterScales)
+
+    parameters = {}
+    for speciesName, (normalisation, spectralIndex) in speciesParameters.items():
+        parameters[f"{speciesName}Normalisation"] = float(normalisation)
+        parameters[f"{speciesName}SpectralIndex"] = float(spectralIndex)
+
+    return SpectrumFitResult(parameters=parameters,
+                             parameterNames=list(doseModel.parameterNames),
+                             covariance=covariance,
+                             predictedDoses=doseModel.calculateDosesAndJacobian(parameterVector)[0].reshape(
+                                 measuredDosesArray.shape),
+                             chiSquared=float(chiSquared),
+                             degreesOfFreedom=degreesOfFreedom,
+                             numberOfIterations=numberOfIterations,
+                             converged=bool(converged))
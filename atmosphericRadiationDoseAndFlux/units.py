@@ -1,5 +1,3 @@
-from numba import jit
-
 class Distance:
     """
     Class representing distances with automatic unit conversions.
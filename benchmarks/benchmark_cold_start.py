@@ -0,0 +1,87 @@
+"""
+Measure cold-start and warm latency of the dose calculator.
+
+Every trial runs in a fresh Python process, and reports the time taken to
+import the package, to run the first calculation and the median time of
+subsequent (warm) calculations. Trials are run in two configurations:
+
+- 'cold cache': empty Numba and binary response table cache directories, so
+  the kernels are compiled and the response tables are parsed from scratch
+- 'warm cache': cache directories populated by a previous process, so the
+  kernels and tables are loaded from disk
+
+Usage:
+    python benchmarks/benchmark_cold_start.py [--trials N]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+trialScript = """
+import json
+import time
+
+startTime = time.perf_counter()
+import numpy as np
+import atmosphericRadiationDoseAndFlux as ARDF
+from atmosphericRadiationDoseAndFlux.settings import defaultEnergyBins
+importTime = time.perf_counter() - startTime
+
+fluxes = np.ones(len(defaultEnergyBins) - 1)
+
+def calculate():
+    ARDF.calculate_from_energy_spec_array(defaultEnergyBins, fluxes, [0.0, 10.0, 20.0], output="array")
+
+startTime = time.perf_counter()
+calculate()
+firstCallTime = time.perf_counter() - startTime
+
+warmCallTimes = []
+for _ in range(20):
+    startTime = time.perf_counter()
+    calculate()
+    warmCallTimes.append(time.perf_counter() - startTime)
+
+print(json.dumps({"import": importTime, "firstCall": firstCallTime, "warmCall": sorted(warmCallTimes)[10]}))
+"""
+
+def runTrial(numbaCacheDirectory: str, responseTableCacheDirectory: str) -> dict:
+    environment = dict(os.environ,
+                       NUMBA_CACHE_DIR=numbaCacheDirectory,
+                       ATMOSPHERIC_RADIATION_CACHE_DIR=responseTableCacheDirectory)
+    completedProcess = subprocess.run([sys.executable, "-c", trialScript], env=environment,
+                                      capture_output=True, text=True, check=True)
+    return json.loads(completedProcess.stdout.strip().splitlines()[-1])
+
+def summarise(label: str, trials: list):
+    print(f"{label}:")
+    for stage in ["import", "firstCall", "warmCall"]:
+        times = [trial[stage] * 1000.0 for trial in trials]
+        print(f"  {stage:<10} median {statistics.median(times):10.2f} ms   min {min(times):10.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trials", type=int, default=3, help="number of processes per configuration")
+    arguments = parser.parse_args()
+
+    coldTrials = []
+    for _ in range(arguments.trials):
+        with tempfile.TemporaryDirectory() as numbaCacheDirectory, \
+             tempfile.TemporaryDirectory() as responseTableCacheDirectory:
+            coldTrials.append(runTrial(numbaCacheDirectory, responseTableCacheDirectory))
+
+    with tempfile.TemporaryDirectory() as numbaCacheDirectory, \
+         tempfile.TemporaryDirectory() as responseTableCacheDirectory:
+        runTrial(numbaCacheDirectory, responseTableCacheDirectory)
+        warmTrials = [runTrial(numbaCacheDirectory, responseTableCacheDirectory)
+                      for _ in range(arguments.trials)]
+
+    summarise("cold cache", coldTrials)
+    summarise("warm cache", warmTrials)
+
+if __name__ == "__main__":
+    main()
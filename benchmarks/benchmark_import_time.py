@@ -0,0 +1,59 @@
+"""
+Measure the time taken to import the package in a fresh Python process.
+
+Importing atmosphericRadiationDoseAndFlux should not import numba, pandas or
+ParticleRigidityCalculationTools, which are only loaded once a calculation is
+first requested. The benchmark reports the median import time over several
+processes, lists any of these modules that were imported, and exits with a
+non-zero status if either the import time exceeds --max-milliseconds or a
+deferred module was imported, so it can be used as a regression check in CI.
+
+Usage:
+    python benchmarks/benchmark_import_time.py [--trials N] [--max-milliseconds T]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+deferredModules = ["numba", "pandas", "ParticleRigidityCalculationTools"]
+
+trialScript = f"""
+import json
+import sys
+import time
+
+startTime = time.perf_counter()
+import atmosphericRadiationDoseAndFlux
+importTime = time.perf_counter() - startTime
+
+print(json.dumps({{"import": importTime,
+                  "deferredModulesImported": [name for name in {deferredModules!r} if name in sys.modules]}}))
+"""
+
+def runTrial() -> dict:
+    completedProcess = subprocess.run([sys.executable, "-c", trialScript],
+                                      capture_output=True, text=True, check=True)
+    return json.loads(completedProcess.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trials", type=int, default=5, help="number of processes to time")
+    parser.add_argument("--max-milliseconds", type=float, default=200.0,
+                        help="fail if the median import time exceeds this many milliseconds")
+    arguments = parser.parse_args()
+
+    trials = [runTrial() for _ in range(arguments.trials)]
+    importTimes = [trial["import"] * 1000.0 for trial in trials]
+    deferredModulesImported = sorted(set().union(*(trial["deferredModulesImported"] for trial in trials)))
+    medianImportTime = statistics.median(importTimes)
+
+    print(f"import atmosphericRadiationDoseAndFlux: median {medianImportTime:.2f} ms   min {min(importTimes):.2f} ms")
+    print(f"deferred modules imported: {', '.join(deferredModulesImported) or 'none'}")
+
+    if deferredModulesImported or medianImportTime > arguments.max_milliseconds:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
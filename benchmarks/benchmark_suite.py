@@ -0,0 +1,184 @@
+"""
+Benchmark the public calculators and compare them against stored baselines.
+
+Each public entry point (calculate_from_energy_spec, calculate_from_rigidity_spec
+and both _array variants) is timed for particleName "proton" and "both" at 1, 60
+and 10,000 altitudes. For every case the suite reports warm calls per second
+(calls are repeated for at least --min-seconds) and the peak memory allocated
+by one call, as traced by tracemalloc. Import time and first-call time (Numba
+compilation and response table loading) are measured in fresh processes with
+empty caches, see benchmark_cold_start.py.
+
+Results can be stored as a baseline with --save-baseline, and compared against
+one with --compare, which exits with a non-zero status if any case is slower
+or allocates more memory than the baseline by more than --tolerance. Baselines
+depend on the machine, so store them on the machine that runs the comparison.
+
+Usage:
+    python benchmarks/benchmark_suite.py [--filter TEXT] [--min-seconds S]
+                                         [--save-baseline | --compare] [--baseline PATH] [--tolerance T]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+
+import atmosphericRadiationDoseAndFlux as ARDF
+from atmosphericRadiationDoseAndFlux.settings import defaultEnergyBins
+
+from benchmark_cold_start import runTrial
+
+defaultBaselinePath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+numbersOfAltitudes = [1, 60, 10000]
+particleNames = ["proton", "both"]
+
+energyBinMidPoints = (defaultEnergyBins[1:] + defaultEnergyBins[:-1])/2
+energyFluxes = 1e4 * energyBinMidPoints ** -2.5
+
+rigidityBins = np.geomspace(0.5, 100.0, 51)
+rigidityFluxes = 1e3 * ((rigidityBins[1:] + rigidityBins[:-1])/2) ** -2.7
+
+def energySpectrum(energyInMeV):
+    return 1e4 * energyInMeV ** -2.5
+
+def rigiditySpectrum(rigidityInGV):
+    return 1e3 * rigidityInGV ** -2.7
+
+def getBenchmarkCases() -> dict:
+    """
+    Get the calculation run by each benchmark case, by case name.
+    """
+    benchmarkCases = {}
+    for numberOfAltitudes in numbersOfAltitudes:
+        altitudesInkm = np.linspace(0.0, 20.0, numberOfAltitudes)
+        for particleName in particleNames:
+            calculations = {
+                "calculate_from_energy_spec": lambda altitudesInkm=altitudesInkm, particleName=particleName:
+                    ARDF.calculate_from_energy_spec(energySpectrum, altitudesInkm, particleName=particleName),
+                "calculate_from_rigidity_spec": lambda altitudesInkm=altitudesInkm, particleName=particleName:
+                    ARDF.calculate_from_rigidity_spec(rigiditySpectrum, altitudesInkm, particleName=particleName),
+                "calculate_from_energy_spec_array": lambda altitudesInkm=altitudesInkm, particleName=particleName:
+                    ARDF.calculate_from_energy_spec_array(defaultEnergyBins, energyFluxes, altitudesInkm,
+                                                          particleName=particleName),
+                "calculate_from_rigidity_spec_array": lambda altitudesInkm=altitudesInkm, particleName=particleName:
+                    ARDF.calculate_from_rigidity_spec_array(rigidityBins, rigidityFluxes, altitudesInkm,
+                                                            particleName=particleName),
+            }
+            for functionName, calculation in calculations.items():
+                benchmarkCases[f"{functionName}[{particleName}, {numberOfAltitudes} altitudes]"] = calculation
+    return benchmarkCases
+
+def runBenchmarkCase(calculation, minimumSeconds: float) -> dict:
+    """
+    Measure warm calls per second and peak traced memory of one calculation.
+    """
+    calculation()
+
+    numberOfCalls = 0
+    startTime = time.perf_counter()
+    while True:
+        calculation()
+        numberOfCalls += 1
+        elapsedTime = time.perf_counter() - startTime
+        if elapsedTime >= minimumSeconds:
+            break
+
+    tracemalloc.start()
+    calculation()
+    _, peakMemoryInBytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"callsPerSecond": numberOfCalls / elapsedTime, "peakMemoryInMB": peakMemoryInBytes / 1024**2}
+
+def runColdStartTrials(numberOfTrials: int) -> dict:
+    """
+    Measure import and first-call time in fresh processes with empty caches.
+    """
+    trials = []
+    for _ in range(numberOfTrials):
+        with tempfile.TemporaryDirectory() as numbaCacheDirectory, \
+             tempfile.TemporaryDirectory() as responseTableCacheDirectory:
+            trials.append(runTrial(numbaCacheDirectory, responseTableCacheDirectory))
+
+    return {"importMilliseconds": statistics.median(trial["import"] for trial in trials) * 1000.0,
+            "firstCallMilliseconds": statistics.median(trial["firstCall"] for trial in trials) * 1000.0}
+
+def findRegressions(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    List the measurements that are worse than the baseline by more than tolerance.
+    """
+    regressions = []
+    for caseName, measurements in results["cases"].items():
+        baselineMeasurements = baseline.get("cases", {}).get(caseName)
+        if baselineMeasurements is None:
+            continue
+        if measurements["callsPerSecond"] < baselineMeasurements["callsPerSecond"] * (1.0 - tolerance):
+            regressions.append(f"{caseName}: {measurements['callsPerSecond']:.1f} calls/s, "
+                               f"baseline {baselineMeasurements['callsPerSecond']:.1f} calls/s")
+        if measurements["peakMemoryInMB"] > baselineMeasurements["peakMemoryInMB"] * (1.0 + tolerance):
+            regressions.append(f"{caseName}: {measurements['peakMemoryInMB']:.2f} MB peak, "
+                               f"baseline {baselineMeasurements['peakMemoryInMB']:.2f} MB peak")
+
+    baselineColdStart = baseline.get("coldStart")
+    if results.get("coldStart") is not None and baselineColdStart is not None:
+        for stage, milliseconds in results["coldStart"].items():
+            if milliseconds > baselineColdStart[stage] * (1.0 + tolerance):
+                regressions.append(f"cold start {stage}: {milliseconds:.1f}, baseline {baselineColdStart[stage]:.1f}")
+
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this text")
+    parser.add_argument("--min-seconds", type=float, default=0.5, help="minimum time to repeat each case for")
+    parser.add_argument("--cold-start-trials", type=int, default=3,
+                        help="number of fresh processes for the cold-start measurement, 0 to skip it")
+    parser.add_argument("--baseline", default=defaultBaselinePath, help="path of the baseline file")
+    baselineMode = parser.add_mutually_exclusive_group()
+    baselineMode.add_argument("--save-baseline", action="store_true", help="store the results as the baseline")
+    baselineMode.add_argument("--compare", action="store_true", help="fail if results regress from the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="allowed relative slowdown or memory increase when comparing")
+    arguments = parser.parse_args()
+
+    # The alpha particle warning would otherwise be printed in the middle of the results
+    warnings.simplefilter("ignore", ARDF.AlphaParticleWarning)
+
+    results = {"cases": {}, "coldStart": None}
+    if arguments.cold_start_trials > 0:
+        results["coldStart"] = runColdStartTrials(arguments.cold_start_trials)
+        print(f"{'import':<75} {results['coldStart']['importMilliseconds']:12.1f} ms")
+        print(f"{'first call (cold caches)':<75} {results['coldStart']['firstCallMilliseconds']:12.1f} ms")
+
+    for caseName, calculation in getBenchmarkCases().items():
+        if arguments.filter not in caseName:
+            continue
+        measurements = runBenchmarkCase(calculation, arguments.min_seconds)
+        results["cases"][caseName] = measurements
+        print(f"{caseName:<75} {measurements['callsPerSecond']:12.1f} calls/s {measurements['peakMemoryInMB']:10.2f} MB peak")
+
+    if arguments.save_baseline:
+        with open(arguments.baseline, "w") as baselineFile:
+            json.dump(results, baselineFile, indent=2, sort_keys=True)
+        print(f"baseline written to {arguments.baseline}")
+
+    if arguments.compare:
+        with open(arguments.baseline) as baselineFile:
+            baseline = json.load(baselineFile)
+        regressions = findRegressions(results, baseline, arguments.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("no regressions against the baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""The array altitude-layer lookup must reproduce the scalar branch logic exactly."""
+
+import numpy as np
+import pytest
+
+from atmosphericRadiationDoseAndFlux.responseFileParameters import (
+    altitudeLayerUpperBoundsInkm,
+    calculate_altitude_layer_params,
+    calculate_altitude_layer_params_array,
+)
+from atmosphericRadiationDoseAndFlux.units import Distance
+
+
+def _layer_test_altitudes_km():
+    rng = np.random.default_rng(42)
+    boundaries = altitudeLayerUpperBoundsInkm
+    return np.concatenate([
+        np.linspace(0.0, 100.0, 20001),
+        rng.uniform(0.0, 100.0, 5000),
+        boundaries,
+        np.nextafter(boundaries, -np.inf),
+        [100.0],
+    ])
+
+
+def test_array_layer_lookup_is_bitwise_identical_to_scalar():
+    altitudes_km = _layer_test_altitudes_km()
+    layer_indices, layers_above, f1_values = calculate_altitude_layer_params_array(altitudes_km)
+
+    for altitude_km, layer_index, layer_above, f1 in zip(altitudes_km, layer_indices, layers_above, f1_values):
+        altitude = Distance(altitude_km * 1000.0)
+        expected_layer_index, expected_f1 = calculate_altitude_layer_params(altitude.meters, altitude.km)
+        assert layer_index == expected_layer_index
+        assert f1 == expected_f1
+        assert layer_above == min(expected_layer_index + 1, 136)
+
+
+def test_array_layer_lookup_rejects_altitudes_above_100_km():
+    with pytest.raises(Exception, match="100 km"):
+        calculate_altitude_layer_params_array([10.0, 100.5])
@@ -0,0 +1,185 @@
+"""asyncio API tests: awaited results must match the synchronous calculators, with coalescing and micro-batching."""
+
+import asyncio
+import functools
+
+import numpy as np
+import pytest
+
+from atmosphericRadiationDoseAndFlux import batchCalculator
+from atmosphericRadiationDoseAndFlux.asyncCalculator import (
+    AsyncDoseCalculator,
+    calculate_from_energy_spec_array_async,
+)
+from atmosphericRadiationDoseAndFlux.doseAndFluxCalculator import (
+    calculate_from_energy_spec,
+    calculate_from_energy_spec_array,
+    calculate_from_rigidity_spec,
+    calculate_from_rigidity_spec_array,
+    doseRateOutputColumns,
+)
+from atmosphericRadiationDoseAndFlux.settings import defaultEnergyBins
+
+
+ALTITUDES_KM = [0.0, 5.0, 10.0, 11.5]
+MIDPOINTS = (defaultEnergyBins[1:] + defaultEnergyBins[:-1]) / 2
+
+
+def _rigidity_power_law(rigidity, spectral_index):
+    return 1e3 * rigidity ** -spectral_index
+
+
+def _assert_outputs_match(output, expected):
+    for column in doseRateOutputColumns:
+        np.testing.assert_allclose(output[column], expected[column], rtol=1e-12)
+
+
+def test_async_calculators_match_synchronous_calculators():
+    rigidity_bins = np.geomspace(0.5, 50.0, 51)
+    rigidity_fluxes = 1e3 * ((rigidity_bins[1:] + rigidity_bins[:-1]) / 2) ** -2.7
+    energy_spectrum = lambda energy: energy ** -2.5
+
+    async def run(calculator):
+        return await asyncio.gather(
+            calculator.calculate_from_energy_spec(energy_spectrum, ALTITUDES_KM, particleName="both"),
+            calculator.calculate_from_rigidity_spec(functools.partial(_rigidity_power_law, spectral_index=2.7),
+                                                    ALTITUDES_KM, particleName="alpha", verticalCutOffRigidity=2.0),
+            calculator.calculate_from_energy_spec_array(defaultEnergyBins, MIDPOINTS ** -2.5, ALTITUDES_KM,
+                                                        verticalCutOffRigidity=3.0, output="array"),
+            calculator.calculate_from_rigidity_spec_array(rigidity_bins, rigidity_fluxes, [7.0, 1.0],
+                                                          particleName="both"))
+
+    calculator = AsyncDoseCalculator(maxWorkers=2)
+    try:
+        outputs = asyncio.run(run(calculator))
+    finally:
+        calculator.shutdown()
+
+    expected = [
+        calculate_from_energy_spec(energy_spectrum, ALTITUDES_KM, particleName="both"),
+        calculate_from_rigidity_spec(functools.partial(_rigidity_power_law, spectral_index=2.7), ALTITUDES_KM,
+                                     particleName="alpha", verticalCutOffRigidity=2.0),
+        calculate_from_energy_spec_array(defaultEnergyBins, MIDPOINTS ** -2.5, ALTITUDES_KM,
+                                         verticalCutOffRigidity=3.0, output="array"),
+        calculate_from_rigidity_spec_array(rigidity_bins, rigidity_fluxes, [7.0, 1.0], particleName="both"),
+    ]
+    for output, expected_output in zip(outputs, expected):
+        assert type(output) is type(expected_output)
+        _assert_outputs_match(output, expected_output)
+    assert calculator.batchesCalculated == 1
+
+
+def test_identical_concurrent_requests_are_coalesced():
+    calculator = AsyncDoseCalculator(maxWorkers=1)
+
+    async def run():
+        # Equal spectra given as different objects share one calculation
+        return await asyncio.gather(*[
+            calculator.calculate_from_energy_spec_array(defaultEnergyBins, list(MIDPOINTS ** -2.5), ALTITUDES_KM,
+                                                        output="array")
+            for _ in range(10)])
+
+    try:
+        outputs = asyncio.run(run())
+    finally:
+        calculator.shutdown()
+
+    assert calculator.coalescedRequests == 9
+    outputs[0]["edose"][:] = 0.0
+    expected = calculate_from_energy_spec_array(defaultEnergyBins, MIDPOINTS ** -2.5, ALTITUDES_KM, output="array")
+    _assert_outputs_match(outputs[1], expected)
+
+
+def test_many_small_requests_are_micro_batched():
+    fluxes = MIDPOINTS ** -2.5 * np.random.default_rng(0).uniform(0.5, 2.0, (40, 50))
+    calculator = AsyncDoseCalculator(maxWorkers=2, batchWindowInSeconds=0.05, maxBatchSize=16)
+
+    async def run():
+        return await asyncio.gather(*[
+            calculator.calculate_from_energy_spec_array(defaultEnergyBins, spectrum_fluxes, [float(index % 7)],
+                                                        particleName="both", output="array")
+            for index, spectrum_fluxes in enumerate(fluxes)])
+
+    try:
+        outputs = asyncio.run(run())
+    finally:
+        calculator.shutdown()
+
+    assert calculator.batchesCalculated == 3
+    for index, (spectrum_fluxes, output) in enumerate(zip(fluxes, outputs)):
+        expected = calculate_from_energy_spec_array(defaultEnergyBins, spectrum_fluxes, [float(index % 7)],
+                                                    particleName="both", output="array")
+        _assert_outputs_match(output, expected)
+
+
+def test_errors_are_raised_only_for_the_failing_request():
+    calculator = AsyncDoseCalculator(maxWorkers=1)
+
+    async def run():
+        return await asyncio.gather(
+            calculator.calculate_from_energy_spec_array(defaultEnergyBins, MIDPOINTS ** -2.5, ALTITUDES_KM),
+            calculator.calculate_from_energy_spec_array(defaultEnergyBins, MIDPOINTS[:10], ALTITUDES_KM),
+            return_exceptions=True)
+
+    try:
+        valid_output, error = asyncio.run(run())
+    finally:
+        calculator.shutdown()
+
+    assert isinstance(error, Exception)
+    _assert_outputs_match(valid_output,
+                          calculate_from_energy_spec_array(defaultEnergyBins, MIDPOINTS ** -2.5, ALTITUDES_KM))
+
+    with pytest.raises(Exception):
+        asyncio.run(AsyncDoseCalculator().calculate_from_energy_spec(lambda energy: energy ** -2.5, ALTITUDES_KM,
+                                                                     verticalCutOffRigidity=1.0))
+
+
+def test_out_of_range_altitudes_only_fail_their_own_request():
+    calculator = AsyncDoseCalculator(maxWorkers=1, batchWindowInSeconds=0.05)
+
+    async def run():
+        return await asyncio.gather(
+            calculator.calculate_from_energy_spec_array(defaultEnergyBins, MIDPOINTS ** -2.5, [200.0]),
+            calculator.calculate_from_energy_spec_array(defaultEnergyBins, MIDPOINTS ** -2.5, [5.0]),
+            return_exceptions=True)
+
+    try:
+        error, valid_output = asyncio.run(run())
+    finally:
+        calculator.shutdown()
+
+    assert calculator.batchesCalculated == 1
+    assert isinstance(error, Exception) and "100 km" in str(error)
+    _assert_outputs_match(valid_output, calculate_from_energy_spec_array(defaultEnergyBins, MIDPOINTS ** -2.5, [5.0]))
+
+
+def test_requests_are_evaluated_separately_if_the_shared_evaluation_fails(monkeypatch):
+    original_calculate_doses = batchCalculator.calculateDosesFromSpeciesFluxes
+
+    def fail_for_several_spectra(species_integrated_fluxes, altitudes_km, **kwargs):
+        if any(len(fluxes) > 1 for fluxes in species_integrated_fluxes.values()):
+            raise RuntimeError("shared evaluation failed")
+        return original_calculate_doses(species_integrated_fluxes, altitudes_km, **kwargs)
+
+    monkeypatch.setattr(batchCalculator, "calculateDosesFromSpeciesFluxes", fail_for_several_spectra)
+    calculator = AsyncDoseCalculator(maxWorkers=1, batchWindowInSeconds=0.05)
+
+    async def run():
+        return await asyncio.gather(
+            calculator.calculate_from_energy_spec_array(defaultEnergyBins, MIDPOINTS ** -2.5, ALTITUDES_KM),
+            calculator.calculate_from_energy_spec_array(defaultEnergyBins, MIDPOINTS ** -3.0, ALTITUDES_KM))
+
+    try:
+        outputs = asyncio.run(run())
+    finally:
+        calculator.shutdown()
+
+    for output, spectral_index in zip(outputs, [2.5, 3.0]):
+        _assert_outputs_match(output, calculate_from_energy_spec_array(defaultEnergyBins, MIDPOINTS ** -spectral_index,
+                                                                       ALTITUDES_KM))
+
+
+def test_module_level_coroutines_use_a_shared_calculator():
+    output = asyncio.run(calculate_from_energy_spec_array_async(defaultEnergyBins, MIDPOINTS ** -2.5, ALTITUDES_KM))
+    _assert_outputs_match(output, calculate_from_energy_spec_array(defaultEnergyBins, MIDPOINTS ** -2.5, ALTITUDES_KM))
@@ -0,0 +1,121 @@
+"""Batched engine tests: every spectrum/altitude must match the DataFrame path."""
+
+import numpy as np
+import pytest
+
+from atmosphericRadiationDoseAndFlux.altitudeResponseCache import AltitudeResponseCache
+from atmosphericRadiationDoseAndFlux.batchCalculator import (
+    buildAltitudeInterpolationMatrix,
+    calculate_from_energy_spec_batch,
+)
+from atmosphericRadiationDoseAndFlux.doseAndFluxCalculator import calculate_from_energy_spec_array
+from atmosphericRadiationDoseAndFlux.particleResponse import fullListOfDoseResponseTypes
+
+
+BATCH_ALTITUDES_KM = [0.0, 0.01, 0.5, 1.1, 3.0, 5.2, 10.0, 15.5, 18.5928, 39.0, 50.0, 60.0, 99.9]
+
+
+def _maire_energy_bins_MeV_n():
+    return 10**(0.1*(np.array(range(1, 52))-1)+1)
+
+
+def _spectrum_matrix():
+    energy_bins = _maire_energy_bins_MeV_n()
+    midpoints = (energy_bins[1:] + energy_bins[:-1]) / 2
+    rng = np.random.default_rng(0)
+    return np.array([midpoints ** -index for index in (2.0, 3.0, 4.5)]) * rng.uniform(0.5, 2.0, (3, 50))
+
+
+@pytest.mark.parametrize("particle_name", ["proton", "alpha"])
+def test_batch_matches_single_spectrum_path(particle_name):
+    energy_bins = _maire_energy_bins_MeV_n()
+    flux_matrix = _spectrum_matrix()
+
+    batch_output = calculate_from_energy_spec_batch(
+        energy_bins, flux_matrix, BATCH_ALTITUDES_KM, particleName=particle_name
+    )
+
+    assert batch_output.shape == (3, len(BATCH_ALTITUDES_KM), len(fullListOfDoseResponseTypes))
+    for spectrum_index, fluxes in enumerate(flux_matrix):
+        output_df = calculate_from_energy_spec_array(
+            energy_bins, fluxes, BATCH_ALTITUDES_KM, particleName=particle_name
+        )
+        np.testing.assert_allclose(
+            batch_output[spectrum_index],
+            output_df[fullListOfDoseResponseTypes].to_numpy(dtype=float),
+            rtol=1e-12,
+            atol=0.0,
+        )
+
+
+def test_interpolation_matrix_rows_sum_to_one():
+    interpolation_matrix = buildAltitudeInterpolationMatrix(np.linspace(0, 100, 401))
+    np.testing.assert_allclose(interpolation_matrix.sum(axis=1), 1.0, rtol=1e-15)
+
+
+def test_batch_rejects_bad_shapes_and_altitudes():
+    energy_bins = _maire_energy_bins_MeV_n()
+    with pytest.raises(Exception, match="Number of bins"):
+        calculate_from_energy_spec_batch(energy_bins, np.ones((2, 49)), [10.0])
+    with pytest.raises(Exception, match="100 km"):
+        calculate_from_energy_spec_batch(energy_bins, np.ones((2, 50)), [101.0])
+
+
+def test_altitude_response_cache_matches_uncached_batch():
+    energy_bins = _maire_energy_bins_MeV_n()
+    flux_matrix = _spectrum_matrix()
+    cache = AltitudeResponseCache(maximumSize=8)
+
+    first = cache.calculateDoses(energy_bins, flux_matrix, BATCH_ALTITUDES_KM[:6])
+    second = cache.calculateDoses(energy_bins, flux_matrix, BATCH_ALTITUDES_KM[:6])
+
+    np.testing.assert_array_equal(first, second)
+    np.testing.assert_allclose(
+        first, calculate_from_energy_spec_batch(energy_bins, flux_matrix, BATCH_ALTITUDES_KM[:6]), rtol=1e-14
+    )
+    stats = cache.getStats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (6, 6, 6)
+
+
+def test_altitude_response_cache_evicts_least_recently_used():
+    cache = AltitudeResponseCache(maximumSize=2)
+    cache.getEffectiveResponses("proton", [1.0, 2.0])
+    cache.getEffectiveResponses("proton", [1.0])
+    cache.getEffectiveResponses("proton", [3.0])
+    cache.getEffectiveResponses("proton", [1.0])
+
+    stats = cache.getStats()
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 2
+
+
+def test_altitude_response_cache_quantizes_altitudes():
+    cache = AltitudeResponseCache(altitudeQuantizationInMeters=1.0)
+    responses = cache.getEffectiveResponses("alpha", [10.0001, 10.0004, 9.9996])
+
+    assert cache.getStats()["size"] == 1
+    np.testing.assert_array_equal(responses[0], responses[2])
+    np.testing.assert_allclose(responses[0], cache.getEffectiveResponses("alpha", [10.0])[0])
+
+
+def test_batch_both_is_fused_sum_of_species():
+    energy_bins = _maire_energy_bins_MeV_n()
+    flux_matrix = _spectrum_matrix()
+
+    total, breakdown = calculate_from_energy_spec_batch(
+        energy_bins, flux_matrix, BATCH_ALTITUDES_KM, particleName="both", returnSpeciesBreakdown=True
+    )
+
+    assert sorted(breakdown) == ["alpha", "proton"]
+    for particle_name in ("proton", "alpha"):
+        np.testing.assert_allclose(
+            breakdown[particle_name],
+            calculate_from_energy_spec_batch(energy_bins, flux_matrix, BATCH_ALTITUDES_KM, particleName=particle_name),
+            rtol=1e-14,
+        )
+    np.testing.assert_allclose(total, breakdown["proton"] + breakdown["alpha"], rtol=1e-14)
+    np.testing.assert_allclose(
+        calculate_from_energy_spec_batch(energy_bins, flux_matrix, BATCH_ALTITUDES_KM, particleName="both"),
+        total,
+        rtol=1e-12,
+    )
@@ -0,0 +1,76 @@
+"""Process-pool executor tests: catalog results must match the in-process calculators, in input order."""
+
+import functools
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from atmosphericRadiationDoseAndFlux.batchCalculator import calculate_from_energy_spec_batch
+from atmosphericRadiationDoseAndFlux.doseAndFluxCalculator import calculate_from_rigidity_spec
+from atmosphericRadiationDoseAndFlux.doseBatchExecutor import DoseBatchExecutor
+from atmosphericRadiationDoseAndFlux.particleResponse import fullListOfDoseResponseTypes
+from atmosphericRadiationDoseAndFlux.responseTableRegistry import getResponseTableStats
+from atmosphericRadiationDoseAndFlux.settings import defaultEnergyBins
+
+
+ALTITUDES_KM = [0.0, 5.0, 10.0, 11.5]
+
+
+def _rigidity_power_law(rigidity, spectral_index):
+    return 1e3 * rigidity ** -spectral_index
+
+
+def _spectrum_matrix(number_of_spectra):
+    midpoints = (defaultEnergyBins[1:] + defaultEnergyBins[:-1]) / 2
+    return midpoints ** -2.5 * np.random.default_rng(0).uniform(0.5, 2.0, (number_of_spectra, 50))
+
+
+def test_energy_catalog_matches_batch_calculator_in_order():
+    flux_matrix = _spectrum_matrix(23)
+    cutoffs = np.linspace(0.0, 10.0, len(flux_matrix))
+    progress = []
+
+    with DoseBatchExecutor(maxWorkers=2, chunkSize=4) as executor:
+        output = executor.calculate(list(flux_matrix), ALTITUDES_KM, particleName="both",
+                                    verticalCutOffRigidity=cutoffs,
+                                    progressCallback=lambda completed, total: progress.append((completed, total)))
+
+    expected = np.concatenate([calculate_from_energy_spec_batch(defaultEnergyBins, fluxes, ALTITUDES_KM,
+                                                                particleName="both", verticalCutOffRigidity=cutoff)
+                               for fluxes, cutoff in zip(flux_matrix, cutoffs)])
+    np.testing.assert_allclose(output, expected, rtol=1e-12)
+    assert [completed for completed, _ in progress] == sorted(completed for completed, _ in progress)
+    assert progress[-1] == (23, 23)
+
+
+def test_rigidity_function_catalog_matches_rigidity_path():
+    spectra = [functools.partial(_rigidity_power_law, spectral_index=index) for index in (2.0, 2.7, 3.4)]
+
+    with DoseBatchExecutor(maxWorkers=2) as executor:
+        output = executor.calculate(spectra, ALTITUDES_KM, particleName="alpha", spectrumType="rigidity",
+                                    verticalCutOffRigidity=2.0)
+
+    for spectrum, spectrum_output in zip(spectra, output):
+        expected = calculate_from_rigidity_spec(spectrum, ALTITUDES_KM, particleName="alpha",
+                                                verticalCutOffRigidity=2.0, output="array")
+        for response_index, response_type in enumerate(fullListOfDoseResponseTypes):
+            np.testing.assert_allclose(spectrum_output[:, response_index], expected[response_type], rtol=1e-12)
+
+
+def test_spawned_workers_use_shared_tables_without_parsing():
+    with DoseBatchExecutor(maxWorkers=1, particleNames=["proton"],
+                           mpContext=multiprocessing.get_context("spawn")) as executor:
+        output = executor.calculate(list(_spectrum_matrix(3)), ALTITUDES_KM)
+        worker_stats = executor._executor.submit(getResponseTableStats).result()
+
+    np.testing.assert_allclose(output, calculate_from_energy_spec_batch(defaultEnergyBins, _spectrum_matrix(3),
+                                                                        ALTITUDES_KM), rtol=1e-12)
+    assert worker_stats["tables"] == [("proton", "stackedResponseTensor")]
+    assert worker_stats["misses"] == 0
+
+
+def test_particles_must_be_shared():
+    with DoseBatchExecutor(maxWorkers=1, particleNames=["proton"]) as executor:
+        with pytest.raises(ValueError):
+            executor.calculate(list(_spectrum_matrix(2)), ALTITUDES_KM, particleName="alpha")
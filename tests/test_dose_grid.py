@@ -0,0 +1,99 @@
+"""Dose grid and cutoff table tests: every cell must match the single-spectrum path at its cutoff rigidity."""
+
+import numpy as np
+import pytest
+
+from atmosphericRadiationDoseAndFlux.doseAndFluxCalculator import (
+    calculate_from_energy_spec_array,
+    calculate_from_rigidity_spec,
+)
+from atmosphericRadiationDoseAndFlux.cutoffDoseTable import CutoffDoseTable
+from atmosphericRadiationDoseAndFlux.doseGrid import calculate_dose_grid, doseGridQuantities
+from atmosphericRadiationDoseAndFlux.particleResponse import fullListOfDoseResponseTypes
+from atmosphericRadiationDoseAndFlux.settings import defaultEnergyBins
+
+
+GRID_ALTITUDES_KM = [0.0, 9.5, 12.0]
+CUTOFF_GRID_GV = np.array([[0.0, 1.5, 3.0],
+                           [1.5, 7.25, 14.0]])
+
+
+def _energy_spectrum():
+    midpoints = (defaultEnergyBins[1:] + defaultEnergyBins[:-1]) / 2
+    return 1e4 * midpoints ** -2.7
+
+
+def _rigidity_spectrum(rigidity):
+    return 1e3 * rigidity ** -2.5
+
+
+@pytest.mark.parametrize("particle_name", ["proton", "both"])
+def test_energy_grid_matches_array_path(particle_name):
+    grid = calculate_dose_grid(CUTOFF_GRID_GV, GRID_ALTITUDES_KM, _energy_spectrum(), particleName=particle_name)
+
+    assert grid.values.shape == CUTOFF_GRID_GV.shape + (len(GRID_ALTITUDES_KM), len(doseGridQuantities))
+    for index in np.ndindex(CUTOFF_GRID_GV.shape):
+        expected = calculate_from_energy_spec_array(defaultEnergyBins, _energy_spectrum(), GRID_ALTITUDES_KM,
+                                                    particleName=particle_name,
+                                                    verticalCutOffRigidity=CUTOFF_GRID_GV[index], output="array")
+        for quantity in doseGridQuantities:
+            np.testing.assert_allclose(grid[quantity][index], expected[quantity], rtol=1e-12)
+
+
+def test_rigidity_grid_matches_rigidity_path():
+    grid = calculate_dose_grid(CUTOFF_GRID_GV, GRID_ALTITUDES_KM, _rigidity_spectrum,
+                               particleName="alpha", spectrumType="rigidity")
+
+    for index in np.ndindex(CUTOFF_GRID_GV.shape):
+        expected = calculate_from_rigidity_spec(_rigidity_spectrum, GRID_ALTITUDES_KM, particleName="alpha",
+                                                verticalCutOffRigidity=CUTOFF_GRID_GV[index], output="array")
+        for quantity in doseGridQuantities:
+            np.testing.assert_allclose(grid[quantity][index], expected[quantity], rtol=1e-12)
+
+
+def test_grid_dims_and_coords():
+    latitudes = np.array([10.0, 20.0])
+    grid = calculate_dose_grid(CUTOFF_GRID_GV, GRID_ALTITUDES_KM, _energy_spectrum(),
+                               gridCoords={"latitude": latitudes})
+
+    assert grid.dims == ("latitude", "longitude", "altitude", "quantity")
+    np.testing.assert_array_equal(grid.coords["latitude"], latitudes)
+    np.testing.assert_array_equal(grid.coords["longitude"], np.arange(3))
+    assert list(grid.coords["quantity"]) == doseGridQuantities
+
+    with pytest.raises(ValueError):
+        calculate_dose_grid(CUTOFF_GRID_GV, GRID_ALTITUDES_KM, _energy_spectrum(), gridDims=("cell",))
+
+
+def test_grid_to_xarray():
+    pytest.importorskip("xarray")
+    dataArray = calculate_dose_grid(CUTOFF_GRID_GV, GRID_ALTITUDES_KM, _energy_spectrum()).toXarray()
+    assert dataArray.sel(quantity="edose").shape == CUTOFF_GRID_GV.shape + (len(GRID_ALTITUDES_KM),)
+
+
+@pytest.mark.parametrize("particle_name", ["proton", "alpha", "both"])
+def test_cutoff_dose_table_matches_array_path(particle_name):
+    rng = np.random.default_rng(1)
+    cutoffs = np.concatenate([[0.0, -1.0], rng.uniform(0.0, 20.0, 10)])
+    altitudes = rng.uniform(0.0, 99.0, len(cutoffs))
+
+    table = CutoffDoseTable(_energy_spectrum(), particleName=particle_name)
+    doses = table.calculateDoses(cutoffs, altitudes)
+
+    assert doses.shape == (len(cutoffs), len(fullListOfDoseResponseTypes))
+    for cutoff, altitude, dose_row in zip(cutoffs, altitudes, doses):
+        expected = calculate_from_energy_spec_array(defaultEnergyBins, _energy_spectrum(), [altitude],
+                                                    particleName=particle_name,
+                                                    verticalCutOffRigidity=max(cutoff, 0.0), output="array")
+        np.testing.assert_allclose(dose_row, [expected[doseType][0] for doseType in fullListOfDoseResponseTypes],
+                                   rtol=1e-12)
+
+
+def test_cutoff_dose_table_broadcasts_and_matches_grid():
+    table = CutoffDoseTable(_rigidity_spectrum, particleName="both", spectrumType="rigidity")
+    grid = calculate_dose_grid(CUTOFF_GRID_GV, GRID_ALTITUDES_KM, _rigidity_spectrum,
+                               particleName="both", spectrumType="rigidity")
+
+    doses = table.calculateDoses(CUTOFF_GRID_GV[..., np.newaxis], GRID_ALTITUDES_KM)
+
+    np.testing.assert_allclose(doses, grid.values[..., :len(fullListOfDoseResponseTypes)], rtol=1e-12)
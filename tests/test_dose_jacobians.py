@@ -0,0 +1,66 @@
+"""Dose Jacobian tests: exact derivatives must match the calculators and finite differences."""
+
+import numpy as np
+import pytest
+
+from atmosphericRadiationDoseAndFlux.doseAndFluxCalculator import (
+    calculate_from_energy_spec_array,
+    calculate_from_rigidity_spec_array,
+)
+from atmosphericRadiationDoseAndFlux.doseJacobians import calculate_dose_jacobians
+from atmosphericRadiationDoseAndFlux.responseFileParameters import calculate_altitude_layer_slopes_array
+from atmosphericRadiationDoseAndFlux.responseKernels import get_response_kernels
+from atmosphericRadiationDoseAndFlux.settings import defaultEnergyBins
+
+
+RESPONSE_COLUMNS = ["edose", "adose", "dosee", "tn1", "tn2", "tn3"]
+
+# One altitude in every piece of the altitude layer table, at least 10 m from any layer boundary
+ALTITUDES_KM = [0.01, 0.5, 1.1, 3.0, 5.2, 10.0, 16.0, 20.3, 39.0, 50.0, 70.0, 99.0]
+
+ENERGY_MIDPOINTS = (defaultEnergyBins[1:] + defaultEnergyBins[:-1]) / 2
+
+
+def _stack_responses(output):
+    return np.stack([output[column] for column in RESPONSE_COLUMNS], axis=-1)
+
+
+@pytest.mark.parametrize("particle_name", ["proton", "both"])
+def test_doses_and_flux_jacobian_match_calculators(particle_name):
+    fluxes = 1e4 * ENERGY_MIDPOINTS ** -2.5
+
+    jacobians = calculate_dose_jacobians(defaultEnergyBins, fluxes, ALTITUDES_KM, particleName=particle_name,
+                                         verticalCutOffRigidity=2.0)
+
+    expected = calculate_from_energy_spec_array(defaultEnergyBins, fluxes, ALTITUDES_KM, particleName=particle_name,
+                                                verticalCutOffRigidity=2.0, output="array")
+    np.testing.assert_allclose(jacobians.doses, _stack_responses(expected), rtol=1e-12)
+    np.testing.assert_allclose(jacobians.fluxJacobian,
+                               get_response_kernels(ALTITUDES_KM, particle_name, verticalCutOffRigidity=2.0),
+                               rtol=1e-12)
+
+
+def test_altitude_jacobian_matches_finite_differences():
+    rigidity_bins = np.geomspace(0.5, 80.0, 41)
+    fluxes = 1e3 * ((rigidity_bins[1:] + rigidity_bins[:-1]) / 2) ** -np.array([[2.7], [4.0]])
+
+    jacobians = calculate_dose_jacobians(rigidity_bins, fluxes, ALTITUDES_KM, particleName="both",
+                                         inputGrid="rigidity")
+
+    assert jacobians.doses.shape == jacobians.altitudeJacobian.shape == (2, len(ALTITUDES_KM), 6)
+    step_km = 0.01
+    for index, spectrum in enumerate(fluxes):
+        above, below = (_stack_responses(calculate_from_rigidity_spec_array(
+            rigidity_bins, spectrum, np.array(ALTITUDES_KM) + offset, particleName="both", output="array"))
+            for offset in (step_km, -step_km))
+        np.testing.assert_allclose(jacobians.altitudeJacobian[index], (above - below) / (2 * step_km),
+                                   rtol=1e-8, atol=1e-12 * np.max(np.abs(jacobians.altitudeJacobian[index])))
+
+    assert np.all(jacobians.altitudeJacobian[:, [0, -1]] == 0.0)
+
+
+def test_altitude_layer_slopes():
+    np.testing.assert_array_equal(calculate_altitude_layer_slopes_array([0.01, 0.5, 1.1, 10.0, 16.0, 99.0]),
+                                  [0.0, -20.0, -1000.0 / 1025.0, -5.0, -1.0 / 1.4, 0.0])
+    with pytest.raises(Exception, match="100 km"):
+        calculate_altitude_layer_slopes_array([100.5])
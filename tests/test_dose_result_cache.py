@@ -0,0 +1,142 @@
+"""Result memoization tests: cached results must match uncached ones, with LRU eviction and disk persistence."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from atmosphericRadiationDoseAndFlux.doseAndFluxCalculator import (
+    calculate_from_energy_spec_array,
+    calculate_from_rigidity_spec_array,
+    doseRateOutputColumns,
+)
+from atmosphericRadiationDoseAndFlux import doseResultCache
+from atmosphericRadiationDoseAndFlux.doseResultCache import DoseResultCache
+from atmosphericRadiationDoseAndFlux.settings import defaultEnergyBins
+
+
+ALTITUDES_KM = [0.0, 5.0, 10.0, 11.5]
+MIDPOINTS = (defaultEnergyBins[1:] + defaultEnergyBins[:-1]) / 2
+
+
+def _assert_outputs_match(output, expected):
+    for column in doseRateOutputColumns:
+        np.testing.assert_allclose(output[column], expected[column], rtol=1e-12)
+
+
+def test_cached_results_match_uncached_results():
+    cache = DoseResultCache()
+    fluxes = MIDPOINTS ** -2.5
+    expected = calculate_from_energy_spec_array(defaultEnergyBins, fluxes, ALTITUDES_KM, particleName="both",
+                                                verticalCutOffRigidity=3.0)
+
+    first = calculate_from_energy_spec_array(defaultEnergyBins, fluxes, ALTITUDES_KM, particleName="both",
+                                             verticalCutOffRigidity=3.0, resultCache=cache)
+    # Equal inputs given as different objects share the entry
+    second = calculate_from_energy_spec_array(defaultEnergyBins.copy(), list(fluxes), np.array(ALTITUDES_KM),
+                                              particleName="both", verticalCutOffRigidity=3, output="array",
+                                              resultCache=cache)
+
+    assert isinstance(first, pd.DataFrame)
+    _assert_outputs_match(first, expected)
+    _assert_outputs_match(second, expected)
+    second["edose"][:] = 0.0
+    _assert_outputs_match(calculate_from_energy_spec_array(defaultEnergyBins, fluxes, ALTITUDES_KM,
+                                                           particleName="both", verticalCutOffRigidity=3.0,
+                                                           resultCache=cache), expected)
+
+    stats = cache.getStats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (2, 1, 1)
+
+    calculate_from_energy_spec_array(defaultEnergyBins, fluxes, ALTITUDES_KM, particleName="proton",
+                                     verticalCutOffRigidity=3.0, resultCache=cache)
+    assert cache.getStats()["misses"] == 2
+
+
+def test_rigidity_results_are_cached_unless_fluxes_are_a_function():
+    cache = DoseResultCache()
+    rigidity_bins = np.geomspace(0.5, 50.0, 51)
+    rigidity_fluxes = 1e3 * ((rigidity_bins[1:] + rigidity_bins[:-1]) / 2) ** -2.7
+
+    for _ in range(2):
+        output = calculate_from_rigidity_spec_array(rigidity_bins, rigidity_fluxes, ALTITUDES_KM, particleName="both",
+                                                    resultCache=cache)
+    _assert_outputs_match(output, calculate_from_rigidity_spec_array(rigidity_bins, rigidity_fluxes, ALTITUDES_KM,
+                                                                     particleName="both"))
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    calculate_from_rigidity_spec_array(rigidity_bins, lambda rigidity: rigidity ** -2.7, ALTITUDES_KM,
+                                       resultCache=cache)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_results_for_functions_are_not_reused_when_their_address_is():
+    cache = DoseResultCache()
+
+    for normalisation in [1.0, 1000.0]:
+        # Each lambda may be created at the address of the previous one
+        output = calculate_from_energy_spec_array(defaultEnergyBins, lambda energy: normalisation * energy ** -2.0,
+                                                  ALTITUDES_KM, resultCache=cache)
+        _assert_outputs_match(output, calculate_from_energy_spec_array(defaultEnergyBins,
+                                                                       normalisation * MIDPOINTS ** -2.0,
+                                                                       ALTITUDES_KM))
+    assert (cache.hits, cache.misses) == (0, 0)
+
+    with pytest.raises(ValueError):
+        DoseResultCache.calculateKey("calculate_from_energy_spec_array", lambda energy: energy ** -2.0)
+
+
+def test_keys_of_series_depend_on_their_values():
+    fluxes = pd.Series(MIDPOINTS ** -2.5)
+
+    assert DoseResultCache.calculateKey("name", fluxes) == DoseResultCache.calculateKey("name", MIDPOINTS ** -2.5)
+    assert DoseResultCache.calculateKey("name", fluxes) != DoseResultCache.calculateKey("name", 2 * fluxes)
+    with pytest.raises(TypeError):
+        DoseResultCache.calculateKey("name", {"fluxes": fluxes})
+
+
+def test_least_recently_used_results_are_evicted_by_size():
+    entry_size = calculate_from_energy_spec_array(defaultEnergyBins, MIDPOINTS ** -2.5, ALTITUDES_KM,
+                                                  output="array").nbytes
+    cache = DoseResultCache(maximumSizeInBytes=2 * entry_size)
+
+    for spectral_index in (2.0, 2.5, 2.0, 3.0):
+        calculate_from_energy_spec_array(defaultEnergyBins, MIDPOINTS ** -spectral_index, ALTITUDES_KM,
+                                         resultCache=cache)
+
+    stats = cache.getStats()
+    assert (stats["size"], stats["nbytes"], stats["evictions"], stats["hits"]) == (2, 2 * entry_size, 1, 1)
+
+    # 2.0 was used more recently than 2.5, so 2.5 was evicted
+    calculate_from_energy_spec_array(defaultEnergyBins, MIDPOINTS ** -2.0, ALTITUDES_KM, resultCache=cache)
+    assert cache.hits == 2
+
+
+def test_results_persisted_to_disk_warm_a_new_cache(tmp_path):
+    fluxes = MIDPOINTS ** -2.5
+    calculate_from_energy_spec_array(defaultEnergyBins, fluxes, ALTITUDES_KM,
+                                     resultCache=DoseResultCache(cacheDirectory=str(tmp_path)))
+
+    restarted_cache = DoseResultCache(cacheDirectory=str(tmp_path))
+    output = calculate_from_energy_spec_array(defaultEnergyBins, fluxes, ALTITUDES_KM, resultCache=restarted_cache)
+
+    _assert_outputs_match(output, calculate_from_energy_spec_array(defaultEnergyBins, fluxes, ALTITUDES_KM))
+    assert (restarted_cache.diskHits, restarted_cache.misses) == (1, 0)
+
+    restarted_cache.clear(removeFiles=True)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_results_persisted_by_another_version_are_not_reused(tmp_path, monkeypatch):
+    fluxes = MIDPOINTS ** -2.5
+    calculate_from_energy_spec_array(defaultEnergyBins, fluxes, ALTITUDES_KM,
+                                     resultCache=DoseResultCache(cacheDirectory=str(tmp_path)))
+
+    monkeypatch.setattr(doseResultCache, "resultFormatVersion", doseResultCache.resultFormatVersion + 1)
+    upgraded_cache = DoseResultCache(cacheDirectory=str(tmp_path))
+    calculate_from_energy_spec_array(defaultEnergyBins, fluxes, ALTITUDES_KM, resultCache=upgraded_cache)
+
+    assert (upgraded_cache.diskHits, upgraded_cache.misses) == (0, 1)
+    assert len(list(tmp_path.iterdir())) == 2
+
+    checksums = doseResultCache.getResponseTableChecksums()
+    assert len(checksums) == 8 and all(len(checksum) == 64 for _, _, checksum in checksums)
@@ -0,0 +1,107 @@
+"""Time series tests: streamed dose histories must match one synchronous calculation per timestamp."""
+
+import datetime
+import functools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from atmosphericRadiationDoseAndFlux.doseAndFluxCalculator import (
+    calculate_from_energy_spec_array,
+    calculate_from_rigidity_spec,
+    calculate_from_rigidity_spec_array,
+    doseRateOutputColumns,
+)
+from atmosphericRadiationDoseAndFlux.doseTimeSeries import DoseTimeSeries, iterate_dose_time_series
+from atmosphericRadiationDoseAndFlux.settings import defaultEnergyBins
+
+
+FLIGHT_LEVELS_KM = [9.5, 10.7, 11.9]
+
+
+def _rigidity_power_law(rigidity, scale, spectral_index):
+    return scale * rigidity ** -spectral_index
+
+
+def _event_spectra(count):
+    start = datetime.datetime(2026, 10, 18, 12, 0)
+    for minute in range(count):
+        yield (start + datetime.timedelta(minutes=minute),
+               functools.partial(_rigidity_power_law, scale=1e3 * (1 + minute), spectral_index=2.5 + 0.1 * minute))
+
+
+def _assert_rows_match(rows, expected):
+    for column in doseRateOutputColumns:
+        np.testing.assert_allclose(rows[column], expected[column], rtol=1e-12)
+
+
+@pytest.mark.parametrize("particle_name", ["proton", "both"])
+def test_rigidity_function_series_matches_per_timestamp_calculations(particle_name):
+    doseTimeSeries = DoseTimeSeries(FLIGHT_LEVELS_KM, particleName=particle_name, chunkSize=4)
+    chunks = list(doseTimeSeries.iterate(_event_spectra(10)))
+
+    assert [len(chunk) for chunk in chunks] == [12, 12, 6]
+    results = doseTimeSeries.toArray()
+    for index, (timestamp, spectrum) in enumerate(_event_spectra(10)):
+        rows = results[index * len(FLIGHT_LEVELS_KM):(index + 1) * len(FLIGHT_LEVELS_KM)]
+        assert np.all(rows["timestamp (s)"] == timestamp.replace(tzinfo=datetime.timezone.utc).timestamp())
+        _assert_rows_match(rows, calculate_from_rigidity_spec(spectrum, FLIGHT_LEVELS_KM, particleName=particle_name,
+                                                              output="array"))
+
+
+def test_array_spectra_match_array_calculators():
+    rigidity_bins = np.geomspace(0.5, 50.0, 51)
+    rigidity_midpoints = (rigidity_bins[1:] + rigidity_bins[:-1]) / 2
+    rigidity_series = [(float(second), 1e3 * rigidity_midpoints ** -(2.5 + 0.2 * second)) for second in range(5)]
+
+    chunks = iterate_dose_time_series(rigidity_series, FLIGHT_LEVELS_KM, particleName="both",
+                                      inputRigidityBins=rigidity_bins, verticalCutOffRigidity=2.0, chunkSize=2)
+    results = np.concatenate(list(chunks))
+    for index, (_, fluxes) in enumerate(rigidity_series):
+        _assert_rows_match(results[index * 3:(index + 1) * 3],
+                           calculate_from_rigidity_spec_array(rigidity_bins, fluxes, FLIGHT_LEVELS_KM,
+                                                              particleName="both", verticalCutOffRigidity=2.0,
+                                                              output="array"))
+
+    midpoints = (defaultEnergyBins[1:] + defaultEnergyBins[:-1]) / 2
+    energy_series = DoseTimeSeries(FLIGHT_LEVELS_KM, spectrumType="energy")
+    energy_series.append(0.0, midpoints ** -2.5)
+    assert energy_series.flush() is not None
+    _assert_rows_match(energy_series.toDataFrame(),
+                       calculate_from_energy_spec_array(defaultEnergyBins, midpoints ** -2.5, FLIGHT_LEVELS_KM))
+
+    with pytest.raises(ValueError):
+        DoseTimeSeries(FLIGHT_LEVELS_KM).append(0.0, rigidity_series[0][1])
+
+
+@pytest.mark.parametrize("spectrum_type, input_bins", [("energy", {}),
+                                                      ("rigidity", {"inputRigidityBins": np.geomspace(0.5, 50.0, 51)})])
+def test_spectrum_functions_are_evaluated_once_per_timestamp_for_both_species(spectrum_type, input_bins):
+    evaluated_midpoints = []
+
+    def spectrum(bin_midpoints):
+        evaluated_midpoints.append(bin_midpoints)
+        return bin_midpoints ** -2.5
+
+    doseTimeSeries = DoseTimeSeries(FLIGHT_LEVELS_KM, particleName="both", spectrumType=spectrum_type, **input_bins)
+    for second in range(3):
+        doseTimeSeries.append(float(second), spectrum)
+    doseTimeSeries.flush()
+
+    # One vectorized call per timestamp, shared by protons and alphas
+    assert len(evaluated_midpoints) == 3
+
+
+def test_chunks_are_written_to_disk(tmp_path):
+    output_path = tmp_path / "doseHistory.csv"
+    doseTimeSeries = DoseTimeSeries(FLIGHT_LEVELS_KM, chunkSize=3, outputPath=str(output_path), keepInMemory=False)
+
+    streamed = np.concatenate(list(doseTimeSeries.iterate(_event_spectra(7))))
+
+    written = pd.read_csv(output_path)
+    assert list(written.columns) == ["timestamp (s)"] + doseRateOutputColumns
+    assert len(written) == 7 * len(FLIGHT_LEVELS_KM)
+    for column in written.columns:
+        np.testing.assert_allclose(written[column], streamed[column], rtol=1e-9)
+    assert len(doseTimeSeries.toArray()) == 0
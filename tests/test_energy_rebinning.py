@@ -0,0 +1,74 @@
+"""Rebinning tests: spectra on other energy grids must map onto the MAIRE grid conserving integrated flux."""
+
+import numpy as np
+import pytest
+
+from atmosphericRadiationDoseAndFlux.batchCalculator import calculate_from_energy_spec_batch
+from atmosphericRadiationDoseAndFlux.doseAndFluxCalculator import calculate_from_energy_spec_array
+from atmosphericRadiationDoseAndFlux.energyRebinning import (
+    calculateRebinningMatrix,
+    clearRebinningMatrices,
+    getRebinningMatrixStats,
+    rebinEnergySpectraToMaireGrid,
+)
+from atmosphericRadiationDoseAndFlux.particleResponse import fullListOfDoseResponseTypes
+from atmosphericRadiationDoseAndFlux.settings import defaultEnergyBins
+
+
+ALTITUDES_KM = [0.0, 5.0, 10.0, 11.5]
+MIDPOINTS = (defaultEnergyBins[1:] + defaultEnergyBins[:-1]) / 2
+
+
+def test_maire_grid_is_passed_through_unchanged():
+    fluxes = MIDPOINTS ** -2.5
+    energy_bins, rebinned_fluxes = rebinEnergySpectraToMaireGrid(defaultEnergyBins * (1 + 1e-12), fluxes)
+    assert rebinned_fluxes is fluxes
+
+
+def test_subdivided_maire_grid_gives_the_same_doses():
+    # Every MAIRE bin split in three, with the MAIRE flux in each part
+    fine_bins = np.concatenate([np.linspace(lower, upper, 4)[:-1]
+                                for lower, upper in zip(defaultEnergyBins[:-1], defaultEnergyBins[1:])]
+                               + [defaultEnergyBins[-1:]])
+    fine_fluxes = np.repeat(MIDPOINTS ** -2.5, 3)
+
+    output = calculate_from_energy_spec_array(fine_bins, fine_fluxes, ALTITUDES_KM, particleName="both",
+                                              verticalCutOffRigidity=2.0, output="array")
+    expected = calculate_from_energy_spec_array(defaultEnergyBins, MIDPOINTS ** -2.5, ALTITUDES_KM,
+                                                particleName="both", verticalCutOffRigidity=2.0, output="array")
+    for response_type in fullListOfDoseResponseTypes:
+        np.testing.assert_allclose(output[response_type], expected[response_type], rtol=1e-12)
+
+
+def test_rebinning_conserves_integrated_flux_inside_the_maire_range():
+    instrument_bins = np.geomspace(5.0, 2e6, 23)
+    fluxes = np.random.default_rng(0).uniform(0.5, 2.0, (3, 22))
+
+    energy_bins, rebinned_fluxes = rebinEnergySpectraToMaireGrid(instrument_bins, fluxes)
+
+    # Integrate both spectra over the MAIRE range only
+    clipped_widths = np.clip(np.minimum(instrument_bins[1:], defaultEnergyBins[-1])
+                             - np.maximum(instrument_bins[:-1], defaultEnergyBins[0]), 0.0, None)
+    np.testing.assert_allclose(rebinned_fluxes @ np.diff(energy_bins), fluxes @ clipped_widths, rtol=1e-12)
+
+
+def test_batch_and_single_spectrum_paths_agree_and_share_cached_matrices():
+    clearRebinningMatrices()
+    instrument_bins = np.geomspace(8.0, 5e5, 31)
+    fluxes = ((instrument_bins[1:] + instrument_bins[:-1]) / 2) ** -2.7 * np.array([[1.0], [3.0]])
+
+    batch_output = calculate_from_energy_spec_batch(instrument_bins, fluxes, ALTITUDES_KM, particleName="both")
+    for spectrum_fluxes, spectrum_output in zip(fluxes, batch_output):
+        expected = calculate_from_energy_spec_array(instrument_bins, spectrum_fluxes, ALTITUDES_KM,
+                                                    particleName="both", output="array")
+        for response_index, response_type in enumerate(fullListOfDoseResponseTypes):
+            np.testing.assert_allclose(spectrum_output[:, response_index], expected[response_type], rtol=1e-12)
+
+    assert getRebinningMatrixStats()["size"] == 1
+
+
+def test_invalid_grids_are_rejected():
+    with pytest.raises(ValueError):
+        calculateRebinningMatrix([100.0, 10.0, 1000.0])
+    with pytest.raises(Exception):
+        rebinEnergySpectraToMaireGrid(np.geomspace(10.0, 1e5, 11), np.ones(9))
@@ -5,6 +5,8 @@ adose, edose, dosee, tn1, tn2, tn3, SEU, SEL.
 Energy inputs are MeV/n; rigidity inputs are total GV.
 """
 
+import functools
+
 from atmosphericRadiationDoseAndFlux.doseAndFluxCalculator import calculate_from_energy_spec_array
 import numpy as np
 import pytest
@@ -208,3 +210,83 @@ def test_energy_and_rigidity_paths_are_consistent(particle_name):
             rigidity_dose[column].to_numpy(dtype=float),
             rtol=5e-3,
         )
+
+
+OUTPUT_FORMAT_CASES = [
+    pytest.param(
+        lambda **kwargs: DAFcalc.calculate_from_energy_spec(_power_law_spectrum, KGO_ALTITUDES_KM, **kwargs),
+        id="energy_function",
+    ),
+    pytest.param(
+        lambda **kwargs: DAFcalc.calculate_from_rigidity_spec(_gle_like_rigidity_spectrum, KGO_ALTITUDES_KM, **kwargs),
+        id="rigidity_function",
+    ),
+    pytest.param(
+        lambda **kwargs: calculate_from_energy_spec_array(
+            _maire_energy_bins_MeV_n(), np.full(50, 1), KGO_ALTITUDES_KM, **kwargs
+        ),
+        id="energy_array",
+    ),
+]
+
+
+@pytest.mark.parametrize("run_calculation", OUTPUT_FORMAT_CASES)
+@pytest.mark.parametrize("particle_name", KGO_PARTICLE_NAMES)
+def test_array_output_matches_dataframe_output(run_calculation, particle_name):
+    """output='array' returns a structured array with the DataFrame's columns and values."""
+    output_df = run_calculation(particleName=particle_name)
+    output_array = run_calculation(particleName=particle_name, output="array")
+
+    assert isinstance(output_array, np.ndarray)
+    assert list(output_array.dtype.names) == list(output_df.columns) == DAFcalc.doseRateOutputColumns
+    for column in output_df.columns:
+        np.testing.assert_array_equal(output_array[column], output_df[column].to_numpy(dtype=float))
+
+
+def test_invalid_output_format_is_rejected():
+    with pytest.raises(ValueError, match="output must be one of"):
+        calculate_from_energy_spec_array(_maire_energy_bins_MeV_n(), np.ones(50), [10.0], output="list")
+
+
+class _CountingPowerLaw:
+    """Callable object recording how it is called."""
+
+    def __init__(self, index):
+        self.index = index
+        self.calls = 0
+
+    def __call__(self, x):
+        self.calls += 1
+        return x ** -self.index
+
+
+def test_array_capable_spectra_are_evaluated_in_one_call():
+    spectrum = _CountingPowerLaw(7)
+    output_df = DAFcalc.calculate_from_energy_spec(spectrum, KGO_ALTITUDES_KM, particleName="proton")
+
+    assert spectrum.calls == 1
+    assert_dose_rows_match_kgo(output_df, ENERGY_POWER_LAW_KGO["proton"])
+
+
+def test_scalar_only_spectra_fall_back_to_per_point_evaluation():
+    def scalar_only_power_law(x):
+        if x <= 0:
+            raise ValueError("rigidity must be positive")
+        return 27593.36 * (x ** -2.82844)
+
+    output_df = DAFcalc.calculate_from_rigidity_spec(scalar_only_power_law, KGO_ALTITUDES_KM, particleName="both")
+    assert_dose_rows_match_kgo(output_df, GLE_LIKE_RIGIDITY_KGO["both"])
+
+
+def test_partials_and_ufuncs_are_accepted_as_spectra():
+    energy_bins = _maire_energy_bins_MeV_n()
+    midpoints = (energy_bins[1:] + energy_bins[:-1]) / 2
+    expected = calculate_from_energy_spec_array(energy_bins, np.reciprocal(midpoints), KGO_ALTITUDES_KM)
+
+    from_ufunc = calculate_from_energy_spec_array(energy_bins, np.reciprocal, KGO_ALTITUDES_KM)
+    from_partial = DAFcalc.calculate_from_energy_spec(functools.partial(np.true_divide, 1.0), KGO_ALTITUDES_KM)
+
+    for output_df in (from_ufunc, from_partial):
+        np.testing.assert_allclose(
+            output_df[DOSE_COLUMNS].to_numpy(dtype=float), expected[DOSE_COLUMNS].to_numpy(dtype=float), rtol=1e-14
+        )
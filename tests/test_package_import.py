@@ -0,0 +1,42 @@
+"""Tests for lazy package initialization and the alpha particle notice."""
+
+import subprocess
+import sys
+import warnings
+
+import pytest
+
+import atmosphericRadiationDoseAndFlux as ARDAF
+from atmosphericRadiationDoseAndFlux import particle
+
+
+def test_import_defers_heavy_dependencies():
+    script = ("import sys, atmosphericRadiationDoseAndFlux; "
+              "print([name for name in ('numba', 'pandas', 'ParticleRigidityCalculationTools') if name in sys.modules])")
+    completedProcess = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+
+    assert completedProcess.stdout.strip() == "[]"
+    assert completedProcess.stderr == ""
+
+
+@pytest.mark.parametrize("name", ARDAF.__all__)
+def test_public_names_resolve_lazily(name):
+    assert getattr(ARDAF, name) is not None
+    assert name in dir(ARDAF)
+
+
+def test_unknown_attribute_raises_attribute_error():
+    with pytest.raises(AttributeError):
+        ARDAF.not_a_public_name
+
+
+def test_alpha_particle_warning_is_issued_once(monkeypatch):
+    monkeypatch.setattr(particle, "_alphaParticleWarningIssued", False)
+
+    with pytest.warns(ARDAF.AlphaParticleWarning):
+        ARDAF.Particle("alpha")
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        ARDAF.Particle("alpha")
+        ARDAF.Particle("proton")
@@ -0,0 +1,103 @@
+"""Parallel kernel tests: results must be bitwise identical to serial mode for any thread count."""
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from atmosphericRadiationDoseAndFlux import parallelExecution
+from atmosphericRadiationDoseAndFlux.batchCalculator import calculate_from_energy_spec_batch
+from atmosphericRadiationDoseAndFlux.particleResponse import getStackedResponseTensor
+from atmosphericRadiationDoseAndFlux.responseFileParameters import calculate_altitude_layer_params_array
+from atmosphericRadiationDoseAndFlux.settings import defaultEnergyBins
+
+
+ALTITUDES_KM = np.linspace(0.0, 99.0, 57)
+
+
+def _spectrum_matrix():
+    midpoints = (defaultEnergyBins[1:] + defaultEnergyBins[:-1]) / 2
+    return midpoints ** -2.5 * np.random.default_rng(0).uniform(0.5, 2.0, (11, 50))
+
+
+@pytest.fixture(autouse=True)
+def _reset_number_of_threads():
+    yield
+    parallelExecution.setNumberOfThreads(None)
+
+
+def test_parallel_kernels_match_serial_kernels_bitwise():
+    layer_indices, indices_above, f1_values = calculate_altitude_layer_params_array(ALTITUDES_KM)
+    tensor = getStackedResponseTensor("proton")
+    kernel_args = (tensor, layer_indices.astype(np.int64), indices_above.astype(np.int64), f1_values)
+
+    serial_kernels = parallelExecution.calculate_response_kernels_serial(*kernel_args)
+    parallel_kernels = parallelExecution.runParallelKernel(
+        parallelExecution.calculate_response_kernels_parallel, *kernel_args)
+    assert np.array_equal(serial_kernels, parallel_kernels)
+
+    fluxes = _spectrum_matrix()
+    assert np.array_equal(parallelExecution.calculate_doses_from_kernels_serial(fluxes, serial_kernels),
+                          parallelExecution.calculate_doses_from_kernels_parallel(fluxes, serial_kernels))
+
+
+@pytest.mark.parametrize("particle_name", ["proton", "both"])
+def test_parallel_batch_matches_deterministic_serial_batch_bitwise(particle_name):
+    flux_matrix = _spectrum_matrix()
+    serial_output = calculate_from_energy_spec_batch(defaultEnergyBins, flux_matrix, ALTITUDES_KM,
+                                                     particleName=particle_name, deterministic=True,
+                                                     returnSpeciesBreakdown=True)
+    parallel_output = calculate_from_energy_spec_batch(defaultEnergyBins, flux_matrix, ALTITUDES_KM,
+                                                       particleName=particle_name, parallel=True,
+                                                       returnSpeciesBreakdown=True)
+    assert np.array_equal(parallel_output[0], serial_output[0])
+    for species_name, species_output in serial_output[1].items():
+        assert np.array_equal(parallel_output[1][species_name], species_output)
+    assert np.array_equal(
+        calculate_from_energy_spec_batch(defaultEnergyBins, flux_matrix, ALTITUDES_KM, particleName=particle_name,
+                                         parallel=True),
+        calculate_from_energy_spec_batch(defaultEnergyBins, flux_matrix, ALTITUDES_KM, particleName=particle_name,
+                                         deterministic=True))
+
+    # The default BLAS path sums in a different order
+    blas_output = calculate_from_energy_spec_batch(defaultEnergyBins, flux_matrix, ALTITUDES_KM,
+                                                   particleName=particle_name)
+    np.testing.assert_allclose(parallel_output[0], blas_output, rtol=1e-12)
+
+
+def test_results_do_not_depend_on_thread_count():
+    script = (
+        "import numpy as np\n"
+        "from atmosphericRadiationDoseAndFlux import parallelExecution\n"
+        "from atmosphericRadiationDoseAndFlux.batchCalculator import calculate_from_energy_spec_batch\n"
+        "from atmosphericRadiationDoseAndFlux.settings import defaultEnergyBins\n"
+        "midpoints = (defaultEnergyBins[1:] + defaultEnergyBins[:-1]) / 2\n"
+        "fluxes = midpoints ** -2.5 * np.random.default_rng(0).uniform(0.5, 2.0, (7, 50))\n"
+        "outputs = []\n"
+        "for numberOfThreads in range(1, 5):\n"
+        "    parallelExecution.setNumberOfThreads(numberOfThreads)\n"
+        "    outputs.append(calculate_from_energy_spec_batch(defaultEnergyBins, fluxes, np.linspace(0, 60, 31),\n"
+        "                                                    particleName='both', parallel=True))\n"
+        "print(all(np.array_equal(outputs[0], output) for output in outputs))\n"
+    )
+    environment = dict(os.environ, NUMBA_NUM_THREADS="4")
+    completed_process = subprocess.run([sys.executable, "-c", script], env=environment,
+                                       capture_output=True, text=True, check=True)
+    assert completed_process.stdout.strip().splitlines()[-1] == "True"
+
+
+def test_number_of_threads_settings(monkeypatch):
+    maximum = parallelExecution.getMaximumNumberOfThreads()
+
+    monkeypatch.setenv(parallelExecution.numberOfThreadsEnvironmentVariable, str(maximum + 10))
+    assert parallelExecution.getNumberOfThreads() == maximum
+
+    parallelExecution.setNumberOfThreads(1)
+    assert parallelExecution.getNumberOfThreads() == 1
+
+    with pytest.raises(ValueError):
+        parallelExecution.setNumberOfThreads(maximum + 1)
+    with pytest.raises(ValueError):
+        parallelExecution.setNumberOfThreads(0)
@@ -0,0 +1,66 @@
+"""Response kernel tests: dot products with the kernels must reproduce the array calculators."""
+
+import numpy as np
+import pytest
+
+from atmosphericRadiationDoseAndFlux.doseAndFluxCalculator import (
+    calculate_from_energy_spec_array,
+    calculate_from_rigidity_spec,
+    calculate_from_rigidity_spec_array,
+)
+from atmosphericRadiationDoseAndFlux.responseKernels import get_response_kernels
+from atmosphericRadiationDoseAndFlux.rigidityConversionPlan import getRigidityConversionPlan
+from atmosphericRadiationDoseAndFlux.settings import defaultEnergyBins
+
+
+ALTITUDES_KM = [0.0, 9.5, 11.3, 18.0]
+RESPONSE_COLUMNS = ["edose", "adose", "dosee", "tn1", "tn2", "tn3"]
+
+
+def _stack_responses(output):
+    return np.stack([output[column] for column in RESPONSE_COLUMNS], axis=-1)
+
+
+@pytest.mark.parametrize("particle_name", ["proton", "alpha", "both"])
+@pytest.mark.parametrize("cutoff", [0.0, 3.0])
+def test_energy_kernels_reproduce_array_calculator(particle_name, cutoff):
+    for energy_bins in (defaultEnergyBins, np.geomspace(20.0, 5e5, 31)):
+        fluxes = 1e4 * ((energy_bins[1:] + energy_bins[:-1]) / 2) ** -2.5
+        kernels = get_response_kernels(ALTITUDES_KM, particle_name, inputBins=energy_bins,
+                                       verticalCutOffRigidity=cutoff)
+
+        assert kernels.shape == (len(ALTITUDES_KM), 6, len(fluxes))
+        expected = calculate_from_energy_spec_array(energy_bins, fluxes, ALTITUDES_KM, particleName=particle_name,
+                                                    verticalCutOffRigidity=cutoff, output="array")
+        np.testing.assert_allclose(kernels @ fluxes, _stack_responses(expected), rtol=1e-12)
+
+
+@pytest.mark.parametrize("particle_name", ["proton", "both"])
+def test_rigidity_kernels_reproduce_array_calculator(particle_name):
+    rigidity_bins = np.geomspace(0.5, 80.0, 41)
+    fluxes = 1e3 * ((rigidity_bins[1:] + rigidity_bins[:-1]) / 2) ** -2.7
+
+    kernels = get_response_kernels(ALTITUDES_KM, particle_name, inputGrid="rigidity", inputBins=rigidity_bins,
+                                   verticalCutOffRigidity=1.5)
+
+    expected = calculate_from_rigidity_spec_array(rigidity_bins, fluxes, ALTITUDES_KM, particleName=particle_name,
+                                                  verticalCutOffRigidity=1.5, output="array")
+    np.testing.assert_allclose(kernels @ fluxes, _stack_responses(expected), rtol=1e-12)
+
+
+def test_default_rigidity_kernels_match_function_calculator():
+    def spectrum(rigidity):
+        return 27593.36 * rigidity ** -2.82844
+
+    kernels = get_response_kernels(ALTITUDES_KM, "alpha", inputGrid="rigidity")
+
+    fluxes = spectrum(getRigidityConversionPlan("alpha").rigidityMidPoints)
+    expected = calculate_from_rigidity_spec(spectrum, ALTITUDES_KM, particleName="alpha", output="array")
+    np.testing.assert_allclose(kernels @ fluxes, _stack_responses(expected), rtol=1e-12)
+
+
+def test_invalid_kernel_requests_are_rejected():
+    with pytest.raises(ValueError):
+        get_response_kernels(ALTITUDES_KM, inputGrid="momentum")
+    with pytest.raises(ValueError):
+        get_response_kernels(ALTITUDES_KM, "both", inputGrid="rigidity")
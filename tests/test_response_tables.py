@@ -0,0 +1,155 @@
+"""Tests for the shared response table registry and binary table cache."""
+
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from atmosphericRadiationDoseAndFlux import particleResponse, warmup
+from atmosphericRadiationDoseAndFlux.binaryResponseTables import (
+    getBinaryTablePaths,
+    loadBinaryTable,
+    loadOrBuildStackedResponseTensor,
+    loadOrConvertResponseTable,
+    loadStackedResponseTensor,
+)
+from atmosphericRadiationDoseAndFlux.particle import Particle
+from atmosphericRadiationDoseAndFlux.responseTableRegistry import (
+    ResponseTableRegistry,
+    getPathToResponseFile,
+    responseTableRegistry,
+)
+
+
+def test_registry_parses_each_file_once():
+    registry = ResponseTableRegistry()
+    first = registry.getResponseTable("proton", "neutron.rpf")
+    second = registry.getResponseTable("proton", "neutron.rpf")
+
+    assert first is second
+    stats = registry.getStats()
+    assert stats["misses"] == 1
+    assert stats["hits"] == 1
+    assert stats["tables"] == [("proton", "neutron.rpf")]
+
+
+def test_registry_tables_match_genfromtxt_and_are_read_only():
+    registry = ResponseTableRegistry()
+    table = registry.getResponseTable("alpha", "edose.rpf")
+
+    np.testing.assert_array_equal(table, np.genfromtxt(getPathToResponseFile("alpha", "edose.rpf")))
+    with pytest.raises(ValueError):
+        table[0, 0] = 1.0
+
+
+def test_registry_is_thread_safe():
+    registry = ResponseTableRegistry()
+    results = []
+
+    def load():
+        results.append(registry.getResponseTable("proton", "adose.rpf"))
+
+    threads = [threading.Thread(target=load) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(result is results[0] for result in results)
+    assert registry.getStats()["misses"] == 1
+
+
+def test_preload_and_clear():
+    registry = ResponseTableRegistry()
+    registry.preload(["proton"])
+    assert len(registry.getStats()["tables"]) == 4
+
+    registry.clear()
+    assert registry.getStats() == {"tables": [], "hits": 0, "misses": 0, "nbytes": 0, "loadTimeInSeconds": 0.0}
+
+
+def test_warmup_preloads_tables():
+    timings = warmup(["proton"])
+    assert set(timings) == {"kernelCompilation", "responseTableLoading", "firstCalculation"}
+
+    loadedTables = responseTableRegistry.getStats()["tables"]
+    assert ("proton", "stackedResponseTensor") in loadedTables
+    assert ("proton", "neutron.rpf") in loadedTables
+
+
+@pytest.mark.parametrize("dose_type", particleResponse.fullListOfDoseResponseTypes)
+def test_particle_responses_share_registry_tables(dose_type):
+    particle = Particle("proton")
+    first = particleResponse.fullDoseResponseDict[dose_type](particle, dose_type)
+    second = particleResponse.fullDoseResponseDict[dose_type](particle, dose_type)
+
+    assert first.particleResponseArray is second.particleResponseArray
+    assert first.particleResponseArray is responseTableRegistry.getResponseTable("proton", first.getResponseFileName())
+
+
+def test_binary_table_is_built_once_and_memory_mapped(tmp_path):
+    source = getPathToResponseFile("proton", "neutron.rpf")
+    first = loadOrConvertResponseTable("proton", "neutron.rpf", source, str(tmp_path))
+    paths = getBinaryTablePaths("proton", "neutron.rpf", str(tmp_path))
+    modified = os.path.getmtime(paths["array"])
+
+    second = loadOrConvertResponseTable("proton", "neutron.rpf", source, str(tmp_path))
+
+    assert isinstance(second, np.memmap)
+    assert not second.flags.writeable
+    assert os.path.getmtime(paths["array"]) == modified
+    np.testing.assert_array_equal(first, np.genfromtxt(source))
+    np.testing.assert_array_equal(second, np.genfromtxt(source))
+
+
+def test_stale_binary_table_is_rebuilt(tmp_path):
+    source = tmp_path / "edose.rpf"
+    source.write_text("0.100E+01 0.200E+01\n0.300E+01 0.400E+01\n")
+    loadOrConvertResponseTable("proton", "edose.rpf", str(source), str(tmp_path))
+
+    source.write_text("0.500E+01 0.600E+01\n0.700E+01 0.800E+01\n")
+    assert loadBinaryTable("proton", "edose.rpf", str(source), str(tmp_path)) is None
+
+    rebuilt = loadOrConvertResponseTable("proton", "edose.rpf", str(source), str(tmp_path))
+    np.testing.assert_array_equal(rebuilt, [[5.0, 6.0], [7.0, 8.0]])
+
+
+def test_registry_uses_binary_cache_directory(tmp_path, monkeypatch):
+    monkeypatch.setenv("ATMOSPHERIC_RADIATION_CACHE_DIR", str(tmp_path))
+    registry = ResponseTableRegistry()
+    table = registry.getResponseTable("alpha", "dosee.rpf")
+
+    assert (tmp_path / "alpha_dosee.npy").exists()
+    assert (tmp_path / "alpha_dosee.json").exists()
+    np.testing.assert_array_equal(table, np.genfromtxt(getPathToResponseFile("alpha", "dosee.rpf")))
+
+
+def test_stacked_response_tensor_is_memory_mapped_without_loading_tables(tmp_path, monkeypatch):
+    monkeypatch.setenv("ATMOSPHERIC_RADIATION_CACHE_DIR", str(tmp_path))
+    responseTableRegistry.clear()
+    try:
+        built = particleResponse.getStackedResponseTensor("proton")
+        responseTableRegistry.clear()
+        tensor = particleResponse.getStackedResponseTensor("proton")
+
+        assert isinstance(tensor.base, np.memmap)
+        assert not tensor.flags.writeable
+        assert responseTableRegistry.getStats()["tables"] == [("proton", "stackedResponseTensor")]
+    finally:
+        responseTableRegistry.clear()
+
+    np.testing.assert_array_equal(tensor, built)
+    np.testing.assert_array_equal(tensor[0], np.genfromtxt(getPathToResponseFile("proton", "edose.rpf"))[:, :50])
+
+
+def test_stale_stacked_response_tensor_is_rebuilt(tmp_path):
+    source = tmp_path / "edose.rpf"
+    source.write_text("0.100E+01 0.200E+01\n")
+    loadOrBuildStackedResponseTensor("proton", [str(source)], lambda: np.ones((1, 1, 2)), str(tmp_path))
+
+    source.write_text("0.500E+01 0.600E+01\n")
+    assert loadStackedResponseTensor("proton", [str(source)], str(tmp_path)) is None
+
+    rebuilt = loadOrBuildStackedResponseTensor("proton", [str(source)], lambda: np.zeros((1, 1, 2)), str(tmp_path))
+    np.testing.assert_array_equal(rebuilt, np.zeros((1, 1, 2)))
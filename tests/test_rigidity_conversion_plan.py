@@ -0,0 +1,52 @@
+"""Rigidity conversion plan tests: cached conversions must match ParticleRigidityCalculationTools."""
+
+import numpy as np
+import ParticleRigidityCalculationTools as PRCT
+import pytest
+
+from atmosphericRadiationDoseAndFlux.doseAndFluxCalculator import calculate_from_rigidity_spec
+from atmosphericRadiationDoseAndFlux.particle import Particle
+from atmosphericRadiationDoseAndFlux.rigidityConversionPlan import (
+    clearRigidityConversionPlans,
+    getRigidityConversionPlan,
+    getRigidityConversionPlanStats,
+)
+from atmosphericRadiationDoseAndFlux.settings import defaultEnergyBins
+
+
+@pytest.mark.parametrize("particle_name", ["proton", "alpha"])
+def test_plan_matches_direct_conversion(particle_name):
+    particle = Particle(particle_name)
+    rigidity_bins = np.geomspace(0.3, 80.0, 37)
+    rigidity_midpoints = (rigidity_bins[1:] + rigidity_bins[:-1]) / 2
+    fluxes = 1e3 * rigidity_midpoints ** -2.7
+
+    plan = getRigidityConversionPlan(particle, rigidity_bins)
+
+    expected = PRCT.convertTotalRigiditySpecToPerNucleonEnergySpec(rigidity_midpoints, fluxes,
+                                                                   particleMassAU=particle.atomicMass,
+                                                                   particleChargeAU=particle.atomicCharge)
+    np.testing.assert_allclose(plan.convertFluxes(fluxes), expected["Energy distribution values"], rtol=1e-12)
+    np.testing.assert_allclose(plan.energyBins, PRCT.convertTotalRigidityToPerNucleonEnergy(
+        rigidity_bins, particleMassAU=particle.atomicMass, particleChargeAU=particle.atomicCharge), rtol=1e-12)
+
+
+def test_default_plan_uses_the_maire_energy_grid():
+    plan = getRigidityConversionPlan("alpha")
+    np.testing.assert_allclose(plan.energyBins, defaultEnergyBins, rtol=1e-12)
+    assert not plan.jacobian.flags.writeable
+
+
+def test_repeated_calculations_reuse_the_cached_plan(monkeypatch):
+    clearRigidityConversionPlans()
+    expected = calculate_from_rigidity_spec(lambda rigidity: rigidity ** -2.7, [10.0], particleName="both")
+    assert getRigidityConversionPlanStats()["size"] == 2
+
+    def fail(*args, **kwargs):
+        raise AssertionError("conversion plan was not reused")
+
+    monkeypatch.setattr(PRCT, "convertTotalRigiditySpecToPerNucleonEnergySpec", fail)
+    monkeypatch.setattr(PRCT, "convertTotalRigidityToPerNucleonEnergy", fail)
+    output = calculate_from_rigidity_spec(lambda rigidity: rigidity ** -2.7, [10.0], particleName="both")
+
+    np.testing.assert_allclose(output["edose"], expected["edose"], rtol=1e-15)
@@ -0,0 +1,89 @@
+"""Route dose tests: integrated doses must match per-waypoint dose rates from the array path."""
+
+import datetime
+
+import numpy as np
+import pytest
+
+from atmosphericRadiationDoseAndFlux.doseAndFluxCalculator import calculate_from_energy_spec_array
+from atmosphericRadiationDoseAndFlux.routeDose import (
+    RouteWaypoint,
+    calculate_route_dose,
+    iterate_route_dose,
+    routeDoseOutputColumns,
+)
+from atmosphericRadiationDoseAndFlux.settings import defaultEnergyBins
+
+
+def _spectrum(scale=1.0):
+    midpoints = (defaultEnergyBins[1:] + defaultEnergyBins[:-1]) / 2
+    return scale * 1e4 * midpoints ** -2.7
+
+
+def _waypoints(count):
+    for index in range(count):
+        yield (60.0 * index, 50.0, -index * 0.5, 1.0 + 0.45 * index, 0.4 * index)
+
+
+def _reference_route_dose(waypoints, spectrum_provider, particle_name):
+    rates = []
+    for waypoint in waypoints:
+        output = calculate_from_energy_spec_array(defaultEnergyBins, spectrum_provider(waypoint),
+                                                  [waypoint[3]], particleName=particle_name,
+                                                  verticalCutOffRigidity=waypoint[4], output="array")
+        rates.append([output[column][0] for column in routeDoseOutputColumns])
+    rates = np.array(rates)
+    times = np.array([waypoint[0] for waypoint in waypoints])
+    integrated = np.sum((rates[1:] + rates[:-1]) / 2 * np.diff(times)[:, np.newaxis], axis=0)
+    return dict(zip(routeDoseOutputColumns, integrated / np.array([3600.0] * 3 + [1.0] * 3)))
+
+
+@pytest.mark.parametrize("particle_name", ["proton", "alpha", "both"])
+def test_route_dose_matches_array_path(particle_name):
+    waypoints = list(_waypoints(23))
+    spectrum_provider = lambda waypoint: _spectrum(1.0 + waypoint[0] / 3600.0)
+
+    total = calculate_route_dose(iter(waypoints), spectrum_provider, particleName=particle_name, chunkSize=5)
+    expected = _reference_route_dose(waypoints, spectrum_provider, particle_name)
+
+    for column in routeDoseOutputColumns:
+        assert total[column] == pytest.approx(expected[column], rel=1e-12)
+
+
+def test_chunk_size_does_not_change_totals():
+    totals = [calculate_route_dose(_waypoints(40), _spectrum(), chunkSize=chunk_size) for chunk_size in (1, 7, 40, 1000)]
+    for total in totals[1:]:
+        for column in routeDoseOutputColumns:
+            assert total[column] == pytest.approx(totals[0][column], rel=1e-12)
+
+
+def test_cumulative_doses_stream_per_chunk():
+    chunks = []
+    total = calculate_route_dose(_waypoints(10), _spectrum(), chunkSize=4, progressCallback=chunks.append)
+
+    assert [len(chunk.timestampsInSeconds) for chunk in chunks] == [4, 4, 2]
+    assert chunks[0].cumulativeDoses["edose"][0] == 0.0
+    cumulative_edose = np.concatenate([chunk.cumulativeDoses["edose"] for chunk in chunks])
+    assert np.all(np.diff(cumulative_edose) > 0)
+    assert cumulative_edose[-1] == total["edose"]
+
+
+def test_waypoint_formats_and_datetimes():
+    start = datetime.datetime(2024, 5, 1, 12, 0)
+    waypoints = [
+        RouteWaypoint(start, 0.0, 0.0, 10.0, 1.0),
+        {"timestamp": np.datetime64("2024-05-01T12:30"), "latitude": 0.0, "longitude": 0.0,
+         "altitudeInkm": 10.0, "verticalCutOffRigidity": 1.0},
+        (start + datetime.timedelta(hours=1), 0.0, 0.0, 10.0, 1.0),
+    ]
+
+    chunk = next(iterate_route_dose(waypoints, _spectrum()))
+
+    np.testing.assert_allclose(np.diff(chunk.timestampsInSeconds), [1800.0, 1800.0])
+    # Constant rate for an hour gives a dose equal to the rate in µSv/hr
+    assert chunk.cumulativeDoses["edose"][-1] == pytest.approx(chunk.doseRates["edose"][0], rel=1e-12)
+
+
+def test_out_of_order_timestamps_raise():
+    with pytest.raises(ValueError):
+        calculate_route_dose([(10.0, 0, 0, 10.0, 0.0), (5.0, 0, 0, 10.0, 0.0)], _spectrum())
@@ -0,0 +1,119 @@
+"""Spectrum family tests: analytic bin integrals and the vectorized calculator must match direct calculations."""
+
+import numpy as np
+import pytest
+
+from atmosphericRadiationDoseAndFlux.doseAndFluxCalculator import (
+    calculate_from_energy_spec_array,
+    calculate_from_rigidity_spec,
+)
+from atmosphericRadiationDoseAndFlux.particle import Particle
+from atmosphericRadiationDoseAndFlux.rigidityConversionPlan import getRigidityConversionPlan
+from atmosphericRadiationDoseAndFlux.settings import defaultEnergyBins
+from atmosphericRadiationDoseAndFlux.spectrumFamilies import (
+    PowerLawSpectrum,
+    SpectrumFamily,
+    calculate_from_spectrum_family,
+    calculateBinIntegratedFluxes,
+    spectrumFamilies,
+)
+
+
+ALTITUDES_KM = [0.0, 10.0, 12.0]
+RESPONSE_COLUMNS = ["edose", "adose", "dosee", "tn1", "tn2", "tn3"]
+
+FAMILY_PARAMETERS = {
+    "powerLaw": {"normalisation": [1e3, 2e3, 5e2], "spectralIndex": [2.7, 1.0, 1.0 + 1e-9]},
+    "brokenPowerLaw": {"normalisation": 1e3, "spectralIndex1": 2.0, "spectralIndex2": [3.0, 4.0, 3.5],
+                       "breakPoint": [1.5, 5.0, 40.0]},
+    "exponentialInRigidity": {"normalisation": 1e4, "characteristicRigidity": [0.3, 1.0, 3.0]},
+    "bandFunction": {"normalisation": 1e4, "spectralIndex1": [0.5, 1.0, 1.5], "spectralIndex2": [3.0, 4.0, 5.0],
+                     "characteristicRigidity": [0.3, 1.0, 2.0]},
+    "forceFieldGCR": {"modulationPotential": [0.0, 400.0, 1200.0]},
+}
+
+
+def _integrate_on_fine_grid(spectrum_family, parameters, bin_edges, particle, subdivisions=400):
+    # Composite quadrature on sub-bins, which resolves breaks and steep exponentials inside MAIRE bins
+    fine_edges = np.concatenate([np.geomspace(lower, upper, subdivisions + 1)[:-1]
+                                 for lower, upper in zip(bin_edges[:-1], bin_edges[1:])] + [bin_edges[-1:]])
+    fine_integrals = spectrum_family.integrate(fine_edges[:-1], fine_edges[1:],
+                                               spectrum_family.formatParameters(parameters), particle, analytic=False)
+    return np.add.reduceat(fine_integrals, np.arange(0, len(fine_edges) - 1, subdivisions), axis=1)
+
+
+@pytest.mark.parametrize("family_name", sorted(FAMILY_PARAMETERS))
+@pytest.mark.parametrize("particle_name", ["proton", "alpha"])
+def test_bin_integrals_match_fine_quadrature(family_name, particle_name):
+    spectrum_family = spectrumFamilies[family_name]
+    parameters = FAMILY_PARAMETERS[family_name]
+    bin_edges = (getRigidityConversionPlan(particle_name).rigidityBins if spectrum_family.variable == "rigidity"
+                 else defaultEnergyBins)
+
+    integrals = calculateBinIntegratedFluxes(family_name, parameters, particle_name)
+
+    assert integrals.shape == (3, 50)
+    expected = _integrate_on_fine_grid(spectrum_family, parameters, bin_edges, Particle(particle_name))
+    np.testing.assert_allclose(integrals, expected, rtol=1e-8, atol=1e-300)
+
+
+@pytest.mark.parametrize("particle_name", ["proton", "both"])
+def test_energy_power_law_matches_array_calculator_with_bin_averaged_fluxes(particle_name):
+    spectrum_family = PowerLawSpectrum("energy")
+    parameters = {"normalisation": [1e4, 3e4], "spectralIndex": [2.5, 3.1]}
+    cutoffs = [0.0, 2.0]
+
+    doses = calculate_from_spectrum_family(spectrum_family, parameters, ALTITUDES_KM, particleName=particle_name,
+                                           verticalCutOffRigidity=cutoffs)
+
+    bin_averaged_fluxes = (calculateBinIntegratedFluxes(spectrum_family, parameters, "proton")
+                           / np.diff(defaultEnergyBins))
+    for index, cutoff in enumerate(cutoffs):
+        expected = calculate_from_energy_spec_array(defaultEnergyBins, bin_averaged_fluxes[index], ALTITUDES_KM,
+                                                    particleName=particle_name, verticalCutOffRigidity=cutoff,
+                                                    output="array")
+        np.testing.assert_allclose(doses[index], np.stack([expected[column] for column in RESPONSE_COLUMNS], axis=-1),
+                                   rtol=1e-12)
+
+
+def test_parameter_sets_are_independent_and_close_to_midpoint_sampling():
+    parameters = {"normalisation": [27593.36, 1e3], "spectralIndex": [2.82844, 2.5]}
+    doses, species_doses = calculate_from_spectrum_family("powerLaw", parameters, ALTITUDES_KM,
+                                                          particleName="both", returnSpeciesBreakdown=True)
+
+    assert doses.shape == (2, len(ALTITUDES_KM), 6)
+    np.testing.assert_allclose(doses, species_doses["proton"] + species_doses["alpha"], rtol=1e-12)
+    for index in range(2):
+        single = calculate_from_spectrum_family("powerLaw", {name: values[index] for name, values in parameters.items()},
+                                                ALTITUDES_KM, particleName="both")
+        np.testing.assert_allclose(doses[index], single[0], rtol=1e-12)
+
+    # Exact bin integrals differ from midpoint sampling of the same function only by its discretisation error
+    sampled = calculate_from_rigidity_spec(lambda rigidity: 27593.36 * rigidity ** -2.82844, ALTITUDES_KM,
+                                           particleName="both", output="array")
+    np.testing.assert_allclose(doses[0], np.stack([sampled[column] for column in RESPONSE_COLUMNS], axis=-1),
+                               rtol=0.05)
+
+
+def test_invalid_parameters_are_rejected():
+    with pytest.raises(ValueError):
+        calculateBinIntegratedFluxes("powerLaw", {"normalisation": 1.0}, "proton")
+    with pytest.raises(ValueError):
+        calculateBinIntegratedFluxes("powerLaw", {"normalisation": 1.0, "spectralIndex": 2.0, "scale": 1.0}, "proton")
+    with pytest.raises(ValueError):
+        calculateBinIntegratedFluxes("powerLaw", {"normalisation": np.ones((2, 2)), "spectralIndex": 2.0}, "proton")
+    with pytest.raises(ValueError):
+        calculateBinIntegratedFluxes("bandFunction", {"normalisation": 1.0, "spectralIndex1": 3.0,
+                                                      "spectralIndex2": 2.0, "characteristicRigidity": 1.0}, "proton")
+    with pytest.raises(ValueError):
+        calculateBinIntegratedFluxes("kappaDistribution", {}, "proton")
+
+
+def test_families_without_evaluate_cannot_be_constructed():
+    class IncompleteSpectrum(SpectrumFamily):
+        parameterNames = ("normalisation",)
+
+    with pytest.raises(TypeError):
+        SpectrumFamily()
+    with pytest.raises(TypeError):
+        IncompleteSpectrum()
@@ -0,0 +1,82 @@
+"""Spectrum fitting tests: fits must recover the power laws that generated the dose rates."""
+
+import numpy as np
+import pytest
+
+from atmosphericRadiationDoseAndFlux.spectrumFamilies import calculate_from_spectrum_family
+from atmosphericRadiationDoseAndFlux.spectrumFitting import PowerLawDoseModel, fit_power_law_spectrum
+
+
+ALTITUDES_KM = [0.0, 5.0, 9.5, 11.0, 12.5]
+
+
+def _power_law_doses(normalisation, spectral_index, particle_name, cutoff=0.0):
+    return calculate_from_spectrum_family("powerLaw", {"normalisation": normalisation, "spectralIndex": spectral_index},
+                                          ALTITUDES_KM, particleName=particle_name, verticalCutOffRigidity=cutoff)[0]
+
+
+def test_fit_recovers_proton_power_law_with_missing_measurements():
+    measured = _power_law_doses(27593.36, 2.82844, "proton", cutoff=1.0)[:, [1, 3]]
+    measured[2, 0] = np.nan
+
+    result = fit_power_law_spectrum(measured, ALTITUDES_KM, ["adose", "tn1"], verticalCutOffRigidity=1.0)
+
+    assert result.converged
+    assert result.parameterNames == ["protonNormalisation", "protonSpectralIndex"]
+    assert result.degreesOfFreedom == 7
+    np.testing.assert_allclose(result.parameters["protonNormalisation"], 27593.36, rtol=1e-8)
+    np.testing.assert_allclose(result.parameters["protonSpectralIndex"], 2.82844, rtol=1e-8)
+    np.testing.assert_allclose(result.predictedDoses[np.isfinite(measured)], measured[np.isfinite(measured)],
+                               rtol=1e-8)
+
+
+@pytest.mark.parametrize("tie_spectral_indices", [True, False])
+def test_joint_proton_alpha_fit_recovers_parameters_and_covariance(tie_spectral_indices):
+    measured = (_power_law_doses(1e4, 3.2, "proton") + _power_law_doses(1e3, 3.2, "alpha"))[:, [0, 1, 3, 5]]
+
+    result = fit_power_law_spectrum(measured, ALTITUDES_KM, ["edose", "adose", "tn1", "tn3"], particleName="both",
+                                    measurementUncertainties=0.02 * measured,
+                                    tieSpectralIndices=tie_spectral_indices)
+
+    expected = {"protonNormalisation": 1e4, "protonSpectralIndex": 3.2,
+                "alphaNormalisation": 1e3, "alphaSpectralIndex": 3.2}
+    for name, value in expected.items():
+        np.testing.assert_allclose(result.parameters[name], value, rtol=1e-6)
+    assert len(result.parameterNames) == (3 if tie_spectral_indices else 4)
+    assert result.covariance.shape == (len(result.parameterNames),) * 2
+    np.testing.assert_allclose(result.covariance, result.covariance.T)
+    assert np.all(np.diag(result.covariance) > 0)
+
+
+def test_fixed_alpha_ratio_leaves_two_free_parameters():
+    measured = (_power_law_doses(1e4, 3.0, "proton") + _power_law_doses(500.0, 3.0, "alpha"))[:, [1]]
+
+    result = fit_power_law_spectrum(measured, ALTITUDES_KM, "adose", particleName="both", alphaToProtonRatio=0.05)
+
+    assert result.parameterNames == ["protonNormalisation", "protonSpectralIndex"]
+    np.testing.assert_allclose(result.parameters["alphaNormalisation"], 500.0, rtol=1e-6)
+
+
+def test_analytic_jacobian_matches_finite_differences():
+    dose_model = PowerLawDoseModel(ALTITUDES_KM, ["edose", "tn1"], "both", 0.5, tieSpectralIndices=False)
+    parameter_vector = np.array([np.log(1e4), 3.0, np.log(2e3), 1.0])
+
+    _, jacobian = dose_model.calculateDosesAndJacobian(parameter_vector)
+
+    for index in range(len(parameter_vector)):
+        step = np.zeros(len(parameter_vector))
+        step[index] = 1e-5
+        finite_differences = (dose_model.calculateDosesAndJacobian(parameter_vector + step)[0]
+                              - dose_model.calculateDosesAndJacobian(parameter_vector - step)[0]) / 2e-5
+        np.testing.assert_allclose(jacobian[:, index], finite_differences, rtol=1e-6)
+
+
+def test_invalid_fits_are_rejected():
+    with pytest.raises(ValueError):
+        fit_power_law_spectrum([[1.0]], [10.0], "adose")
+    with pytest.raises(ValueError):
+        fit_power_law_spectrum(np.ones((5, 1)), ALTITUDES_KM, "dose")
+    with pytest.raises(ValueError):
+        fit_power_law_spectrum(np.ones((5, 2)), ALTITUDES_KM, "adose")
+    with pytest.raises(ValueError):
+        fit_power_law_spectrum(np.ones((5, 1)), ALTITUDES_KM, "adose", measurementUncertainties=0.0)